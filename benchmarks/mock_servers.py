@@ -0,0 +1,276 @@
+"""
+Local stand-ins for the upstream APIs used by the agents, for offline benchmarks.
+
+One FastAPI app serves:
+- OpenAI chat completions:      POST /v1/chat/completions
+- Perplexity chat completions:  POST /chat/completions
+- OpenAI embeddings:            POST /v1/embeddings
+- Tavily search:                POST /search
+
+Responses are synthetic but well formed: streaming and non-streaming completions
+with usage, tool calls for the tools named in MOCK_TOOL_CALLS, and JSON matching
+the requested schema for structured outputs.
+
+Latency is configured through environment variables:
+    MOCK_LATENCY      seconds before a non-streaming response / the first chunk (default 0.2)
+    MOCK_TOKEN_DELAY  seconds between streamed chunks (default 0.01)
+    MOCK_TOKENS       number of streamed content chunks (default 50)
+    MOCK_TOOL_CALLS   comma separated tool names the mock model calls when offered
+                      (default "stream_market_research,web_search_using_tavily")
+    MOCK_PROMPT_CACHE report cached_tokens like OpenAI's prompt caching: the longest
+                      prefix (tools, then messages) seen before, from 1024 tokens on in
+                      128 token steps (default true)
+
+Run with:
+    uvicorn benchmarks.mock_servers:app --port 9100
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_LATENCY = float(os.getenv("MOCK_LATENCY", "0.2"))
+MOCK_TOKEN_DELAY = float(os.getenv("MOCK_TOKEN_DELAY", "0.01"))
+MOCK_TOKENS = int(os.getenv("MOCK_TOKENS", "50"))
+MOCK_TOOL_CALLS = [
+    name.strip()
+    for name in os.getenv("MOCK_TOOL_CALLS", "stream_market_research,web_search_using_tavily").split(",")
+    if name.strip()
+]
+MOCK_PROMPT_CACHE = os.getenv("MOCK_PROMPT_CACHE", "true").lower() == "true"
+
+WORDS = (
+    "Market demand for the product is growing steadily with strong interest from younger "
+    "consumers and a clear opportunity for premium positioning in local cafes "
+).split()
+
+app = FastAPI(title="Mock upstream APIs")
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content or ""
+    return ""
+
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    while "$ref" in schema:
+        path = schema["$ref"].lstrip("#/").split("/")
+        target: Any = root
+        for key in path:
+            target = target[key]
+        schema = target
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return _resolve(options[0] if options else {"type": "null"}, root)
+    return schema
+
+
+def example_for_schema(schema: Dict[str, Any], root: Optional[Dict[str, Any]] = None, text: str = "ok") -> Any:
+    """Build a small value that validates against a JSON schema."""
+    root = root or schema
+    schema = _resolve(schema, root)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object" or "properties" in schema:
+        return {key: example_for_schema(value, root, text) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_for_schema(schema.get("items", {"type": "string"}), root, text)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 0.9
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return text
+
+
+def _tool_arguments(tool: Dict[str, Any], text: str) -> Dict[str, Any]:
+    parameters = tool["function"].get("parameters") or {}
+    arguments = {}
+    for name in parameters.get("required", []):
+        schema = parameters.get("properties", {}).get(name, {})
+        if schema.get("type") == "array":
+            arguments[name] = ["AAPL", "MSFT"]
+        elif schema.get("type") in ("integer", "number"):
+            arguments[name] = 3
+        else:
+            arguments[name] = text or "market research"
+    return arguments
+
+
+def _pick_tool_call(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Call the first allowed tool once per user turn, then answer."""
+    messages = body.get("messages", [])
+    if not body.get("tools") or not messages or messages[-1].get("role") != "user":
+        return None
+    offered = {tool["function"]["name"]: tool for tool in body["tools"] if tool.get("type") == "function"}
+    for name in MOCK_TOOL_CALLS:
+        if name in offered:
+            return {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(_tool_arguments(offered[name], _last_user_text(messages)))},
+            }
+    return None
+
+
+def _answer_text(body: Dict[str, Any]) -> str:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        return json.dumps(example_for_schema(schema, text="Mock answer"))
+    if response_format.get("type") == "json_object":
+        return json.dumps({"answer": "Mock answer"})
+    return " ".join(WORDS[i % len(WORDS)] for i in range(MOCK_TOKENS))
+
+
+# Hashes of the prompt prefixes seen so far, oldest first
+_prompt_prefixes: "OrderedDict[str, None]" = OrderedDict()
+PROMPT_PREFIXES_MAX = 100_000
+
+
+def _cached_tokens(body: Dict[str, Any]) -> int:
+    text = json.dumps(body.get("tools") or []) + "".join(json.dumps(message) for message in body.get("messages", []))
+    digest = hashlib.sha1()
+    cached = 0
+    # 4 characters per token, like the prompt_tokens estimate
+    for end in range(1024, len(text) // 4 + 1, 128):
+        digest.update(text[(end - 128 if end > 1024 else 0) * 4:end * 4].encode())
+        key = digest.copy().hexdigest()
+        if key in _prompt_prefixes:
+            cached = end
+            _prompt_prefixes.move_to_end(key)
+        else:
+            _prompt_prefixes[key] = None
+    while len(_prompt_prefixes) > PROMPT_PREFIXES_MAX:
+        _prompt_prefixes.popitem(last=False)
+    return cached
+
+
+def _usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, Any]:
+    prompt_tokens = sum(len(json.dumps(message)) for message in body.get("messages", [])) // 4
+    cached_tokens = min(prompt_tokens, _cached_tokens(body)) if MOCK_PROMPT_CACHE else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+async def _completion(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    tool_call = _pick_tool_call(body)
+    text = "" if tool_call else _answer_text(body)
+
+    if not body.get("stream"):
+        await asyncio.sleep(MOCK_LATENCY)
+        message: Dict[str, Any] = {"role": "assistant", "content": text or None}
+        if tool_call:
+            message["tool_calls"] = [tool_call]
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": _usage(body, len(text.split())),
+        })
+
+    async def stream():
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        await asyncio.sleep(MOCK_LATENCY)
+        if tool_call:
+            yield chunk({"role": "assistant", "tool_calls": [dict(tool_call, index=0)]})
+            yield chunk({}, "tool_calls")
+        else:
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                yield chunk({"role": "assistant", "content": word if i == 0 else " " + word})
+                if MOCK_TOKEN_DELAY:
+                    await asyncio.sleep(MOCK_TOKEN_DELAY)
+            yield chunk({}, "stop")
+        usage = _usage(body, 0 if tool_call else len(text.split()))
+        yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    return await _completion(request)
+
+
+@app.post("/v1/embeddings")
+async def openai_embeddings(request: Request):
+    """Bag-of-words hashing embeddings, so prompts sharing most words are close."""
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    data = []
+    for i, value in enumerate(inputs):
+        vector = [0.0] * 256
+        for word in re.findall(r"\w+", str(value).lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 256] += 1.0
+        data.append({"object": "embedding", "index": i, "embedding": vector})
+    tokens = sum(len(str(value).split()) for value in inputs)
+    return {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+@app.post("/chat/completions")
+async def perplexity_chat_completions(request: Request):
+    return await _completion(request)
+
+
+@app.post("/search")
+async def tavily_search(request: Request):
+    body = await request.json()
+    await asyncio.sleep(MOCK_LATENCY)
+    query = body.get("query", "")
+    results = [
+        {
+            "title": f"Result {i + 1} for {query[:40]}",
+            "url": f"https://example.com/{i + 1}",
+            "content": " ".join(WORDS),
+            "score": round(0.9 - i * 0.1, 2),
+            "raw_content": None,
+        }
+        for i in range(min(int(body.get("max_results", 5)), 5))
+    ]
+    return {"query": query, "answer": "Mock answer", "results": results, "response_time": MOCK_LATENCY}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
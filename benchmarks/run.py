@@ -0,0 +1,319 @@
+"""
+Offline load benchmark for the agent server.
+
+Starts the mock upstream APIs (benchmarks/mock_servers.py) and the real server
+(python -m src.serve) pointed at them, then drives concurrent streaming sessions
+against every agent and team exposed by the playground and reports, per target:
+requests per second, p50/p95/p99 latency, p50/p95/p99 time to first token, errors,
+the resident memory of every server worker, and the share of prompt tokens the
+(mock) upstream served from its prompt cache.
+
+Postgres (SUPABASE_DB_*) must be reachable; nothing else leaves the machine.
+
+Usage:
+    python -m benchmarks.run --workers 2 --concurrency 8 --requests 40
+    python -m benchmarks.run --targets finance-agent --latency 0.5 --json results.json
+    python -m benchmarks.run --workers 1 --targets basic-agent --prompt-layout agno
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with code {process.returncode} before {url} was ready")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def worker_memory(parent_pid: int) -> List[Dict[str, Any]]:
+    """Resident memory (MiB) of the server processes, read from /proc."""
+    pids = [parent_pid]
+    try:
+        with open(f"/proc/{parent_pid}/task/{parent_pid}/children") as f:
+            pids += [int(pid) for pid in f.read().split()]
+    except OSError:
+        pass
+    result = []
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+            with open(f"/proc/{pid}/cmdline") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if "resource_tracker" in cmdline:
+            continue
+        result.append({
+            "pid": pid,
+            "role": "main" if pid == parent_pid else "worker",
+            "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+            "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+        })
+    return result
+
+
+async def discover_targets(client: httpx.AsyncClient) -> List[Dict[str, str]]:
+    targets = []
+    for kind, id_key in (("agents", "agent_id"), ("teams", "team_id")):
+        response = await client.get(f"/v1/playground/{kind}")
+        response.raise_for_status()
+        for item in response.json():
+            targets.append({"kind": kind, "id": item[id_key], "name": item.get("name") or item[id_key]})
+    return targets
+
+
+async def run_once(client: httpx.AsyncClient, target: Dict[str, str], message: str) -> Dict[str, Any]:
+    """Send one streaming run and time it until the response is complete."""
+    data = {
+        "message": message,
+        "stream": "true",
+        "monitor": "false",
+        "session_id": str(uuid.uuid4()),
+        "user_id": f"bench-{uuid.uuid4().hex[:8]}",
+    }
+    url = f"/v1/playground/{target['kind']}/{target['id']}/runs"
+    start = time.perf_counter()
+    ttft = None
+    chars = 0
+    try:
+        async with client.stream("POST", url, data=data) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return {"ok": False, "latency": time.perf_counter() - start, "error": f"HTTP {response.status_code}"}
+            tail = ""
+            async for text in response.aiter_text():
+                # The first RunResponse event (after RunStarted/ToolCallStarted) is the first token the user sees
+                if ttft is None:
+                    tail = tail[-32:] + text
+                    if '"RunResponse"' in tail:
+                        ttft = time.perf_counter() - start
+                chars += len(text)
+    except httpx.HTTPError as e:
+        return {"ok": False, "latency": time.perf_counter() - start, "error": type(e).__name__}
+    return {"ok": True, "latency": time.perf_counter() - start, "ttft": ttft, "bytes": chars}
+
+
+async def bench_target(
+    client: httpx.AsyncClient, target: Dict[str, str], concurrency: int, total: int, message: str
+) -> Dict[str, Any]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+    results: List[Dict[str, Any]] = []
+
+    async def session() -> None:
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results.append(await run_once(client, target, message))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r.get("ttft") is not None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    summary: Dict[str, Any] = {
+        "target": target["name"],
+        "kind": target["kind"],
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency_mean_s": round(statistics.mean(latencies), 3) if latencies else None,
+    }
+    for p in (50, 95, 99):
+        value = percentile(latencies, p)
+        summary[f"latency_p{p}_s"] = round(value, 3) if value is not None else None
+        value = percentile(ttfts, p)
+        summary[f"ttft_p{p}_s"] = round(value, 3) if value is not None else None
+    return summary
+
+
+async def prompt_cache_stats(client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Prompt tokens of the model calls and how many the upstream served from its cache, from /metrics."""
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    tokens = {"input": 0.0, "cached": 0.0}
+    for line in response.text.splitlines():
+        if not line.startswith("agent_tokens_total{") or 'kind="llm"' not in line:
+            continue
+        for token_type in tokens:
+            if f'type="{token_type}"' in line:
+                tokens[token_type] += float(line.rsplit(" ", 1)[1])
+    return {
+        "input_tokens": int(tokens["input"]),
+        "cached_tokens": int(tokens["cached"]),
+        "cache_ratio": round(tokens["cached"] / tokens["input"], 4) if tokens["input"] else None,
+    }
+
+
+def print_report(summaries: List[Dict[str, Any]], memory: List[Dict[str, Any]],
+                 prompt_cache: Optional[Dict[str, Any]] = None) -> None:
+    columns = ["target", "ok", "rps", "latency_p50_s", "latency_p95_s", "latency_p99_s", "ttft_p50_s", "ttft_p95_s", "ttft_p99_s"]
+    widths = [max(len(c), *(len(str(s.get(c))) for s in summaries)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for s in summaries:
+        print("  ".join(str(s.get(c)).ljust(w) for c, w in zip(columns, widths)))
+        if s["errors"]:
+            print(f"    errors: {s['errors']}")
+    print()
+    for m in memory:
+        print(f"{m['role']:<6} pid={m['pid']:<8} rss={m['rss_mb']} MiB  peak={m['peak_rss_mb']} MiB")
+    if prompt_cache:
+        # /metrics is answered by one worker: exact with --workers 1
+        print(f"\nprompt tokens={prompt_cache['input_tokens']}  cached={prompt_cache['cached_tokens']}  "
+              f"cache ratio={prompt_cache['cache_ratio']}")
+
+
+async def run_benchmark(args: argparse.Namespace, base_url: str, server: subprocess.Popen) -> Dict[str, Any]:
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        targets = await discover_targets(client)
+        if args.targets:
+            wanted = set(args.targets)
+            targets = [t for t in targets if t["name"] in wanted or t["id"] in wanted]
+        if not targets:
+            raise RuntimeError("no agents or teams to benchmark")
+
+        # One warm-up run per target so imports, pools and tables are ready
+        for target in targets:
+            await run_once(client, target, args.message)
+
+        summaries = []
+        for target in targets:
+            summary = await bench_target(client, target, args.concurrency, args.requests, args.message)
+            print(f"{summary['target']}: {summary['ok']}/{summary['requests']} ok, {summary['rps']} rps", flush=True)
+            summaries.append(summary)
+        prompt_cache = await prompt_cache_stats(client)
+    return {"config": vars(args), "results": summaries, "memory": worker_memory(server.pid), "prompt_cache": prompt_cache}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the agent server")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent sessions per target")
+    parser.add_argument("--requests", type=int, default=40, help="runs per target")
+    parser.add_argument("--targets", nargs="*", help="agent/team names or ids (default: all)")
+    parser.add_argument("--message", default="Should we launch a matcha latte in Dublin cafes?")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock upstream latency before the first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="mock delay between streamed tokens (s)")
+    parser.add_argument("--tokens", type=int, default=50, help="mock tokens per answer")
+    parser.add_argument("--server-port", type=int, default=9200)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout (s)")
+    parser.add_argument("--no-admission", action="store_true", help="disable the per-agent admission limits")
+    parser.add_argument("--keep-caches", action="store_true", help="leave the Deepsearch/finance caches enabled")
+    parser.add_argument("--prompt-layout", choices=["stable", "agno"], default="stable", help="PROMPT_LAYOUT of the server")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--log-dir", default="logs", help="where the mock/server logs go")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    os.makedirs(args.log_dir, exist_ok=True)
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    base_url = f"http://127.0.0.1:{args.server_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "MOCK_LATENCY": str(args.latency),
+        "MOCK_TOKEN_DELAY": str(args.token_delay),
+        "MOCK_TOKENS": str(args.tokens),
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "PERPLEXITY_BASE_URL": mock_url,
+        "TAVILY_BASE_URL": mock_url,
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "sk-bench",
+        "PERPLEXITY_API_KEY": env.get("PERPLEXITY_API_KEY") or "pplx-bench",
+        "TAVILY_API_KEY": env.get("TAVILY_API_KEY") or "tvly-bench",
+        "AGNO_TELEMETRY": "false",
+        "TELEMETRY_SPAN_LOG": "",
+        "LLM_HTTP2": "false",
+        "PROMPT_LAYOUT": args.prompt_layout,
+    })
+    if args.no_admission:
+        env["ADMISSION_ENABLED"] = "false"
+    if not args.keep_caches:
+        env.update({"DEEPSEARCH_CACHE": "false", "FINANCE_CACHE_PERSISTENT": "false"})
+
+    python = sys.executable
+    mock = start_process(
+        [python, "-m", "uvicorn", "benchmarks.mock_servers:app", "--port", str(args.mock_port), "--no-access-log", "--log-level", "warning"],
+        env, os.path.join(args.log_dir, "bench-mock.log"),
+    )
+    server = None
+    try:
+        wait_until_ready(f"{mock_url}/health", mock, 30)
+        # The production entry point (src.serve): pre-forked workers on one socket
+        server_env = dict(env, HOST="127.0.0.1", PORT=str(args.server_port),
+                          WEB_CONCURRENCY=str(args.workers), SERVER_LOG_LEVEL="warning")
+        server = start_process([python, "-m", "src.serve"], server_env, os.path.join(args.log_dir, "bench-server.log"))
+        wait_until_ready(f"{base_url}/health", server, 120)
+        report = asyncio.run(run_benchmark(args, base_url, server))
+    finally:
+        if server is not None:
+            stop_process(server)
+        stop_process(mock)
+
+    print()
+    print_report(report["results"], report["memory"], report["prompt_cache"])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Startup benchmark: import time of the app, time until /health answers, and the
+cost of building each agent on first use. Every measurement runs in a fresh
+interpreter so nothing is already imported.
+
+Usage:
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --skip-server --json logs/startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .run import start_process, stop_process
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+BUILD_SNIPPET = (
+    "import time; from src.agents import get_agent; "
+    "t = time.perf_counter(); get_agent({agent_id!r}); print(time.perf_counter() - t)"
+)
+
+
+def run_snippet(code: str, env: Dict[str, str]) -> float:
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def time_to_health(port: int, env: Dict[str, str], log_path: str, timeout: float = 60) -> float:
+    """Seconds from starting uvicorn until GET /health returns 200."""
+    start = time.perf_counter()
+    server = start_process(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        env, log_path,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode}, see {log_path}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"/health not ready after {timeout:.0f}s")
+    finally:
+        stop_process(server)
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    return {
+        "median_s": round(statistics.median(samples), 3),
+        "min_s": round(min(samples), 3),
+        "max_s": round(max(samples), 3),
+        "samples": len(samples),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Startup and lazy agent build benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--port", type=int, default=9300)
+    parser.add_argument("--skip-server", action="store_true", help="don't measure time to /health")
+    parser.add_argument("--skip-agents", action="store_true", help="don't measure per-agent build time")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--log-dir", default="logs")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    os.makedirs(args.log_dir, exist_ok=True)
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "sk-bench",
+        "PERPLEXITY_API_KEY": env.get("PERPLEXITY_API_KEY") or "pplx-bench",
+        "TAVILY_API_KEY": env.get("TAVILY_API_KEY") or "tvly-bench",
+        "AGNO_TELEMETRY": "false",
+        "TELEMETRY_SPAN_LOG": "",
+    })
+
+    results: Dict[str, Any] = {}
+    for module in ("src.agents", "src.main"):
+        samples = [run_snippet(IMPORT_SNIPPET.format(module=module), env) for _ in range(args.repeat)]
+        results[f"import {module}"] = summarize(samples)
+
+    if not args.skip_server:
+        # Without the warm-up the server is idle after startup, like a dyno waiting for traffic
+        server_env = dict(env, PLAYGROUND_WARMUP="false")
+        log_path = os.path.join(args.log_dir, "bench-startup.log")
+        samples = [time_to_health(args.port, server_env, log_path) for _ in range(args.repeat)]
+        results["uvicorn start to /health"] = summarize(samples)
+
+    if not args.skip_agents:
+        from src.agents import list_agents
+
+        for agent_id in list_agents():
+            samples = [run_snippet(BUILD_SNIPPET.format(agent_id=agent_id), env) for _ in range(args.repeat)]
+            results[f"first use of {agent_id}"] = summarize(samples)
+
+    width = max(len(name) for name in results)
+    for name, summary in results.items():
+        print(f"{name:<{width}}  median={summary['median_s']}s  min={summary['min_s']}s  max={summary['max_s']}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
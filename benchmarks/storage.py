@@ -0,0 +1,151 @@
+"""
+Session storage codec benchmark: save and load latency and stored size of growing
+sessions with the JSON (agno JSONB columns) and msgpack-zstd (infra.codec) formats.
+
+Two session shapes are written turn by turn, as the agents do: "image" runs carry
+a base64 image like image_agent's, "tools" runs carry large tool outputs like the
+finance agent's. Loads are measured cold (the blob cache is cleared first), as for
+a worker that hasn't seen the session. Only Postgres must be reachable; the
+benchmark tables are dropped afterwards.
+
+Usage:
+    python -m benchmarks.storage --turns 10 --loads 20
+    python -m benchmarks.storage --mode append --json logs/storage.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from .run import percentile
+
+
+def make_run(shape: str, turn: int, rng: random.Random) -> Dict[str, Any]:
+    """One stored run of the given shape, roughly like the agents produce."""
+    run_id = str(uuid.uuid4())
+    if shape == "image":
+        image = base64.b64encode(rng.randbytes(200 * 1024)).decode()
+        tool_output = json.dumps({"url": f"https://images.example.com/{run_id}.png", "b64_json": image})
+    else:
+        rows = [
+            {"symbol": f"SYM{i}", "date": f"2024-01-{i % 28 + 1:02d}", "open": rng.random() * 100,
+             "close": rng.random() * 100, "volume": rng.randint(1000, 10 ** 7)}
+            for i in range(600)
+        ]
+        tool_output = json.dumps(rows)
+    messages = [
+        {"role": "user", "content": f"Request {turn}: " + "please analyse this " * 20, "created_at": int(time.time())},
+        {"role": "assistant", "tool_calls": [{"id": "call_1", "type": "function",
+                                              "function": {"name": "tool", "arguments": "{}"}}]},
+        {"role": "tool", "tool_call_id": "call_1", "content": tool_output},
+        {"role": "assistant", "content": "Here is the analysis. " * 150},
+    ]
+    return {"run_id": run_id, "content": messages[-1]["content"], "messages": messages, "created_at": int(time.time())}
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+    }
+
+
+async def bench(codec_name: str, mode: str, shape: str, turns: int, loads: int) -> Dict[str, Any]:
+    from agno.storage.session.agent import AgentSession
+
+    from src.infra.codec import get_session_codec
+    from src.infra.storage import AppendOnlyPostgresAgentStorage, AsyncPostgresAgentStorage
+
+    codec = get_session_codec() if codec_name == "msgpack-zstd" else None
+    storage_class = AppendOnlyPostgresAgentStorage if mode == "append" else AsyncPostgresAgentStorage
+    table_name = f"bench_storage_{mode}_{codec_name.replace('-', '_')}_{shape}"
+    storage = storage_class(table_name=table_name, codec=codec)
+    storage.mode = "agent"
+    storage.drop()
+    storage.create()
+
+    rng = random.Random(turns)
+    session = AgentSession(session_id=str(uuid.uuid4()), agent_id="bench-agent", user_id="bench",
+                           memory={"runs": []}, agent_data={"name": "Bench"}, session_data={})
+    saves = []
+    try:
+        for turn in range(turns):
+            session.memory["runs"].append(make_run(shape, turn, rng))
+            start = time.perf_counter()
+            await storage.aupsert(session)
+            saves.append(time.perf_counter() - start)
+
+        reads = []
+        for _ in range(loads):
+            if codec is not None:
+                codec.blobs._cache.clear()
+            start = time.perf_counter()
+            loaded = await storage.aread(session.session_id)
+            reads.append(time.perf_counter() - start)
+        assert loaded is not None and len(loaded.memory["runs"]) == min(turns, getattr(storage, "history_runs", turns))
+
+        tables = [storage.table.fullname] + ([storage.runs_table.fullname] if mode == "append" else [])
+        with storage.db_engine.connect() as conn:
+            stored = sum(conn.execute(text(f"SELECT coalesce(sum(pg_column_size(t.*)), 0) FROM {table} t")).scalar()
+                         for table in tables)
+            blob_bytes = 0
+            if codec is not None:
+                # The referenced blobs, stored once in the shared blob table
+                table = storage.runs_table if mode == "append" else storage.table
+                refs = set()
+                for row in conn.execute(table.select()):
+                    refs |= codec.decode(row.payload)[1]
+                blob_bytes = sum(len(data) for data in codec.blobs.get_many(refs).values())
+    finally:
+        storage.drop()
+        if mode == "append":
+            storage.runs_table.drop(storage.db_engine, checkfirst=True)
+    return {
+        "save": summarize(saves),
+        "load": summarize(reads),
+        "stored_kb": round((stored + blob_bytes) / 1024, 1),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Session storage codec benchmark")
+    parser.add_argument("--turns", type=int, default=10, help="runs written per session")
+    parser.add_argument("--loads", type=int, default=20, help="cold reads of the finished session")
+    parser.add_argument("--mode", choices=["async", "append"], default="async", help="AGENT_STORAGE_MODE to measure")
+    parser.add_argument("--shapes", nargs="+", default=["image", "tools"], choices=["image", "tools"])
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+async def bench_all(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for shape in args.shapes:
+        for codec_name in ("json", "msgpack-zstd"):
+            results[f"{shape} {codec_name}"] = await bench(codec_name, args.mode, shape, args.turns, args.loads)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    os.environ.setdefault("AGNO_TELEMETRY", "false")
+    results = asyncio.run(bench_all(args))
+
+    width = max(len(name) for name in results)
+    for name, result in results.items():
+        print(f"{name:<{width}}  save p50={result['save']['p50_ms']}ms p95={result['save']['p95_ms']}ms  "
+              f"load p50={result['load']['p50_ms']}ms p95={result['load']['p95_ms']}ms  stored={result['stored_kb']}KB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,117 @@
-from .basic_agent import basic_agent
-from .finance_agent import finance_agent
-from .reasoning_agent import reasoning_agent
-from .image_agent import image_agent
-from .new_product_agent import new_product_development_team
+"""
+Agent registry.
 
-all_agents = [basic_agent, finance_agent, reasoning_agent, image_agent, new_product_development_team]
+Agents and teams are listed here by id and only built (with their model, toolkits
+and storage) the first time they are used, so importing this package is cheap and
+the server can answer /health before yfinance, Tavily, DuckDuckGo, DALL·E or the
+database engine are loaded.
+
+    from src.agents import get_agent, list_agents
+    agent = get_agent("finance-agent")
+
+The old module attributes (all_agents, basic_agent, ...) still work and build the
+agents on access.
+"""
+import importlib
+import threading
+from typing import Dict, List, Tuple, Union
+
+# id -> (module, attribute); the id is the agent_id/team_id the playground routes use
+AGENT_REGISTRY: Dict[str, Tuple[str, str]] = {
+    "basic-agent": ("basic_agent", "basic_agent"),
+    "finance-agent": ("finance_agent", "finance_agent"),
+    "reasoning-agent": ("reasoning_agent", "reasoning_agent"),
+    "image-agent": ("image_agent", "image_agent"),
+    "new-product-development-team": ("new_product_agent", "new_product_development_team"),
+}
+
+# Built with the registry entries but not served by the playground
+INTERNAL_AGENTS: Dict[str, Tuple[str, str]] = {
+    "new-product-development-lead": ("new_product_agent", "new_product_leader_agent"),
+}
+
+_built: Dict[str, object] = {}
+_build_lock = threading.RLock()
+
+
+def list_agents() -> List[str]:
+    """Returns the ids of the agents and teams served by the playground."""
+    return list(AGENT_REGISTRY)
+
+
+def get_agent(agent_id: str) -> Union["Agent", "Team"]:  # noqa: F821
+    """
+    Returns the agent or team with this id, building it on first use.
+
+    Args:
+        agent_id (str): An id from list_agents() or INTERNAL_AGENTS.
+
+    Returns:
+        Agent | Team: The instrumented, initialized agent or team.
+
+    Raises:
+        KeyError: If no agent is registered under this id.
+    """
+    agent = _built.get(agent_id)
+    if agent is not None:
+        return agent
+    module_name, _ = AGENT_REGISTRY.get(agent_id) or INTERNAL_AGENTS[agent_id]
+    with _build_lock:
+        if agent_id not in _built:
+            _build_module(module_name)
+        return _built[agent_id]
+
+
+def _build_module(module_name: str) -> None:
+    """Import an agent module and register every agent it defines."""
+    from ..infra.governor import apply_token_budget
+    from ..infra.history import enable_history_compaction
+    from ..infra.images import enable_image_intake
+    from ..infra.routing import enable_model_routing
+    from ..infra.semantic_cache import enable_semantic_cache
+    from ..infra.storage import enable_session_io
+    from ..infra.telemetry import instrument_agent
+
+    module = importlib.import_module(f".{module_name}", __name__)
+    for agent_id, (name, attribute) in {**AGENT_REGISTRY, **INTERNAL_AGENTS}.items():
+        if name == module_name and agent_id not in _built:
+            agent = getattr(module, attribute)
+            # Send simple turns to a smaller, faster model (MODEL_ROUTING_POLICIES)
+            enable_model_routing(agent, agent_id)
+            # Every run gets its own token budget (GOVERNOR_TOKEN_BUDGETS)
+            apply_token_budget(agent, agent_id)
+            # Send a rolling session summary plus the latest run instead of the raw history
+            enable_history_compaction(agent, agent_id)
+            # Answer near-duplicate prompts from the semantic cache (opt-in, SEMANTIC_CACHE_AGENTS)
+            enable_semantic_cache(agent, agent_id)
+            # Downsize uploads, cache image analyses and keep thumbnails in the history (IMAGE_INTAKE_AGENTS)
+            enable_image_intake(agent, agent_id)
+            # Preload sessions before async runs and finish their writes before the response ends
+            enable_session_io(agent)
+            # Record every run (and its model/tool calls) as telemetry spans
+            instrument_agent(agent)
+            _built[agent_id] = agent
+            # Importing the submodule shadowed the old package attribute, restore it
+            globals()[attribute] = agent
+
+
+def get_all_agents() -> list:
+    """Builds (if needed) and returns every agent and team served by the playground."""
+    return [get_agent(agent_id) for agent_id in AGENT_REGISTRY]
+
+
+def is_built(agent_id: str) -> bool:
+    """Whether get_agent() has already built this agent."""
+    return agent_id in _built
+
+
+_ATTRIBUTES = {attribute: agent_id for agent_id, (_, attribute) in {**AGENT_REGISTRY, **INTERNAL_AGENTS}.items()}
+
+
+def __getattr__(name: str):
+    # Backwards compatible module attributes, built on first access
+    if name == "all_agents":
+        return get_all_agents()
+    if name in _ATTRIBUTES:
+        return get_agent(_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,9 @@
 import os
 from dotenv import load_dotenv
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from agno.storage.agent.postgres import PostgresAgentStorage
-from ..infra.db import get_shared_db_engine
-from agno.tools.yfinance import YFinanceTools
+from ..infra.llm import build_openai_model
+from ..infra.storage import build_agent_storage
+from .tools.FinanceData import FinanceDataTools
 
 # Load .env file environment variables
 load_dotenv()
@@ -14,13 +13,14 @@ if not openai_api_key:
     raise ValueError("OPENAI_API_KEY environment variable not set. Please ensure it is available.")
 
 finance_agent = Agent(
+    agent_id="finance-agent",
     name="Finance Agent",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
     tools=[
-        YFinanceTools(
+        FinanceDataTools(
             stock_price=True,
             analyst_recommendations=True,
             company_info=True,
@@ -28,7 +28,7 @@ finance_agent = Agent(
         )
     ],
     instructions=["Always use tables to display data"],
-    storage=PostgresAgentStorage(table_name="finance_agent", db_engine=get_shared_db_engine()),
+    storage=build_agent_storage("finance_agent"),
     add_datetime_to_instructions=True,
     add_history_to_messages=True,
     num_history_responses=5,
@@ -1,11 +1,10 @@
 import os
 from dotenv import load_dotenv
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from agno.storage.agent.postgres import PostgresAgentStorage
-from ..infra.db import get_shared_db_engine
-from agno.tools.duckduckgo import DuckDuckGoTools
+from ..infra.llm import build_openai_model
+from ..infra.storage import build_agent_storage
 from agno.tools.dalle import DalleTools
+from .tools.WebResearch import WebResearchTools
 
 # Load .env file environment variables
 load_dotenv()
@@ -15,24 +14,26 @@ if not openai_api_key:
     raise ValueError("OPENAI_API_KEY environment variable not set. Please ensure it is available.")
 
 image_agent = Agent(
+    agent_id="image-agent",
     name="Image Agent",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
     tools=[
-        DuckDuckGoTools(),
+        WebResearchTools(),
         DalleTools(api_key=openai_api_key),
     ],
     description="我是一个视觉图像专家，可以分析图片并生成新的图片。",
     instructions=[
         "当用户上传图片时，详细分析图片内容",
         "当被要求创建图片时，使用DALLE工具生成高质量图片",
+        "需要网络资料时，调用一次web_research，它会返回多个网页的正文内容，不要反复搜索",
         "提供详细、专业的图片解析",
         "使用markdown格式美化输出",
         "当你使用DALLE工具生成图片后，请在文字描述中提及你已生成图片。框架会自动展示图片，你无需在回复中再次用markdown插入图片。",
     ],
-    storage=PostgresAgentStorage(table_name="image_agent", db_engine=get_shared_db_engine()),
+    storage=build_agent_storage("image_agent"),
     add_datetime_to_instructions=True,
     add_history_to_messages=True,
     num_history_responses=5,
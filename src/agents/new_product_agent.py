@@ -1,21 +1,30 @@
 import os
 import sys
+import asyncio
 from pathlib import Path
+from typing import AsyncIterator
 from dotenv import load_dotenv
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 from agno.tools.tavily import TavilyTools
-from agno.tools.yfinance import YFinanceTools
 from agno.team import Team
+from agno.tools import tool
 
 # Handle both direct execution and module import
 try:
-    from .tools.Deepsearch import Deepsearch
+    from .tools.Deepsearch import Deepsearch, AsyncDeepsearch, run_sync
+    from .tools.TavilySearch import cache_tavily_search, scope_search_results
+    from .parallel_team import ParallelTeamRunner
+    from ..infra.governor import govern_session
+    from ..infra.llm import build_openai_model
 except ImportError:
     # If running directly, add the current directory to path
     current_dir = Path(__file__).parent
     sys.path.insert(0, str(current_dir))
-    from tools.Deepsearch import Deepsearch
+    from tools.Deepsearch import Deepsearch, AsyncDeepsearch, run_sync
+    from tools.TavilySearch import cache_tavily_search, scope_search_results
+    from parallel_team import ParallelTeamRunner
+    from src.infra.governor import govern_session
+    from src.infra.llm import build_openai_model
 
 # Load .env file environment variables
 load_dotenv()
@@ -28,10 +37,43 @@ if not openai_api_key:
 if not tavily_api_key:
     raise ValueError("TAVILY_API_KEY environment variable not set. Please ensure it is available.")
 
+# Split the market research template into concurrent section queries
+DEEPSEARCH_PARALLEL_SECTIONS = os.getenv("DEEPSEARCH_PARALLEL_SECTIONS", "true").lower() == "true"
+# Per-member timeout (seconds) for the parallel team mode
+NEW_PRODUCT_MEMBER_TIMEOUT = float(os.getenv("NEW_PRODUCT_MEMBER_TIMEOUT", "180"))
+# Alternative Tavily API endpoint (e.g. the local stand-in used by the benchmarks)
+TAVILY_BASE_URL = os.getenv("TAVILY_BASE_URL")
+
+def build_tavily_tools() -> TavilyTools:
+    """
+    Tavily search toolkit on the governed (rate limited, retrying) session, pointed at
+    TAVILY_BASE_URL when it is set. Searches go through the shared search cache.
+    """
+    tools = TavilyTools()
+    govern_session(tools.client.session)
+    if TAVILY_BASE_URL:
+        tools.client.base_url = TAVILY_BASE_URL.rstrip("/")
+    return cache_tavily_search(tools)
+
 # Create Deepsearch tool
 class DeepsearchTool:
+    """Perplexity research helpers; the clients are created on first search, not at import."""
+
     def __init__(self):
-        self.searcher = Deepsearch()
+        self._searcher = None
+        self._async_searcher = None
+
+    @property
+    def searcher(self) -> Deepsearch:
+        if self._searcher is None:
+            self._searcher = Deepsearch()
+        return self._searcher
+
+    @property
+    def async_searcher(self) -> AsyncDeepsearch:
+        if self._async_searcher is None:
+            self._async_searcher = AsyncDeepsearch()
+        return self._async_searcher
     
     def search_market_trends(self, query: str) -> str:
         """Search for market trends and industry information using Perplexity API."""
@@ -41,13 +83,77 @@ class DeepsearchTool:
         else:
             return f"Search failed: {result['error']}"
 
+    def search_market_sections(self, sections: list[tuple[str, str]]) -> str:
+        """Run one Perplexity query per (title, query) section concurrently and join the results in order."""
+        return run_sync(self.asearch_market_sections(sections))
+
+    async def asearch_market_sections(self, sections: list[tuple[str, str]]) -> str:
+        """Async version of search_market_sections for callers already on an event loop."""
+        results = await self.async_searcher.search_many([query for _, query in sections])
+        parts = []
+        for (title, _), result in zip(sections, results):
+            if result["success"]:
+                parts.append(f"## {title}\n\n{result['content']}")
+            else:
+                parts.append(f"## {title}\n\nSearch failed: {result['error']}")
+        return "\n\n".join(parts)
+
+    async def astream_market_sections(self, sections: list[tuple[str, str]]) -> AsyncIterator[str]:
+        """
+        Stream the research sections as text while all section queries run concurrently.
+
+        The section being shown streams live, later sections are buffered until it
+        finishes. The stream always ends with a status line saying whether the
+        research finished and which sections failed.
+        """
+        buffers: list[list[str]] = [[] for _ in sections]
+        finished = [False] * len(sections)
+        failed: dict[int, str] = {}
+        current = 0
+
+        yield f"## {sections[0][0]}\n\n"
+        async for index, chunk in self.async_searcher.stream_many([query for _, query in sections]):
+            if chunk["success"]:
+                text = chunk["content"] or ""
+            else:
+                failed[index] = chunk["error"]
+                text = f"\n\nSearch failed: {chunk['error']}"
+            if index == current:
+                if text:
+                    yield text
+            else:
+                buffers[index].append(text)
+            finished[index] = chunk["finished"] or finished[index]
+            while current < len(sections) and finished[current]:
+                current += 1
+                if current < len(sections):
+                    yield f"\n\n## {sections[current][0]}\n\n" + "".join(buffers[current])
+                    buffers[current] = []
+
+        if not failed:
+            yield f"\n\n[Deepsearch finished: {len(sections)}/{len(sections)} sections]"
+        elif len(failed) == len(sections):
+            yield f"\n\n[Deepsearch error: {next(iter(failed.values()))}]"
+        else:
+            missing = ", ".join(sections[index][0] for index in sorted(failed))
+            yield f"\n\n[Deepsearch finished with errors: {len(sections) - len(failed)}/{len(sections)} sections, failed: {missing}]"
+
+    async def astream_market_research(self, user_query: str) -> AsyncIterator[str]:
+        """Stream the full market research for a natural language product request."""
+        if DEEPSEARCH_PARALLEL_SECTIONS:
+            sections = build_research_sections(user_query)
+        else:
+            sections = [("Deep Market Research", build_research_prompt(user_query))]
+        async for text in self.astream_market_sections(sections):
+            yield text
+
 # Initialize shared components
 deepsearch_tool = DeepsearchTool()
 
 # Deepsearch Agent - Deep Market Research Specialist
 deepsearch_agent = Agent(
     name="Deep Market Research Specialist",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
@@ -73,14 +179,14 @@ deepsearch_agent = Agent(
     show_tool_calls=True,
 )
 
-# Update the deepsearch agent to handle natural language extraction
-def extract_and_search(user_query: str) -> str:
-    """Extract business context from user query and perform comprehensive market research."""
+def build_research_prompt(user_query: str) -> str:
+    """Build the single comprehensive research query for the given user query."""
     
     # The deepsearch agent will extract the business info, product idea, and location from the user query
-    # and then format it into the structured research template
-    extraction_prompt = f"""
-    Please extract the following information from this user query: "{user_query}"
+    # and then format it into the structured research template. The query comes last so the
+    # template is an identical prompt prefix for every request (upstream prompt caching).
+    return f"""
+    Please extract the following information from the user query at the end of this request.
     
     Extract:
     - Business type/context (e.g., "coffee shop", "bakery", "restaurant")
@@ -133,21 +239,116 @@ def extract_and_search(user_query: str) -> str:
     4. **Financial analysis** including costing spreadsheet in the format above
     5. **Innovation opportunities** and white space in the market
     6. **Supply chain trends** and sourcing opportunities
+    
+    User query: "{user_query}"
     """
+
+# Section breakdown of the market research template, one Perplexity query each
+RESEARCH_SECTIONS = [
+    (
+        "Product Research",
+        """- Current trends relevant to this product (in the specified location and globally)
+    - Background on how these trends influence the product concept
+    - Steps to develop the product (from idea to launch)
+    - Market size and growth projections for this product category
+    - Consumer demographics and target audience insights
+    - Regulatory considerations and food safety requirements""",
+    ),
+    (
+        "Competitive Landscape",
+        """- Competitive landscape analysis - who are the key players and what are they offering
+    - Competitor pricing and positioning""",
+    ),
+    (
+        "Marketing Plan",
+        """- A marketing plan and examples of marketing content
+    - Distribution channels and retail partnerships
+    - Seasonal trends and demand patterns""",
+    ),
+    (
+        "Financial Analysis",
+        """- A detailed costing spreadsheet (ingredients, packaging, labor, etc.) for small, medium, and large-scale production
+    - Pricing analysis, including competitor pricing
+    - Use this costing spreadsheet format:
+
+    | Component           | Supplier        | Package Size | Unit Cost      | Cost per unit |
+    |---------------------|-----------------|--------------|----------------|---------------|
+    | Ingredient 1        | Supplier A      | 1kg          | €X.XX/kg       | €X.XX         |
+    | ...                 | ...             | ...          | ...            | ...           |
+    | Packaging           | Supplier C      | Per unit     | €X.XX          | €X.XX         |
+    | Labor               | Local rate      | €X.XX/hour   | €X.XX/hour     | €X.XX         |
+    | **Total Cost**      |                 |              |                | **€X.XX**     |
+    | Suggested Retail    |                 |              |                | **€X.XX**     |
+    | **Gross Margin**    |                 |              |                | **XX.X%**     |""",
+    ),
+    (
+        "Innovation Opportunities",
+        """- Innovation opportunities and white space in the market""",
+    ),
+    (
+        "Supply Chain",
+        """- Suggestions for sourcing suppliers
+    - Supply chain trends and sourcing opportunities""",
+    ),
+]
+
+async def aextract_and_search(user_query: str) -> str:
+    """Extract business context from the user query and perform comprehensive market research."""
+    if not DEEPSEARCH_PARALLEL_SECTIONS:
+        return await deepsearch_tool.asearch_market_sections([("Deep Market Research", build_research_prompt(user_query))])
+    return await deepsearch_tool.asearch_market_sections(build_research_sections(user_query))
+
+def build_research_sections(user_query: str) -> list[tuple[str, str]]:
+    """Build one focused research query per template section for the given user query."""
+    sections = []
+    # Static section template first, the user query last (see build_research_prompt)
+    for title, focus in RESEARCH_SECTIONS:
+        sections.append((title, f"""
+    Please extract the following information from the user query at the end of this request.
     
-    return deepsearch_tool.search_market_trends(extraction_prompt)
+    Extract:
+    - Business type/context (e.g., "coffee shop", "bakery", "restaurant")
+    - Product idea (e.g., "vegan protein brownie", "functional smoothie")
+    - Location/market (e.g., "Dublin", "New York", or "globally" if not specified)
+    
+    The user is the owner of the extracted business type in the extracted location and wants to develop the extracted product idea.
+    This request covers only the **{title}** section of their product development and marketing plan. Provide:
+    
+    {focus}
+    
+    Please provide detailed, data-driven insights with specific examples and recent market developments.
+    
+    User query: "{user_query}"
+    """))
+    return sections
 
-# Update the deepsearch agent with the new function
-deepsearch_agent.functions = [extract_and_search]
+@tool(show_result=True)
+async def stream_market_research(user_query: str) -> AsyncIterator[str]:
+    """
+    Use this function to run comprehensive deep market research for a new product idea.
+    The research is streamed to the user as it arrives.
+
+    Args:
+        user_query (str): The user's full natural language request, e.g.
+            "I am a coffee shop owner in Dublin, I want to create a vegan protein brownie".
+
+    Returns:
+        str: The market research report, ending with a Deepsearch status line.
+    """
+    async for text in deepsearch_tool.astream_market_research(user_query):
+        yield text
+
+# Update the deepsearch agent with the streaming research tool
+deepsearch_agent.tools = [stream_market_research]
 
 # Product Research Agent
 product_research_agent = Agent(
     name="Product Research Specialist",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
-    tools=[TavilyTools()],
+    tools=[build_tavily_tools()],
     description="""You are a product research specialist with expertise in market analysis, 
     consumer trends, and product development. You analyze market opportunities and provide 
     data-driven insights for new product development.""",
@@ -167,11 +368,11 @@ product_research_agent = Agent(
 # Marketing Strategy Agent
 marketing_strategy_agent = Agent(
     name="Marketing Strategy Expert",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
-    tools=[TavilyTools()],
+    tools=[build_tavily_tools()],
     description="""You are a marketing strategy expert specializing in brand positioning, 
     customer acquisition, and marketing campaigns. You create comprehensive marketing 
     plans for new product launches.""",
@@ -191,11 +392,11 @@ marketing_strategy_agent = Agent(
 # Financial Analysis Agent
 financial_analysis_agent = Agent(
     name="Financial Analysis Expert",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
-    tools=[TavilyTools()],
+    tools=[build_tavily_tools()],
     description="""You are a financial analysis expert specializing in cost analysis, 
     pricing strategies, and profitability assessment for new products. You create 
     detailed financial models and costing analyses.""",
@@ -216,11 +417,11 @@ financial_analysis_agent = Agent(
 # Competitor Analysis Agent
 competitor_analysis_agent = Agent(
     name="Competitor Analysis Specialist",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
-    tools=[TavilyTools()],
+    tools=[build_tavily_tools()],
     description="""You are a competitive intelligence specialist with expertise in 
     comprehensive competitor analysis, market positioning, and competitive strategy. 
     You provide detailed competitive landscape assessments and strategic recommendations.""",
@@ -242,6 +443,7 @@ competitor_analysis_agent = Agent(
 
 # Team coordinator - Updated to handle natural language queries
 new_product_development_team = Team(
+    team_id="new-product-development-team",
     name="New Product Development Team",
     description="""A specialized AI team for comprehensive new product development and marketing planning. 
     We help business owners research, develop, and launch new products with detailed market research, 
@@ -253,7 +455,7 @@ new_product_development_team = Team(
         financial_analysis_agent,
         competitor_analysis_agent,
     ],
-    model=OpenAIChat(
+    model=build_openai_model(
         id="o3-mini",
         api_key=openai_api_key,
     ),
@@ -282,11 +484,67 @@ new_product_development_team = Team(
         "",
         "Each specialist contributes their expertise while building upon the research foundation.",
         "We coordinate our findings to provide a complete, actionable product development plan.",
+        "",
+        "Start every new product request by calling `stream_market_research` yourself with the user's full request, so the research streams to the user as it arrives.",
+        "Then delegate to the specialists and include the research in their task; do not ask the Deep Market Research Specialist to repeat it.",
+        "If the research ends with a Deepsearch error or lists failed sections, tell the user which parts are missing.",
     ],
+    tools=[stream_market_research],
     show_tool_calls=True,
     markdown=True,
 )
 
+# Leader for the parallel mode - merges the specialists' outputs into one plan
+new_product_leader_agent = Agent(
+    name="New Product Development Lead",
+    model=build_openai_model(
+        id="o3-mini",
+        api_key=openai_api_key,
+    ),
+    description="""You lead a team of product research, marketing, financial and competitor 
+    specialists and turn their contributions into one comprehensive product development plan.""",
+    instructions=[
+        "Combine the market research and every specialist contribution into a single, well-structured plan",
+        "Cover market research and trends, competitive landscape, marketing strategy, financial analysis with costing spreadsheets, and a step-by-step development roadmap",
+        "Keep the specialists' tables and figures, and resolve any contradictions between them",
+        "If a specialist did not contribute, say which section is incomplete instead of inventing data",
+    ],
+    markdown=True,
+)
+
+# Parallel (fan-out/fan-in) mode: Deepsearch context is gathered once, the four
+# independent specialists run concurrently, and the leader merges their outputs.
+new_product_parallel_runner = ParallelTeamRunner(
+    leader=new_product_leader_agent,
+    members=[
+        product_research_agent,
+        marketing_strategy_agent,
+        financial_analysis_agent,
+        competitor_analysis_agent,
+    ],
+    context_fn=aextract_and_search,
+    member_timeout=NEW_PRODUCT_MEMBER_TIMEOUT,
+)
+
+# Members of one team run share their Tavily results (on top of the cross-run cache)
+scope_search_results(new_product_development_team)
+scope_search_results(new_product_parallel_runner)
+
+async def analyze_new_product_parallel(user_query: str) -> dict:
+    """
+    Analyze a new product idea with the specialists running concurrently.
+    
+    Args:
+        user_query (str): Natural language description of business and product idea
+    
+    Returns:
+        dict: The merged report, the shared research context and each member's result.
+              "partial" is True if any member or the leader timed out or failed;
+              "leader_error" is set when the outputs could not be merged.
+    """
+    result = await new_product_parallel_runner.arun(user_query)
+    return result.to_dict()
+
 # Example usage function
 def analyze_new_product(user_query: str) -> str:
     """
@@ -302,8 +560,9 @@ def analyze_new_product(user_query: str) -> str:
     
     print("🔍 Analyzing new product with AI agent team...")
     
-    # Use the team to analyze the product directly with natural language
-    return new_product_development_team.print_response(user_query, stream=True)
+    # Use the team to analyze the product directly with natural language.
+    # The market research tool is async, so the team runs on an event loop.
+    return asyncio.run(new_product_development_team.aprint_response(user_query, stream=True))
 
 # Example usage
 if __name__ == "__main__":
@@ -319,3 +578,13 @@ if __name__ == "__main__":
     
     print("\n" + "="*80 + "\n")
     
+    
+    # Example 3: Parallel mode - specialists run concurrently
+    print("=== Example 3: Parallel Team Mode ===")
+    report = asyncio.run(analyze_new_product_parallel("I own a restaurant and want to develop a new plant-based burger"))
+    print(report["content"])
+    if report["leader_error"]:
+        print("\n[Unmerged report - leader: " + report["leader_error"] + "]")
+    missing = [m["name"] for m in report["members"] if m["status"] != "completed"]
+    if missing:
+        print("\n[Partial report - missing: " + ", ".join(missing) + "]")
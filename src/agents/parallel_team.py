@@ -0,0 +1,183 @@
+import asyncio
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agno.agent import Agent
+
+
+@dataclass
+class MemberResult:
+    """Outcome of one specialist in a parallel team run."""
+
+    name: str
+    status: str  # "completed", "timeout" or "error"
+    content: Optional[str] = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+@dataclass
+class ParallelTeamResult:
+    """Merged report plus the per-member results it was built from."""
+
+    content: Optional[str]
+    context: Optional[str]
+    members: List[MemberResult] = field(default_factory=list)
+    # Set when the leader timed out or failed; content is then the unmerged member outputs
+    leader_error: Optional[str] = None
+
+    @property
+    def partial(self) -> bool:
+        return self.leader_error is not None or any(member.status != "completed" for member in self.members)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = asdict(self)
+        result["partial"] = self.partial
+        return result
+
+
+class ParallelTeamRunner:
+    """
+    Fan-out/fan-in orchestration for a team of independent specialists.
+
+    The shared research context is gathered once, every member then runs
+    concurrently on asyncio with its own timeout, and the leader merges
+    whatever came back. Slow or failing members are reported as missing
+    instead of failing the whole run; if the leader itself times out or
+    fails, the member outputs are returned unmerged.
+    """
+
+    def __init__(
+        self,
+        leader: Agent,
+        members: List[Agent],
+        context_fn: Callable[[str], Awaitable[str]],
+        member_timeout: float = 180.0,
+        leader_timeout: Optional[float] = None,
+    ):
+        """
+        Args:
+            leader (Agent): Agent that merges member outputs into the final report.
+            members (List[Agent]): Independent specialists run concurrently.
+            context_fn (Callable): Coroutine function returning the shared research
+                context for a user query.
+            member_timeout (float): Seconds each member may take before it is dropped.
+            leader_timeout (float, optional): Seconds the leader may take to merge.
+        """
+        self.leader = leader
+        self.members = members
+        self.context_fn = context_fn
+        self.member_timeout = member_timeout
+        self.leader_timeout = leader_timeout
+
+    def build_member_prompt(self, query: str, context: Optional[str]) -> str:
+        prompt = f"User request:\n{query}\n"
+        if context:
+            prompt += f"\nShared market research (gathered once for the whole team):\n{context}\n"
+        prompt += "\nFocus only on your own area of expertise and build upon the shared research."
+        return prompt
+
+    def build_leader_prompt(self, query: str, context: Optional[str], members: List[MemberResult]) -> str:
+        prompt = f"User request:\n{query}\n"
+        if context:
+            prompt += f"\n## Deep Market Research\n{context}\n"
+        prompt += self.build_member_sections(members)
+        prompt += (
+            "\nMerge the specialist contributions above into one complete, actionable product "
+            "development plan. Do not repeat content verbatim, resolve contradictions, and clearly "
+            "flag any section that is missing because a specialist did not contribute."
+        )
+        return prompt
+
+    def build_member_sections(self, members: List[MemberResult]) -> str:
+        sections = ""
+        for member in members:
+            if member.status == "completed":
+                sections += f"\n## {member.name}\n{member.content}\n"
+            else:
+                sections += f"\n## {member.name}\n(No contribution: member {member.status})\n"
+        return sections
+
+    def build_unmerged_report(self, members: List[MemberResult]) -> str:
+        return (
+            "The contributions could not be merged into one plan; these are the specialists' outputs.\n"
+            + self.build_member_sections(members)
+        )
+
+    async def run_member(self, member: Agent, prompt: str) -> MemberResult:
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(member.arun(prompt, stream=False), timeout=self.member_timeout)
+            return MemberResult(
+                name=member.name,
+                status="completed",
+                content=response.content if isinstance(response.content, str) else str(response.content),
+                duration=time.perf_counter() - start,
+            )
+        except asyncio.TimeoutError:
+            return MemberResult(
+                name=member.name,
+                status="timeout",
+                error=f"No response within {self.member_timeout:.0f}s",
+                duration=time.perf_counter() - start,
+            )
+        except Exception as e:
+            return MemberResult(name=member.name, status="error", error=str(e), duration=time.perf_counter() - start)
+
+    async def arun(
+        self,
+        query: str,
+        context: Optional[str] = None,
+        completed: Optional[Dict[str, MemberResult]] = None,
+        on_context: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_member_done: Optional[Callable[[MemberResult], Awaitable[None]]] = None,
+    ) -> ParallelTeamResult:
+        """
+        Run the team for a query.
+
+        Args:
+            query (str): Natural language user request.
+            context (str, optional): Previously gathered research context to reuse.
+            completed (Dict[str, MemberResult], optional): Results of members that already
+                finished, keyed by member name. These members are not run again.
+            on_context (Callable, optional): Awaited once the research context is available.
+            on_member_done (Callable, optional): Awaited as each member finishes.
+
+        Returns:
+            ParallelTeamResult: The merged report and per-member results. If the leader
+                times out or fails, content holds the unmerged member outputs and
+                leader_error says why.
+        """
+        if context is None:
+            context = await self.context_fn(query)
+            if on_context is not None:
+                await on_context(context)
+
+        completed = completed or {}
+        prompt = self.build_member_prompt(query, context)
+
+        async def run_and_report(member: Agent) -> MemberResult:
+            result = await self.run_member(member, prompt)
+            if on_member_done is not None:
+                await on_member_done(result)
+            return result
+
+        pending = [member for member in self.members if member.name not in completed]
+        fresh = {result.name: result for result in await asyncio.gather(*(run_and_report(m) for m in pending))}
+        members = [completed.get(member.name) or fresh[member.name] for member in self.members]
+
+        try:
+            leader_response = await asyncio.wait_for(
+                self.leader.arun(self.build_leader_prompt(query, context, members), stream=False),
+                timeout=self.leader_timeout,
+            )
+        except asyncio.TimeoutError as e:
+            error = f"No response within {self.leader_timeout:g}s" if self.leader_timeout else str(e) or "Timed out"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        else:
+            return ParallelTeamResult(content=leader_response.content, context=context, members=members)
+        return ParallelTeamResult(
+            content=self.build_unmerged_report(members), context=context, members=members, leader_error=error,
+        )
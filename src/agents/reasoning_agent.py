@@ -1,11 +1,10 @@
 import os
 from dotenv import load_dotenv
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from agno.storage.agent.postgres import PostgresAgentStorage
-from agno.tools.duckduckgo import DuckDuckGoTools
-from agno.tools.yfinance import YFinanceTools
-from ..infra.db import get_shared_db_engine
+from ..infra.llm import build_openai_model
+from ..infra.storage import build_agent_storage
+from .tools.FinanceData import FinanceDataTools
+from .tools.WebResearch import WebResearchTools
 
 # Load .env file environment variables
 load_dotenv()
@@ -16,14 +15,15 @@ if not openai_api_key:
     raise ValueError("OPENAI_API_KEY environment variable not set. Please ensure it is available.")
 
 reasoning_agent = Agent(
+    agent_id="reasoning-agent",
     name="Reasoning Agent",
-    model=OpenAIChat(
+    model=build_openai_model(
         id="gpt-4o",
         api_key=openai_api_key,
     ),
     tools=[
-        DuckDuckGoTools(),
-        YFinanceTools(
+        WebResearchTools(),
+        FinanceDataTools(
             stock_price=True,
             company_info=True,
         ),
@@ -32,9 +32,10 @@ reasoning_agent = Agent(
         "展示你的思考过程",
         "分步骤解决问题",
         "使用你的工具来获取信息",
+        "需要网络资料时，调用一次web_research，它会返回多个网页的正文内容，不要反复搜索",
         "使用表格和图表来展示数据",
     ],
-    storage=PostgresAgentStorage(table_name="reasoning_agent", db_engine=get_shared_db_engine()),
+    storage=build_agent_storage("reasoning_agent"),
     add_datetime_to_instructions=True,
     add_history_to_messages=True,
     num_history_responses=5,
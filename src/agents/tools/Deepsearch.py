@@ -1,28 +1,191 @@
 import os
-from openai import OpenAI
+import sys
+import asyncio
+import threading
+import weakref
+from pathlib import Path
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Sequence, AsyncIterator, Iterator, Tuple
+
+# Handle both direct execution and module import
+try:
+    from ...infra.cache import TieredCache, make_cache_key
+    from ...infra.llm import get_async_openai_client, get_openai_client
+    from ...infra.governor import charge_token_budget, token_budget_exhausted
+    from ...infra.telemetry import finish_span, record_usage, span, start_span
+except ImportError:
+    # If running directly, add the project root to path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+    from src.infra.cache import TieredCache, make_cache_key
+    from src.infra.llm import get_async_openai_client, get_openai_client
+    from src.infra.governor import charge_token_budget, token_budget_exhausted
+    from src.infra.telemetry import finish_span, record_usage, span, start_span
 
 # Load environment variables
 load_dotenv()
 
+PERPLEXITY_BASE_URL = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+
+# Request timeout / concurrency settings; the connection pool is the shared one from infra.llm
+DEEPSEARCH_TIMEOUT = float(os.getenv("DEEPSEARCH_TIMEOUT", "120"))
+DEEPSEARCH_CONCURRENCY = int(os.getenv("DEEPSEARCH_CONCURRENCY", "6"))
+
+# Response cache settings (memory LRU tier + shared Postgres tier)
+DEEPSEARCH_CACHE = os.getenv("DEEPSEARCH_CACHE", "true").lower() == "true"
+DEEPSEARCH_CACHE_PERSISTENT = os.getenv("DEEPSEARCH_CACHE_PERSISTENT", "true").lower() == "true"
+DEEPSEARCH_CACHE_TTL = float(os.getenv("DEEPSEARCH_CACHE_TTL", "86400"))
+DEEPSEARCH_CACHE_MAX_ENTRIES = int(os.getenv("DEEPSEARCH_CACHE_MAX_ENTRIES", "256"))
+DEEPSEARCH_CACHE_MAX_ENTRY_BYTES = int(os.getenv("DEEPSEARCH_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+DEEPSEARCH_CACHE_MAX_ROWS = int(os.getenv("DEEPSEARCH_CACHE_MAX_ROWS", "5000"))
+DEEPSEARCH_CACHE_REPLAY_CHUNK_SIZE = int(os.getenv("DEEPSEARCH_CACHE_REPLAY_CHUNK_SIZE", "400"))
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful assistant that provides accurate, "
+    "up-to-date information based on web search results. "
+    "Please provide detailed and factual responses."
+)
+
+_deepsearch_cache: Optional[TieredCache] = None
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_deepsearch_cache() -> Optional[TieredCache]:
+    """
+    Returns the shared Deepsearch response cache, or None if caching is disabled.
+    Creates the cache if it doesn't exist yet.
+    """
+    global _deepsearch_cache
+    if not DEEPSEARCH_CACHE:
+        return None
+    if _deepsearch_cache is None:
+        _deepsearch_cache = TieredCache(
+            "deepsearch",
+            ttl=DEEPSEARCH_CACHE_TTL,
+            max_entries=DEEPSEARCH_CACHE_MAX_ENTRIES,
+            max_entry_bytes=DEEPSEARCH_CACHE_MAX_ENTRY_BYTES,
+            persistent=DEEPSEARCH_CACHE_PERSISTENT,
+            max_rows=DEEPSEARCH_CACHE_MAX_ROWS,
+        )
+    return _deepsearch_cache
+
+
+def run_sync(coro):
+    """
+    Run a coroutine from synchronous code and return its result.
+
+    Coroutines are executed on one long-lived background event loop, so sync
+    callers (agent tools, scripts) reuse the same warm connection pool instead
+    of opening a new one with every asyncio.run().
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None or _background_loop.is_closed():
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_background_loop.run_forever,
+                name="deepsearch-loop",
+                daemon=True,
+            ).start()
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
+
+
+def _cache_key(query: str, model: str, system_prompt: Optional[str]) -> str:
+    """Cache key on normalized (model, system_prompt, query)."""
+    return make_cache_key(model, system_prompt if system_prompt is not None else DEFAULT_SYSTEM_PROMPT, query)
+
+
+def _cached_result(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a search() result from a cache entry."""
+    return {
+        "success": True,
+        "content": entry["content"],
+        "model": entry.get("model"),
+        "usage": entry.get("usage"),
+        "cached": True
+    }
+
+
+def _replay_chunks(entry: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Replay a cached answer as streaming chunks so a cache hit looks like a live stream."""
+    content = entry["content"] or ""
+    for start in range(0, len(content), DEEPSEARCH_CACHE_REPLAY_CHUNK_SIZE):
+        yield {
+            "success": True,
+            "content": content[start:start + DEEPSEARCH_CACHE_REPLAY_CHUNK_SIZE],
+            "finished": False,
+            "cached": True
+        }
+    yield {"success": True, "content": "", "finished": True, "cached": True, "usage": entry.get("usage")}
+
+
+def _record_result(current, result: Dict[str, Any]) -> None:
+    """Copy cache hit, token usage and errors of a search result onto its span."""
+    current.set(cache_hit=bool(result.get("cached")))
+    if not result.get("cached"):
+        record_usage(current, result.get("usage"))
+        charge_token_budget(result.get("usage"))
+    if not result["success"]:
+        current.fail(result["error"])
+
+
+def _record_chunk(current, chunk: Dict[str, Any]) -> None:
+    """Track time to first token, usage and errors of a streaming search on its span."""
+    if "ttft" not in current.attributes and chunk.get("content"):
+        current.set(ttft=current.elapsed())
+    if chunk.get("finished"):
+        current.set(cache_hit=bool(chunk.get("cached")))
+        if not chunk.get("cached"):
+            record_usage(current, chunk.get("usage"))
+            charge_token_budget(chunk.get("usage"))
+        if not chunk["success"]:
+            current.fail(chunk["error"])
+
+
+def _budget_exhausted_result() -> Dict[str, Any]:
+    """Result of a search skipped because the request's token budget is used up."""
+    return {"success": False, "error": "Token budget for this request is used up", "content": None}
+
+
+def _build_messages(query: str, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+    """Build the chat messages for a search query."""
+    return [
+        {
+            "role": "system",
+            "content": system_prompt if system_prompt is not None else DEFAULT_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": query
+        }
+    ]
+
 
 class Deepsearch:
     """
     A simple wrapper for Perplexity API to perform deep search queries.
     """
     
-    def __init__(self):
-        """Initialize the Deepsearch client with Perplexity API."""
+    def __init__(self, use_cache: bool = True):
+        """
+        Initialize the Deepsearch client with Perplexity API.
+
+        Args:
+            use_cache (bool): Serve repeated queries from the shared response cache.
+        """
         self.api_key = os.getenv("PERPLEXITY_API_KEY")
         if not self.api_key:
             raise ValueError("PERPLEXITY_API_KEY not found in environment variables")
         
         # Initialize OpenAI client with Perplexity API base URL
-        self.client = OpenAI(
+        self.client: OpenAI = get_openai_client(
             api_key=self.api_key,
-            base_url="https://api.perplexity.ai"
+            base_url=PERPLEXITY_BASE_URL,
+            timeout=DEEPSEARCH_TIMEOUT,
         )
+        self.cache = get_deepsearch_cache() if use_cache else None
     
     def search(self, query: str, model: str = "sonar-pro", 
                system_prompt: Optional[str] = None) -> Dict[str, Any]:
@@ -45,24 +208,20 @@ class Deepsearch:
         Returns:
             Dict[str, Any]: The response from Perplexity API
         """
-        # Default system prompt if none provided
-        if system_prompt is None:
-            system_prompt = (
-                "You are a helpful assistant that provides accurate, "
-                "up-to-date information based on web search results. "
-                "Please provide detailed and factual responses."
-            )
-        
-        messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user", 
-                "content": query
-            }
-        ]
+        with span("external", "deepsearch.search", model=model) as current:
+            result = self._search(query, model=model, system_prompt=system_prompt)
+            _record_result(current, result)
+            return result
+
+    def _search(self, query: str, model: str, system_prompt: Optional[str]) -> Dict[str, Any]:
+        messages = _build_messages(query, system_prompt)
+        cache_key = _cache_key(query, model, system_prompt)
+        if self.cache is not None:
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                return _cached_result(entry)
+        if token_budget_exhausted():
+            return _budget_exhausted_result()
         
         try:
             response = self.client.chat.completions.create(
@@ -70,12 +229,15 @@ class Deepsearch:
                 messages=messages
             )
             
-            return {
+            result = {
                 "success": True,
                 "content": response.choices[0].message.content,
                 "model": model,
                 "usage": response.usage.model_dump() if response.usage else None
             }
+            if self.cache is not None:
+                self.cache.set(cache_key, {"content": result["content"], "model": model, "usage": result["usage"]})
+            return result
             
         except Exception as e:
             return {
@@ -105,24 +267,25 @@ class Deepsearch:
         Yields:
             Dict[str, Any]: Streaming response chunks from Perplexity API
         """
-        # Default system prompt if none provided
-        if system_prompt is None:
-            system_prompt = (
-                "You are a helpful assistant that provides accurate, "
-                "up-to-date information based on web search results. "
-                "Please provide detailed and factual responses."
-            )
-        
-        messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": query
-            }
-        ]
+        current = start_span("external", "deepsearch.search_streaming", model=model)
+        try:
+            for chunk in self._search_streaming(query, model=model, system_prompt=system_prompt):
+                _record_chunk(current, chunk)
+                yield chunk
+        finally:
+            finish_span(current)
+
+    def _search_streaming(self, query: str, model: str, system_prompt: Optional[str]) -> Iterator[Dict[str, Any]]:
+        messages = _build_messages(query, system_prompt)
+        cache_key = _cache_key(query, model, system_prompt)
+        if self.cache is not None:
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                yield from _replay_chunks(entry)
+                return
+        if token_budget_exhausted():
+            yield dict(_budget_exhausted_result(), finished=True)
+            return
         
         try:
             response_stream = self.client.chat.completions.create(
@@ -131,15 +294,22 @@ class Deepsearch:
                 stream=True
             )
             
+            parts = []
+            usage = None
             for chunk in response_stream:
-                if chunk.choices[0].delta.content:
+                if chunk.usage:
+                    usage = chunk.usage.model_dump()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
                     yield {
                         "success": True,
                         "content": chunk.choices[0].delta.content,
                         "finished": False
                     }
             
-            yield {"success": True, "content": "", "finished": True}
+            if self.cache is not None and parts:
+                self.cache.set(cache_key, {"content": "".join(parts), "model": model, "usage": usage})
+            yield {"success": True, "content": "", "finished": True, "usage": usage}
             
         except Exception as e:
             yield {
@@ -150,6 +320,220 @@ class Deepsearch:
             }
 
 
+class AsyncDeepsearch:
+    """
+    Non-blocking counterpart of Deepsearch built on a shared, pooled AsyncClient.
+
+    Returns the same result dictionaries as Deepsearch, and adds search_many()
+    to run several sub-queries concurrently under a concurrency limit.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 use_cache: bool = True):
+        """
+        Initialize the AsyncDeepsearch client with Perplexity API.
+
+        Args:
+            max_concurrency (int, optional): Maximum number of in-flight requests
+                per event loop. Defaults to DEEPSEARCH_CONCURRENCY.
+            timeout (float, optional): Request timeout in seconds. Defaults to
+                DEEPSEARCH_TIMEOUT.
+            use_cache (bool): Serve repeated queries from the shared response cache.
+        """
+        self.api_key = os.getenv("PERPLEXITY_API_KEY")
+        if not self.api_key:
+            raise ValueError("PERPLEXITY_API_KEY not found in environment variables")
+
+        self.max_concurrency = max_concurrency or DEEPSEARCH_CONCURRENCY
+        self.timeout = timeout or DEEPSEARCH_TIMEOUT
+        self.cache = get_deepsearch_cache() if use_cache else None
+        # Semaphores are loop-bound, so keep one per event loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _get_client(self) -> AsyncOpenAI:
+        return get_async_openai_client(api_key=self.api_key, base_url=PERPLEXITY_BASE_URL, timeout=self.timeout)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def search(self, query: str, model: str = "sonar-pro",
+                     system_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Perform a search query using Perplexity API without blocking the event loop.
+
+        Args:
+            query (str): The search query to execute
+            model (str): The model to use for the search (see Deepsearch.search)
+            system_prompt (str, optional): Custom system prompt for the search
+
+        Returns:
+            Dict[str, Any]: The response from Perplexity API
+        """
+        with span("external", "deepsearch.search", model=model) as current:
+            result = await self._search(query, model=model, system_prompt=system_prompt)
+            _record_result(current, result)
+            return result
+
+    async def _search(self, query: str, model: str, system_prompt: Optional[str]) -> Dict[str, Any]:
+        messages = _build_messages(query, system_prompt)
+        cache_key = _cache_key(query, model, system_prompt)
+        if self.cache is not None:
+            entry = await self.cache.aget(cache_key)
+            if entry is not None:
+                return _cached_result(entry)
+        if token_budget_exhausted():
+            return _budget_exhausted_result()
+
+        try:
+            async with self._get_semaphore():
+                response = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=messages
+                )
+
+            result = {
+                "success": True,
+                "content": response.choices[0].message.content,
+                "model": model,
+                "usage": response.usage.model_dump() if response.usage else None
+            }
+            if self.cache is not None:
+                await self.cache.aset(cache_key, {"content": result["content"], "model": model, "usage": result["usage"]})
+            return result
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "content": None
+            }
+
+    async def search_streaming(self, query: str, model: str = "sonar-pro",
+                               system_prompt: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Perform a streaming search query using Perplexity API.
+
+        Args:
+            query (str): The search query to execute
+            model (str): The model to use for the search (see Deepsearch.search)
+            system_prompt (str, optional): Custom system prompt for the search
+
+        Yields:
+            Dict[str, Any]: Streaming response chunks from Perplexity API
+        """
+        current = start_span("external", "deepsearch.search_streaming", model=model)
+        try:
+            async for chunk in self._search_streaming(query, model=model, system_prompt=system_prompt):
+                _record_chunk(current, chunk)
+                yield chunk
+        finally:
+            finish_span(current)
+
+    async def _search_streaming(self, query: str, model: str,
+                                system_prompt: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        messages = _build_messages(query, system_prompt)
+        cache_key = _cache_key(query, model, system_prompt)
+        if self.cache is not None:
+            entry = await self.cache.aget(cache_key)
+            if entry is not None:
+                for chunk in _replay_chunks(entry):
+                    yield chunk
+                return
+        if token_budget_exhausted():
+            yield dict(_budget_exhausted_result(), finished=True)
+            return
+
+        try:
+            parts = []
+            async with self._get_semaphore():
+                response_stream = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True
+                )
+
+                usage = None
+                async for chunk in response_stream:
+                    if chunk.usage:
+                        usage = chunk.usage.model_dump()
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield {
+                            "success": True,
+                            "content": chunk.choices[0].delta.content,
+                            "finished": False
+                        }
+
+            if self.cache is not None and parts:
+                await self.cache.aset(cache_key, {"content": "".join(parts), "model": model, "usage": usage})
+            yield {"success": True, "content": "", "finished": True, "usage": usage}
+
+        except Exception as e:
+            yield {
+                "success": False,
+                "error": str(e),
+                "content": None,
+                "finished": True
+            }
+
+    async def stream_many(self, queries: Sequence[str], model: str = "sonar-pro",
+                          system_prompt: Optional[str] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Run several streaming search queries concurrently and yield their chunks as they arrive.
+
+        Args:
+            queries (Sequence[str]): The search queries to execute
+            model (str): The model to use for every query
+            system_prompt (str, optional): Custom system prompt shared by all queries
+
+        Yields:
+            Tuple[int, Dict[str, Any]]: The index of the query and one of its streaming
+                chunks. Every query ends with exactly one chunk where finished is True.
+        """
+        queue: "asyncio.Queue[Tuple[int, Dict[str, Any]]]" = asyncio.Queue()
+
+        async def pump(index: int, query: str) -> None:
+            try:
+                async for chunk in self.search_streaming(query, model=model, system_prompt=system_prompt):
+                    await queue.put((index, chunk))
+            except Exception as e:
+                await queue.put((index, {"success": False, "error": str(e), "content": None, "finished": True}))
+
+        tasks = [asyncio.create_task(pump(index, query)) for index, query in enumerate(queries)]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                index, chunk = await queue.get()
+                if chunk["finished"]:
+                    remaining -= 1
+                yield index, chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search_many(self, queries: Sequence[str], model: str = "sonar-pro",
+                          system_prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Run several search queries concurrently.
+
+        Args:
+            queries (Sequence[str]): The search queries to execute
+            model (str): The model to use for every query
+            system_prompt (str, optional): Custom system prompt shared by all queries
+
+        Returns:
+            List[Dict[str, Any]]: One result per query, in the same order as queries
+        """
+        return list(await asyncio.gather(
+            *(self.search(query, model=model, system_prompt=system_prompt) for query in queries)
+        ))
+
+
 # Example usage
 if __name__ == "__main__":
     # Initialize the Deepsearch instance
@@ -180,3 +564,15 @@ if __name__ == "__main__":
         else:
             print(f"Error: {chunk['error']}")
             break
+
+    print("\n" + "="*50 + "\n")
+
+    # Example concurrent fan-out
+    print("=== Using AsyncDeepsearch.search_many ===")
+    async_searcher = AsyncDeepsearch()
+    results = run_sync(async_searcher.search_many([
+        "What are the latest developments in AI chips?",
+        "What are the latest developments in AI regulation?",
+    ]))
+    for result in results:
+        print(result["content"] if result["success"] else f"Error: {result['error']}")
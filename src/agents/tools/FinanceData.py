@@ -0,0 +1,356 @@
+import os
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+import yfinance as yf
+from agno.tools import Toolkit
+from agno.utils.log import log_debug
+from dotenv import load_dotenv
+
+# Handle both direct execution and module import
+try:
+    from ...infra.cache import TieredCache
+except ImportError:
+    # If running directly, add the project root to path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+    from src.infra.cache import TieredCache
+
+# Load environment variables
+load_dotenv()
+
+# Cache TTLs in seconds: quotes go stale quickly, company data rarely changes
+FINANCE_QUOTE_TTL = float(os.getenv("FINANCE_QUOTE_TTL", "60"))
+FINANCE_INFO_TTL = float(os.getenv("FINANCE_INFO_TTL", "86400"))
+FINANCE_RECOMMENDATIONS_TTL = float(os.getenv("FINANCE_RECOMMENDATIONS_TTL", "86400"))
+FINANCE_NEWS_TTL = float(os.getenv("FINANCE_NEWS_TTL", "900"))
+# Store entries in the shared Postgres tier so all workers see them
+FINANCE_CACHE_PERSISTENT = os.getenv("FINANCE_CACHE_PERSISTENT", "true").lower() == "true"
+FINANCE_CACHE_MAX_ENTRIES = int(os.getenv("FINANCE_CACHE_MAX_ENTRIES", "1024"))
+# Yahoo has no batch endpoint for company info, so those lookups run in a small pool
+FINANCE_FETCH_WORKERS = int(os.getenv("FINANCE_FETCH_WORKERS", "8"))
+
+_finance_store: Optional["FinanceDataStore"] = None
+_finance_store_lock = threading.Lock()
+
+
+def normalize_symbols(symbols: Sequence[str] | str) -> List[str]:
+    """Upper-case, strip and de-duplicate ticker symbols, keeping their order."""
+    if isinstance(symbols, str):
+        symbols = symbols.replace(";", ",").split(",")
+    seen: Dict[str, None] = {}
+    for symbol in symbols:
+        symbol = symbol.strip().upper()
+        if symbol:
+            seen.setdefault(symbol, None)
+    return list(seen)
+
+
+def _clean_number(value: Any) -> Optional[float]:
+    if value is None or pd.isna(value):
+        return None
+    return round(float(value), 4)
+
+
+def _clean_company_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    currency = info.get("currency", "USD")
+    return {
+        "Name": info.get("shortName"),
+        "Symbol": info.get("symbol"),
+        "Current Stock Price": f"{info.get('regularMarketPrice', info.get('currentPrice'))} {currency}",
+        "Market Cap": f"{info.get('marketCap', info.get('enterpriseValue'))} {currency}",
+        "Sector": info.get("sector"),
+        "Industry": info.get("industry"),
+        "Country": info.get("country"),
+        "EPS": info.get("trailingEps"),
+        "P/E Ratio": info.get("trailingPE"),
+        "52 Week Low": info.get("fiftyTwoWeekLow"),
+        "52 Week High": info.get("fiftyTwoWeekHigh"),
+        "50 Day Average": info.get("fiftyDayAverage"),
+        "200 Day Average": info.get("twoHundredDayAverage"),
+        "Website": info.get("website"),
+        "Summary": info.get("longBusinessSummary"),
+        "Analyst Recommendation": info.get("recommendationKey"),
+        "Number Of Analyst Opinions": info.get("numberOfAnalystOpinions"),
+        "Employees": info.get("fullTimeEmployees"),
+        "Total Cash": info.get("totalCash"),
+        "Free Cash flow": info.get("freeCashflow"),
+        "Operating Cash flow": info.get("operatingCashflow"),
+        "EBITDA": info.get("ebitda"),
+        "Revenue Growth": info.get("revenueGrowth"),
+        "Gross Margins": info.get("grossMargins"),
+        "Ebitda Margins": info.get("ebitdaMargins"),
+    }
+
+
+def parse_quotes(data: pd.DataFrame, symbols: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Turn a yf.download() frame into one quote per symbol.
+
+    Args:
+        data (pd.DataFrame): Daily bars, columns grouped by ticker.
+        symbols (Sequence[str]): Symbols that were requested.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Quotes of the symbols that had data.
+    """
+    quotes = {}
+    multi_index = isinstance(data.columns, pd.MultiIndex)
+    for symbol in symbols:
+        if multi_index:
+            if symbol not in data.columns.get_level_values(0):
+                continue
+            frame = data[symbol]
+        else:
+            frame = data
+        frame = frame.dropna(subset=["Close"])
+        if frame.empty:
+            continue
+        last = frame.iloc[-1]
+        previous_close = _clean_number(frame["Close"].iloc[-2]) if len(frame) > 1 else None
+        price = _clean_number(last["Close"])
+        change = round((price - previous_close) / previous_close * 100, 2) if price and previous_close else None
+        quotes[symbol] = {
+            "symbol": symbol,
+            "price": price,
+            "previous_close": previous_close,
+            "change_percent": change,
+            "open": _clean_number(last.get("Open")),
+            "day_high": _clean_number(last.get("High")),
+            "day_low": _clean_number(last.get("Low")),
+            "volume": _clean_number(last.get("Volume")),
+            "as_of": str(frame.index[-1].date()),
+        }
+    return quotes
+
+
+class FinanceDataStore:
+    """
+    Cached, batched access to Yahoo Finance data.
+
+    Every lookup first checks the shared cache (memory LRU + Postgres, so all
+    workers share entries) and only fetches the missing symbols: quotes for all
+    of them in a single yf.download() call, company info and recommendations
+    concurrently in a small thread pool.
+    """
+
+    def __init__(self, persistent: bool = FINANCE_CACHE_PERSISTENT, max_workers: Optional[int] = None):
+        """
+        Args:
+            persistent (bool): Also keep entries in the shared Postgres cache table.
+            max_workers (int, optional): Concurrent per-symbol lookups. Defaults to FINANCE_FETCH_WORKERS.
+        """
+        options = dict(max_entries=FINANCE_CACHE_MAX_ENTRIES, persistent=persistent)
+        self.quotes = TieredCache("yfinance_quotes", ttl=FINANCE_QUOTE_TTL, **options)
+        self.infos = TieredCache("yfinance_info", ttl=FINANCE_INFO_TTL, **options)
+        self.recommendations = TieredCache("yfinance_recommendations", ttl=FINANCE_RECOMMENDATIONS_TTL, **options)
+        self.news = TieredCache("yfinance_news", ttl=FINANCE_NEWS_TTL, **options)
+        self.max_workers = max_workers or FINANCE_FETCH_WORKERS
+
+    def _cached(self, cache: TieredCache, symbols: List[str],
+                fetch: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        results = {}
+        missing = []
+        for symbol in symbols:
+            value = cache.get(symbol)
+            if value is None:
+                missing.append(symbol)
+            else:
+                results[symbol] = value
+        if missing:
+            log_debug(f"Fetching {cache.namespace} for {', '.join(missing)}")
+            for symbol, value in fetch(missing).items():
+                cache.set(symbol, value)
+                results[symbol] = value
+        return {symbol: results[symbol] for symbol in symbols if symbol in results}
+
+    def _fetch_each(self, symbols: List[str], fetch_one: Callable[[str], Any]) -> Dict[str, Any]:
+        if len(symbols) == 1:
+            value = fetch_one(symbols[0])
+            return {symbols[0]: value} if value is not None else {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(symbols))) as pool:
+            values = list(pool.map(fetch_one, symbols))
+        return {symbol: value for symbol, value in zip(symbols, values) if value is not None}
+
+    def _fetch_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        data = yf.download(
+            tickers=symbols,
+            period="5d",
+            interval="1d",
+            group_by="ticker",
+            auto_adjust=False,
+            threads=True,
+            progress=False,
+        )
+        if data is None or data.empty:
+            return {}
+        return parse_quotes(data, symbols)
+
+    @staticmethod
+    def _fetch_info(symbol: str) -> Optional[Dict[str, Any]]:
+        try:
+            info = yf.Ticker(symbol).info
+        except Exception as e:
+            log_debug(f"Could not fetch company info for {symbol}: {e}")
+            return None
+        return _clean_company_info(info) if info else None
+
+    @staticmethod
+    def _fetch_recommendations(symbol: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            recommendations = yf.Ticker(symbol).recommendations
+        except Exception as e:
+            log_debug(f"Could not fetch analyst recommendations for {symbol}: {e}")
+            return None
+        if recommendations is None or recommendations.empty:
+            return None
+        return json.loads(recommendations.to_json(orient="records"))
+
+    def get_quotes(self, symbols: Sequence[str] | str) -> Dict[str, Dict[str, Any]]:
+        """Latest daily quote per symbol, fetched in one batched download."""
+        return self._cached(self.quotes, normalize_symbols(symbols), self._fetch_quotes)
+
+    def get_company_infos(self, symbols: Sequence[str] | str) -> Dict[str, Dict[str, Any]]:
+        """Company profile per symbol."""
+        return self._cached(self.infos, normalize_symbols(symbols),
+                            lambda missing: self._fetch_each(missing, self._fetch_info))
+
+    def get_recommendations(self, symbols: Sequence[str] | str) -> Dict[str, List[Dict[str, Any]]]:
+        """Analyst recommendation trend per symbol."""
+        return self._cached(self.recommendations, normalize_symbols(symbols),
+                            lambda missing: self._fetch_each(missing, self._fetch_recommendations))
+
+    def get_news(self, symbol: str, num_stories: int = 3) -> List[Dict[str, Any]]:
+        """Latest news stories for one symbol."""
+        symbol = normalize_symbols(symbol)[0]
+        news = self._cached(self.news, [symbol], lambda missing: {missing[0]: yf.Ticker(missing[0]).news or []})
+        return news.get(symbol, [])[:num_stories]
+
+
+def get_finance_store() -> FinanceDataStore:
+    """
+    Returns the shared FinanceDataStore.
+    Creates the store if it doesn't exist yet.
+    """
+    global _finance_store
+    with _finance_store_lock:
+        if _finance_store is None:
+            _finance_store = FinanceDataStore()
+        return _finance_store
+
+
+class FinanceDataTools(Toolkit):
+    """
+    Batched and cached replacement for agno's YFinanceTools.
+
+    Every function takes a list of symbols, so comparing several companies is one
+    tool call and one Yahoo request instead of one per ticker.
+    """
+
+    def __init__(
+        self,
+        stock_price: bool = True,
+        company_info: bool = False,
+        analyst_recommendations: bool = False,
+        company_news: bool = False,
+        store: Optional[FinanceDataStore] = None,
+        **kwargs,
+    ):
+        super().__init__(name="finance_data_tools", **kwargs)
+        self.store = store or get_finance_store()
+
+        if stock_price:
+            self.register(self.get_stock_prices)
+        if company_info:
+            self.register(self.get_company_info)
+        if analyst_recommendations:
+            self.register(self.get_analyst_recommendations)
+        if company_news:
+            self.register(self.get_company_news)
+
+    @staticmethod
+    def _result(symbols: List[str], data: Dict[str, Any], what: str) -> str:
+        missing = [symbol for symbol in symbols if symbol not in data]
+        if missing:
+            data = dict(data, errors={symbol: f"Could not fetch {what}" for symbol in missing})
+        return json.dumps(data, indent=2, default=str)
+
+    def get_stock_prices(self, symbols: List[str]) -> str:
+        """
+        Use this function to get the current stock price of one or more symbols.
+        Pass all symbols you need in a single call.
+
+        Args:
+            symbols (List[str]): The stock symbols, e.g. ["AAPL", "MSFT"].
+
+        Returns:
+            str: JSON with the latest price, previous close, change and volume per symbol.
+        """
+        symbols = normalize_symbols(symbols)
+        try:
+            return self._result(symbols, self.store.get_quotes(symbols), "current price")
+        except Exception as e:
+            return f"Error fetching current prices for {', '.join(symbols)}: {e}"
+
+    def get_company_info(self, symbols: List[str]) -> str:
+        """
+        Use this function to get company information and overview for one or more stock symbols.
+        Pass all symbols you need in a single call.
+
+        Args:
+            symbols (List[str]): The stock symbols, e.g. ["AAPL", "MSFT"].
+
+        Returns:
+            str: JSON containing the company profile and overview per symbol.
+        """
+        symbols = normalize_symbols(symbols)
+        try:
+            return self._result(symbols, self.store.get_company_infos(symbols), "company info")
+        except Exception as e:
+            return f"Error fetching company profile for {', '.join(symbols)}: {e}"
+
+    def get_analyst_recommendations(self, symbols: List[str]) -> str:
+        """
+        Use this function to get analyst recommendations for one or more stock symbols.
+        Pass all symbols you need in a single call.
+
+        Args:
+            symbols (List[str]): The stock symbols, e.g. ["AAPL", "MSFT"].
+
+        Returns:
+            str: JSON containing the analyst recommendation trend per symbol.
+        """
+        symbols = normalize_symbols(symbols)
+        try:
+            return self._result(symbols, self.store.get_recommendations(symbols), "analyst recommendations")
+        except Exception as e:
+            return f"Error fetching analyst recommendations for {', '.join(symbols)}: {e}"
+
+    def get_company_news(self, symbol: str, num_stories: int = 3) -> str:
+        """
+        Use this function to get company news and press releases for a given stock symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+            num_stories (int): The number of news stories to return. Defaults to 3.
+
+        Returns:
+            str: JSON containing company news and press releases.
+        """
+        try:
+            return json.dumps(self.store.get_news(symbol, num_stories), indent=2, default=str)
+        except Exception as e:
+            return f"Error fetching company news for {symbol}: {e}"
+
+
+# Usage example
+if __name__ == "__main__":
+    tools = FinanceDataTools(company_info=True)
+    print(tools.get_stock_prices(["AAPL", "MSFT", "NVDA"]))
+    # Served from the cache this time
+    print(tools.get_stock_prices(["msft", "aapl"]))
+    print(tools.get_company_info(["AAPL"]))
@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from agno.tools.tavily import TavilyTools
+from dotenv import load_dotenv
+
+# Handle both direct execution and module import
+try:
+    from ...infra.cache import TieredCache, make_cache_key, normalize_text
+    from ...infra.telemetry import metrics, span
+except ImportError:
+    # If running directly, add the project root to path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+    from src.infra.cache import TieredCache, make_cache_key, normalize_text
+    from src.infra.telemetry import metrics, span
+
+# Load environment variables
+load_dotenv()
+
+# Search result cache settings (memory LRU tier + shared Postgres tier)
+TAVILY_CACHE = os.getenv("TAVILY_CACHE", "true").lower() == "true"
+TAVILY_CACHE_PERSISTENT = os.getenv("TAVILY_CACHE_PERSISTENT", "true").lower() == "true"
+TAVILY_CACHE_TTL = float(os.getenv("TAVILY_CACHE_TTL", "21600"))
+TAVILY_CACHE_MAX_ENTRIES = int(os.getenv("TAVILY_CACHE_MAX_ENTRIES", "1024"))
+TAVILY_CACHE_MAX_ENTRY_BYTES = int(os.getenv("TAVILY_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+TAVILY_CACHE_MAX_ROWS = int(os.getenv("TAVILY_CACHE_MAX_ROWS", "10000"))
+
+# API credits per search, by search depth (used to report the spend the cache saved)
+TAVILY_CREDITS = {"basic": 1, "advanced": 2}
+
+# Results of the searches made by the current team run, shared by all its members
+_run_results: contextvars.ContextVar[Optional[Dict[str, Dict[str, Any]]]] = contextvars.ContextVar(
+    "tavily_run_results", default=None
+)
+
+_tavily_cache: Optional["TavilySearchCache"] = None
+_tavily_cache_lock = threading.Lock()
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Collapse whitespace and case and drop trailing punctuation, so rephrasings of the same query share results."""
+    return normalize_text(query).rstrip("?.!").strip()
+
+
+def search_key(query: str, params: Dict[str, Any]) -> str:
+    """Cache key on the normalized query and the search parameters that change the results."""
+    params = {name: value for name, value in params.items() if name != "timeout" and value is not None}
+    return make_cache_key(normalize_query(query), json.dumps(params, sort_keys=True, default=str))
+
+
+class TavilySearchCache:
+    """
+    Caches Tavily search results at two levels: the current run (every member of
+    a team sees the same results for the same query) and a shared TieredCache
+    across runs and workers. Identical searches that are in flight at the same
+    time are made once; the other callers wait for that result.
+
+    Every lookup is counted in agent_cache_requests_total{kind="search"} as
+    run_hit, hit, shared (joined an in-flight search) or miss, and the upstream
+    time and API credits the hits saved are added to agent_search_saved_*.
+    """
+
+    def __init__(self, cache: Optional[TieredCache] = None):
+        self.cache = cache
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def search(self, search: Callable[..., Dict[str, Any]], query: str, **params) -> Dict[str, Any]:
+        """
+        Returns the results for a query from the run, the cache or an in-flight
+        search, and only calls Tavily when none of them has it.
+
+        Args:
+            search: The uncached TavilyClient.search.
+            query (str): The search query.
+            **params: The other TavilyClient.search arguments.
+
+        Returns:
+            Dict[str, Any]: The Tavily response.
+        """
+        key = search_key(query, params)
+        run_results = _run_results.get()
+        with span("external", "tavily.search", search_depth=params.get("search_depth")) as current:
+            entry = run_results.get(key) if run_results is not None else None
+            if entry is not None:
+                return self._hit(current, "run_hit", entry)
+
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+            if not leader:
+                entry = future.result()
+                self._remember(run_results, key, entry)
+                return self._hit(current, "shared", entry)
+
+            try:
+                entry = self.cache.get(key) if self.cache is not None else None
+                result = "hit" if entry is not None else "miss"
+                if entry is None:
+                    start = time.perf_counter()
+                    response = search(query, **params)
+                    entry = {
+                        "response": response,
+                        "seconds": round(time.perf_counter() - start, 4),
+                        "credits": TAVILY_CREDITS.get(params.get("search_depth") or "basic", 1),
+                    }
+                    if self.cache is not None:
+                        self.cache.set(key, entry)
+                future.set_result(entry)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+            self._remember(run_results, key, entry)
+            if result == "miss":
+                current.set(search_cache="miss")
+                _record_lookup("miss")
+                return entry["response"]
+            return self._hit(current, "hit", entry)
+
+    @staticmethod
+    def _remember(run_results: Optional[Dict[str, Dict[str, Any]]], key: str, entry: Dict[str, Any]) -> None:
+        if run_results is not None:
+            run_results.setdefault(key, entry)
+
+    @staticmethod
+    def _hit(current, result: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        current.set(search_cache=result)
+        _record_lookup(result)
+        metrics.inc("agent_search_saved_seconds_total", entry.get("seconds") or 0,
+                    help="Upstream search time saved by cached and shared results.", name="tavily")
+        metrics.inc("agent_search_saved_credits_total", entry.get("credits") or 0,
+                    help="Search API credits saved by cached and shared results.", name="tavily")
+        return entry["response"]
+
+
+def _record_lookup(result: str) -> None:
+    metrics.inc("agent_cache_requests_total", help="Cache lookups by result.",
+                kind="search", name="tavily", result=result)
+
+
+def get_tavily_search_cache() -> TavilySearchCache:
+    """
+    Returns the process-wide Tavily search cache.
+    Creates the cache if it doesn't exist yet.
+    """
+    global _tavily_cache
+    if _tavily_cache is None:
+        with _tavily_cache_lock:
+            if _tavily_cache is None:
+                cache = None
+                if TAVILY_CACHE:
+                    cache = TieredCache(
+                        "tavily",
+                        ttl=TAVILY_CACHE_TTL,
+                        max_entries=TAVILY_CACHE_MAX_ENTRIES,
+                        max_entry_bytes=TAVILY_CACHE_MAX_ENTRY_BYTES,
+                        persistent=TAVILY_CACHE_PERSISTENT,
+                        max_rows=TAVILY_CACHE_MAX_ROWS,
+                    )
+                _tavily_cache = TavilySearchCache(cache)
+    return _tavily_cache
+
+
+def cache_tavily_search(tools: TavilyTools) -> TavilyTools:
+    """
+    Route the searches of a Tavily toolkit through the shared search cache.
+
+    Args:
+        tools (TavilyTools): The toolkit to patch.
+
+    Returns:
+        TavilyTools: The same toolkit, for chaining.
+    """
+    search = tools.client.search
+    search_cache = get_tavily_search_cache()
+
+    def cached_search(query: str, **params) -> Dict[str, Any]:
+        return search_cache.search(search, query, **params)
+
+    tools.client.search = cached_search
+    return tools
+
+
+def _scoped_stream(stream: Iterator[Any], results: Dict[str, Dict[str, Any]]) -> Iterator[Any]:
+    while True:
+        token = _run_results.set(results)
+        try:
+            chunk = next(stream)
+        except StopIteration:
+            return
+        finally:
+            _run_results.reset(token)
+        yield chunk
+
+
+async def _ascoped_stream(stream: AsyncIterator[Any], results: Dict[str, Dict[str, Any]]) -> AsyncIterator[Any]:
+    while True:
+        token = _run_results.set(results)
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            _run_results.reset(token)
+        yield chunk
+
+
+def scope_search_results(runner: Any) -> Any:
+    """
+    Share search results between everything one run of an agent, team or
+    ParallelTeamRunner does. Runs started inside another scoped run share the
+    outer run's results.
+
+    Args:
+        runner: An agno Agent or Team, or anything with an arun() method.
+
+    Returns:
+        The same object, for chaining.
+    """
+    if getattr(runner, "_search_results_scoped", False):
+        return runner
+    run, arun = getattr(runner, "run", None), runner.arun
+
+    def scoped_run(*args, **kwargs):
+        if _run_results.get() is not None:
+            return run(*args, **kwargs)
+        results: Dict[str, Dict[str, Any]] = {}
+        token = _run_results.set(results)
+        try:
+            result = run(*args, **kwargs)
+        finally:
+            _run_results.reset(token)
+        return _scoped_stream(result, results) if isinstance(result, Iterator) else result
+
+    async def scoped_arun(*args, **kwargs):
+        if _run_results.get() is not None:
+            return await arun(*args, **kwargs)
+        results: Dict[str, Dict[str, Any]] = {}
+        token = _run_results.set(results)
+        try:
+            result = await arun(*args, **kwargs)
+        finally:
+            _run_results.reset(token)
+        return _ascoped_stream(result, results) if isinstance(result, AsyncIterator) else result
+
+    if run is not None:
+        runner.run = scoped_run
+    runner.arun = scoped_arun
+    runner._search_results_scoped = True
+    return runner
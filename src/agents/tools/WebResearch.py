@@ -0,0 +1,496 @@
+import os
+import re
+import sys
+import socket
+import asyncio
+import contextlib
+import ipaddress
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpcore
+import httpx
+from agno.tools import Toolkit
+from agno.utils.log import log_debug
+from dotenv import load_dotenv
+
+# Handle both direct execution and module import
+try:
+    from .Deepsearch import run_sync
+    from ...infra.cache import TieredCache, normalize_text
+    from ...infra.history import count_tokens, truncate_tokens
+    from ...infra.telemetry import span
+except ImportError:
+    # If running directly, add the project root to path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+    from src.agents.tools.Deepsearch import run_sync
+    from src.infra.cache import TieredCache, normalize_text
+    from src.infra.history import count_tokens, truncate_tokens
+    from src.infra.telemetry import span
+
+# Load environment variables
+load_dotenv()
+
+# Search results that are fetched and read per query
+WEB_RESEARCH_MAX_RESULTS = int(os.getenv("WEB_RESEARCH_MAX_RESULTS", "5"))
+# Tokens of page content returned per tool call, shared by all pages
+WEB_RESEARCH_MAX_TOKENS = int(os.getenv("WEB_RESEARCH_MAX_TOKENS", "4000"))
+# Fetch settings: total and per-host concurrent requests, timeouts (seconds), page size cap
+WEB_RESEARCH_CONCURRENCY = int(os.getenv("WEB_RESEARCH_CONCURRENCY", "8"))
+WEB_RESEARCH_PER_HOST = int(os.getenv("WEB_RESEARCH_PER_HOST", "2"))
+WEB_RESEARCH_TIMEOUT = float(os.getenv("WEB_RESEARCH_TIMEOUT", "10"))
+WEB_RESEARCH_CONNECT_TIMEOUT = float(os.getenv("WEB_RESEARCH_CONNECT_TIMEOUT", "5"))
+WEB_RESEARCH_MAX_PAGE_BYTES = int(os.getenv("WEB_RESEARCH_MAX_PAGE_BYTES", str(2 * 1024 * 1024)))
+# Redirects followed per page; every target is checked like the page URL itself
+WEB_RESEARCH_MAX_REDIRECTS = int(os.getenv("WEB_RESEARCH_MAX_REDIRECTS", "5"))
+# HTML parsing runs in this many threads, off the event loop
+WEB_RESEARCH_EXTRACT_WORKERS = int(os.getenv("WEB_RESEARCH_EXTRACT_WORKERS", "4"))
+WEB_RESEARCH_USER_AGENT = os.getenv(
+    "WEB_RESEARCH_USER_AGENT", "Mozilla/5.0 (compatible; ai-workers-research/1.0)"
+)
+# Extracted pages are cached by URL (memory LRU tier + shared Postgres tier)
+WEB_RESEARCH_CACHE_TTL = float(os.getenv("WEB_RESEARCH_CACHE_TTL", "86400"))
+WEB_RESEARCH_CACHE_PERSISTENT = os.getenv("WEB_RESEARCH_CACHE_PERSISTENT", "true").lower() == "true"
+WEB_RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_RESEARCH_CACHE_MAX_ENTRIES", "512"))
+
+# Elements that never hold the main content
+_BOILERPLATE = ("script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "header", "footer", "aside")
+# Elements whose text is kept, in document order
+_BLOCKS = ("h1", "h2", "h3", "h4", "p", "li", "pre", "blockquote", "td")
+# Shorter blocks (menus, buttons, captions) are dropped unless they are headings
+_MIN_BLOCK_CHARS = 40
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|ref|ref_src)$")
+_WORD = re.compile(r"\w{3,}")
+
+_research_store: Optional["WebResearchStore"] = None
+_research_store_lock = threading.Lock()
+
+
+def normalize_url(url: str) -> str:
+    """Lower-case scheme and host, drop the fragment, tracking parameters and a trailing slash."""
+    parts = urlsplit(url.strip())
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(key)])
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def _check_http_url(url: str) -> None:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"only http(s) URLs can be read: {url}")
+
+
+async def public_addresses(host: str, port: int) -> List[str]:
+    """
+    Resolve a host and return its addresses, or raise ValueError if any of them
+    isn't public, so fetched pages (and the model) can't make the server request
+    localhost, the cloud metadata service or internal hosts.
+    """
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"could not resolve {host}") from e
+    addresses = []
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{host} resolves to a non-public address")
+        addresses.append(sockaddr[0])
+    return list(dict.fromkeys(addresses))
+
+
+async def check_public_url(url: str) -> None:
+    """Raise ValueError unless the URL is http(s) and its host resolves only to public addresses."""
+    _check_http_url(url)
+    parts = urlsplit(url)
+    await public_addresses(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+
+
+class _PublicNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that resolves every host itself and connects only to the
+    addresses it vetted. Checking the URL before the request isn't enough: the
+    connection would resolve the name again, and a rebinding DNS server can
+    answer with a public address first and a private one then. TLS still uses
+    the hostname for SNI and certificate checks, and requests keep their Host.
+    """
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await asyncio.wait_for(public_addresses(host, port), timeout)
+        except asyncio.TimeoutError as e:
+            raise httpcore.ConnectTimeout(f"resolving {host} timed out") from e
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error or httpcore.ConnectError(f"no address for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None,
+                                  socket_options=None) -> httpcore.AsyncNetworkStream:
+        raise httpcore.ConnectError("unix sockets can't be read")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class _PublicTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connections go through _PublicNetworkBackend."""
+
+    def __init__(self, limits: httpx.Limits):
+        super().__init__(limits=limits)
+        # httpx doesn't take a network backend, so its connection pool is rebuilt with ours
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=_PublicNetworkBackend(),
+        )
+
+
+def _clean_text(value: str) -> str:
+    return " ".join(value.split())
+
+
+def _extract_lxml(html: bytes) -> Tuple[str, List[str]]:
+    import lxml.html
+
+    document = lxml.html.document_fromstring(html)
+    for element in document.xpath("|".join(f"//{tag}" for tag in _BOILERPLATE)):
+        element.drop_tree()
+    title = _clean_text(document.findtext(".//title") or "")
+    roots = document.xpath("//article") or document.xpath("//main") or document.xpath("//*[@role='main']")
+    blocks = []
+    for root in roots or [document]:
+        for element in root.iter(*_BLOCKS):
+            # Nested blocks (a <p> inside an <li>) are read with their parent
+            if any(ancestor.tag in _BLOCKS for ancestor in element.iterancestors()):
+                continue
+            text = _clean_text(element.text_content())
+            if text and (len(text) >= _MIN_BLOCK_CHARS or element.tag.startswith("h")):
+                blocks.append(f"### {text}" if element.tag.startswith("h") else text)
+    return title, blocks
+
+
+def _extract_soup(html: bytes) -> Tuple[str, List[str]]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(list(_BOILERPLATE)):
+        element.decompose()
+    title = _clean_text(soup.title.get_text()) if soup.title else ""
+    root = soup.find("article") or soup.find("main") or soup.find(attrs={"role": "main"}) or soup
+    blocks = []
+    for element in root.find_all(list(_BLOCKS)):
+        if element.find_parent(list(_BLOCKS)) is not None:
+            continue
+        text = _clean_text(element.get_text(" "))
+        if text and (len(text) >= _MIN_BLOCK_CHARS or element.name.startswith("h")):
+            blocks.append(f"### {text}" if element.name.startswith("h") else text)
+    return title, blocks
+
+
+def extract_main_content(html: bytes) -> Dict[str, Any]:
+    """
+    Extract the title and the main text blocks of an HTML page with lxml,
+    falling back to BeautifulSoup's lenient parser for pages lxml rejects.
+
+    Args:
+        html (bytes): The raw page.
+
+    Returns:
+        Dict[str, Any]: {"title": str, "blocks": List[str]}; headings start with "### ".
+    """
+    try:
+        title, blocks = _extract_lxml(html)
+    except Exception as e:
+        log_debug(f"lxml could not parse the page, using BeautifulSoup: {e}")
+        title, blocks = _extract_soup(html)
+    return {"title": title, "blocks": blocks}
+
+
+def select_blocks(blocks: List[str], query: str, max_tokens: int, seen: set) -> str:
+    """
+    The blocks of a page that fit in max_tokens, most relevant to the query
+    first (shared query words), returned in page order. Blocks already in
+    `seen` (another page had them) are skipped and the chosen ones are added.
+    """
+    terms = set(_WORD.findall(query.casefold()))
+    candidates = []
+    for index, block in enumerate(blocks):
+        key = normalize_text(block)
+        if key in seen:
+            continue
+        words = set(_WORD.findall(key))
+        candidates.append((-len(terms & words), index, block, key))
+    chosen, used = [], 0
+    for _, index, block, key in sorted(candidates):
+        tokens = count_tokens(block)
+        if used + tokens > max_tokens:
+            if not chosen and max_tokens > 0:
+                chosen.append((index, truncate_tokens(block, max_tokens), key))
+            continue
+        chosen.append((index, block, key))
+        used += tokens
+    chosen.sort()
+    seen.update(key for _, _, key in chosen)
+    return "\n\n".join(block for _, block, _ in chosen)
+
+
+class _LoopState:
+    """Connection pool and concurrency limits of one event loop."""
+
+    def __init__(self):
+        limits = httpx.Limits(max_connections=WEB_RESEARCH_CONCURRENCY * 2, max_keepalive_connections=WEB_RESEARCH_CONCURRENCY)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(WEB_RESEARCH_TIMEOUT, connect=WEB_RESEARCH_CONNECT_TIMEOUT),
+            # Connects only to vetted public addresses; no proxies from the environment,
+            # they would be connected to instead of the page's host
+            transport=_PublicTransport(limits),
+            trust_env=False,
+            headers={"User-Agent": WEB_RESEARCH_USER_AGENT, "Accept": "text/html,application/xhtml+xml,text/plain"},
+            # Followed in WebResearchStore._download, after checking the target
+            follow_redirects=False,
+        )
+        self.limit = asyncio.Semaphore(WEB_RESEARCH_CONCURRENCY)
+        self.hosts: Dict[str, asyncio.Semaphore] = {}
+        # Requests holding or waiting for each host's semaphore
+        self._host_users: Counter = Counter()
+
+    @contextlib.asynccontextmanager
+    async def host_limit(self, host: str) -> AsyncIterator[None]:
+        semaphore = self.hosts.get(host)
+        if semaphore is None:
+            semaphore = self.hosts[host] = asyncio.Semaphore(WEB_RESEARCH_PER_HOST)
+        self._host_users[host] += 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                # Idle: drop it, so the map only holds hosts being fetched right now
+                del self._host_users[host]
+                del self.hosts[host]
+
+
+class WebResearchStore:
+    """
+    Searches the web and reads the top results: pages are fetched concurrently
+    on a pooled async client (WEB_RESEARCH_CONCURRENCY in total, WEB_RESEARCH_PER_HOST
+    per host), their main content is extracted in a thread pool, deduplicated
+    across pages and cut to a shared token budget. Extracted pages are cached by URL.
+    """
+
+    def __init__(self, persistent: bool = WEB_RESEARCH_CACHE_PERSISTENT, max_workers: Optional[int] = None):
+        """
+        Args:
+            persistent (bool): Also keep extracted pages in the shared Postgres cache table.
+            max_workers (int, optional): Threads extracting page content. Defaults to WEB_RESEARCH_EXTRACT_WORKERS.
+        """
+        self.pages = TieredCache(
+            "web_pages",
+            ttl=WEB_RESEARCH_CACHE_TTL,
+            max_entries=WEB_RESEARCH_CACHE_MAX_ENTRIES,
+            persistent=persistent,
+        )
+        self.extract_pool = ThreadPoolExecutor(
+            max_workers=max_workers or WEB_RESEARCH_EXTRACT_WORKERS, thread_name_prefix="web-extract"
+        )
+        # httpx/asyncio objects are bound to the loop that created them
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState()
+        return state
+
+    @staticmethod
+    def search(query: str, max_results: int) -> List[Dict[str, str]]:
+        """DuckDuckGo results as {"title", "href", "body"} dicts."""
+        from duckduckgo_search import DDGS
+
+        return DDGS(timeout=int(WEB_RESEARCH_TIMEOUT)).text(keywords=query, max_results=max_results) or []
+
+    async def _download(self, url: str) -> bytes:
+        state = self._state()
+        for _ in range(WEB_RESEARCH_MAX_REDIRECTS + 1):
+            # The host's addresses are checked when connecting, see _PublicNetworkBackend
+            _check_http_url(url)
+            async with state.limit, state.host_limit(urlsplit(url).netloc):
+                async with state.client.stream("GET", url) as response:
+                    if response.is_redirect:
+                        url = str(response.url.join(response.headers["location"]))
+                        continue
+                    response.raise_for_status()
+                    content_type = response.headers.get("content-type", "text/html")
+                    if "html" not in content_type and "text/plain" not in content_type:
+                        raise ValueError(f"unsupported content type {content_type}")
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= WEB_RESEARCH_MAX_PAGE_BYTES:
+                            break
+                    return b"".join(chunks)
+        raise ValueError(f"more than {WEB_RESEARCH_MAX_REDIRECTS} redirects")
+
+    async def afetch_page(self, url: str) -> Dict[str, Any]:
+        """
+        The extracted content of a page, from the cache or fetched now.
+
+        Returns:
+            Dict[str, Any]: {"url", "title", "blocks"}, or {"url", "error"} if the page could not be read.
+        """
+        url = normalize_url(url)
+        with span("external", "web_research.fetch", url=url) as current:
+            page = await self.pages.aget(url)
+            current.set(cache_hit=page is not None)
+            if page is not None:
+                return page
+            try:
+                html = await self._download(url)
+                page = await asyncio.get_running_loop().run_in_executor(self.extract_pool, extract_main_content, html)
+            except Exception as e:
+                error = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else str(e) or type(e).__name__
+                log_debug(f"Could not read {url}: {error}")
+                current.set(error=error)
+                return {"url": url, "error": error}
+            page = dict(page, url=url)
+            if page["blocks"]:
+                await self.pages.aset(url, page)
+            return page
+
+    async def aread_pages(self, query: str, urls: List[str], snippets: Optional[Dict[str, str]] = None,
+                          max_tokens: int = WEB_RESEARCH_MAX_TOKENS) -> str:
+        """
+        Fetch pages concurrently and return their content relevant to the query.
+
+        Args:
+            query (str): What the content should be relevant to.
+            urls (List[str]): Pages to read, in order of importance.
+            snippets (Dict[str, str], optional): Search snippets by normalized URL, used for pages that can't be read.
+            max_tokens (int): Token budget shared by all pages.
+
+        Returns:
+            str: Markdown with one section per page.
+        """
+        urls = list(dict.fromkeys(normalize_url(url) for url in urls))
+        pages = await asyncio.gather(*(self.afetch_page(url) for url in urls))
+        snippets = snippets or {}
+        readable = [page for page in pages if page.get("blocks")]
+        sections: Dict[str, str] = {}
+        seen: set = set()
+        # Short pages leave their unused share of the budget to the longer ones
+        remaining = max_tokens
+        for count, page in enumerate(sorted(readable, key=lambda page: sum(map(len, page["blocks"])))):
+            share = remaining // (len(readable) - count)
+            content = select_blocks(page["blocks"], query, share, seen)
+            remaining -= count_tokens(content)
+            sections[page["url"]] = content
+        parts = []
+        for page in pages:
+            url = page["url"]
+            title = page.get("title") or url
+            if sections.get(url):
+                parts.append(f"## {title}\nSource: {url}\n\n{sections[url]}")
+            elif snippets.get(url):
+                parts.append(f"## {title}\nSource: {url} (search snippet only: {page.get('error') or 'no text content'})\n\n{snippets[url]}")
+            elif page.get("error"):
+                parts.append(f"## {url}\nCould not read the page: {page['error']}")
+        return "\n\n".join(parts) if parts else "No readable content found."
+
+    async def aresearch(self, query: str, max_results: int = WEB_RESEARCH_MAX_RESULTS,
+                        max_tokens: int = WEB_RESEARCH_MAX_TOKENS) -> str:
+        """Search the web and read the top results (see aread_pages)."""
+        with span("external", "web_research.search"):
+            results = await asyncio.to_thread(self.search, query, max_results)
+        if not results:
+            return f"No search results for '{query}'."
+        snippets = {normalize_url(result["href"]): f"{result.get('title', '')}: {result.get('body', '')}" for result in results}
+        return await self.aread_pages(query, [result["href"] for result in results], snippets, max_tokens)
+
+
+def get_research_store() -> WebResearchStore:
+    """
+    Returns the shared WebResearchStore.
+    Creates the store if it doesn't exist yet.
+    """
+    global _research_store
+    with _research_store_lock:
+        if _research_store is None:
+            _research_store = WebResearchStore()
+        return _research_store
+
+
+class WebResearchTools(Toolkit):
+    """
+    Web search that returns the content of the top results instead of snippets,
+    so one tool call gives the model enough material to answer.
+    """
+
+    def __init__(self, max_results: int = WEB_RESEARCH_MAX_RESULTS, max_tokens: int = WEB_RESEARCH_MAX_TOKENS,
+                 store: Optional[WebResearchStore] = None, **kwargs):
+        super().__init__(name="web_research_tools", **kwargs)
+        self.max_results = max_results
+        self.max_tokens = max_tokens
+        self.store = store or get_research_store()
+        self.register(self.web_research)
+        self.register(self.read_web_pages)
+
+    def web_research(self, query: str, max_results: Optional[int] = None) -> str:
+        """
+        Use this function to research a topic on the web. It searches, reads the top
+        results and returns their relevant content (not just snippets), so one call
+        is usually enough.
+
+        Args:
+            query (str): What to research.
+            max_results (int, optional): Number of pages to read. Defaults to 5.
+
+        Returns:
+            str: Markdown with the relevant content and the source URL of every page.
+        """
+        try:
+            # Runs on the shared background loop, so sync and async runs reuse one warm pool
+            return run_sync(self.store.aresearch(query, max_results or self.max_results, self.max_tokens))
+        except Exception as e:
+            return f"Error researching '{query}': {e}"
+
+    def read_web_pages(self, urls: List[str], query: str = "") -> str:
+        """
+        Use this function to read specific public web pages (http or https). Pass all URLs you need in a single call.
+
+        Args:
+            urls (List[str]): The page URLs.
+            query (str): What you are looking for, used to keep the most relevant parts.
+
+        Returns:
+            str: Markdown with the relevant content of every page.
+        """
+        try:
+            return run_sync(self.store.aread_pages(query, urls, max_tokens=self.max_tokens))
+        except Exception as e:
+            return f"Error reading {', '.join(urls)}: {e}"
+
+
+# Usage example
+if __name__ == "__main__":
+    tools = WebResearchTools()
+    print(tools.web_research("vegan protein brownie market trends"))
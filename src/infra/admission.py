@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+import urllib.parse
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from .telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# The limits below are for the whole deployment. Every worker process (WEB_CONCURRENCY,
+# set by src.serve or the platform) enforces an equal share, rounded up to at least one,
+# like the governor splits the upstream quotas, so no per-request coordination is needed
+ADMISSION_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Defaults for every agent: concurrent runs, and runs waiting for a slot
+ADMISSION_DEFAULT_CONCURRENCY = int(os.getenv("ADMISSION_DEFAULT_CONCURRENCY", "16"))
+ADMISSION_DEFAULT_QUEUE = int(os.getenv("ADMISSION_DEFAULT_QUEUE", "32"))
+# Per agent overrides, "agent-id=concurrency:queue,..."; the team fans out into
+# many model/search calls per run, so it gets far fewer slots than cheap agents
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "new-product-development-team=2:4,reasoning-agent=8:16")
+# Runs one user may have running or queued per agent; more are rejected with 429
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "2"))
+# Longest wait (seconds) in the queue before a run is rejected with 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+ADMISSION_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Requests that start runs, and the limiter that admits them
+_RUN_PATH = re.compile(r"^/v1/playground/(?:agents|teams)/(?P<agent_id>[^/]+)/runs$")
+_PARALLEL_RUN_PATHS = {"/v1/new-product/parallel-runs": "new-product-development-team"}
+_MULTIPART_USER_ID = re.compile(rb'name="user_id"\r\n(?:[^\r\n]*\r\n)*\r\n(?P<value>[^\r\n]*)\r\n')
+
+
+class AdmissionRejected(Exception):
+    """A run was not admitted; status is 429 (this user's limit) or 503 (agent overloaded)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency cap with a bounded, fair wait queue for one agent.
+
+    At most max_concurrency runs hold a slot. Further runs wait in per-user FIFO
+    queues that are served round-robin, so one user's burst can't starve others.
+    A user with max_per_user runs already running or queued is rejected with 429,
+    a full queue or a wait longer than queue_timeout with 503. Both come with a
+    Retry-After estimate from the recent run durations.
+
+    Slots are per event loop / worker process; get_admission_controller() gives
+    each worker its share of the deployment-wide limits.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int,
+                 max_per_user: int = ADMISSION_MAX_PER_USER, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._per_user: Dict[str, int] = {}
+        # Moving average of how long a run holds its slot, for Retry-After
+        self._avg_hold = 10.0
+
+    def retry_after(self) -> int:
+        waves = (self.queued + 1) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(waves * self._avg_hold))
+
+    def _reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        metrics.inc("agent_admission_total", help="Run admission decisions.", agent=self.name, result=reason)
+        return AdmissionRejected(status_code, reason, self.retry_after())
+
+    async def acquire(self, user: str) -> None:
+        """
+        Wait for a run slot.
+
+        Args:
+            user (str): Key runs are made fair across (user id or client address).
+
+        Raises:
+            AdmissionRejected: If the run must be rejected.
+        """
+        if self.max_per_user and self._per_user.get(user, 0) >= self.max_per_user:
+            raise self._reject(429, "user_limit")
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            self._per_user[user] = self._per_user.get(user, 0) + 1
+            metrics.inc("agent_admission_total", help="Run admission decisions.", agent=self.name, result="admitted")
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject(503, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user, deque()).append(waiter)
+        self.queued += 1
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended, give it back
+                self.release(user)
+            else:
+                waiter.cancel()
+                self._remove_waiter(user, waiter)
+                self._per_user_done(user)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject(503, "queue_timeout")
+        metrics.observe("agent_admission_wait_seconds", time.perf_counter() - start,
+                        help="Time runs waited for a slot.", buckets=ADMISSION_WAIT_BUCKETS, agent=self.name)
+        metrics.inc("agent_admission_total", help="Run admission decisions.", agent=self.name, result="queued")
+
+    def release(self, user: str, held: Optional[float] = None) -> None:
+        """Free the slot of a finished run and hand it to the next user in line."""
+        if held is not None:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        self._per_user_done(user)
+        while self._waiters:
+            next_user, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                # Round-robin: this user goes to the back of the line
+                self._waiters.move_to_end(next_user)
+            else:
+                del self._waiters[next_user]
+            self.queued -= 1
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _remove_waiter(self, user: str, waiter: asyncio.Future) -> None:
+        waiters = self._waiters.get(user)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self.queued -= 1
+            if not waiters:
+                del self._waiters[user]
+
+    def _per_user_done(self, user: str) -> None:
+        count = self._per_user.get(user, 0) - 1
+        if count > 0:
+            self._per_user[user] = count
+        else:
+            self._per_user.pop(user, None)
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "agent-id=concurrency:queue,..." into {agent_id: (concurrency, queue)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        agent_id, _, values = item.partition("=")
+        concurrency, _, queue = values.partition(":")
+        limits[agent_id.strip()] = (int(concurrency), int(queue or ADMISSION_DEFAULT_QUEUE))
+    return limits
+
+
+def worker_share(limit: int, workers: int = ADMISSION_WORKERS) -> int:
+    """This worker's part of a deployment-wide limit; at least one so every worker can serve."""
+    return max(1, math.ceil(limit / workers))
+
+
+_limits = parse_limits(ADMISSION_LIMITS)
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def get_admission_controller(agent_id: str) -> AdmissionController:
+    """
+    Returns the admission controller of an agent, with this worker's share of its limits.
+    Creates the controller if it doesn't exist yet.
+    """
+    controller = _controllers.get(agent_id)
+    if controller is None:
+        concurrency, queue = _limits.get(agent_id, (ADMISSION_DEFAULT_CONCURRENCY, ADMISSION_DEFAULT_QUEUE))
+        controller = _controllers[agent_id] = AdmissionController(
+            agent_id, worker_share(concurrency), worker_share(queue),
+            max_per_user=worker_share(ADMISSION_MAX_PER_USER),
+        )
+    return controller
+
+
+def _user_key(scope: Dict[str, Any], body: bytes) -> str:
+    headers = dict(scope.get("headers") or [])
+    content_type = headers.get(b"content-type", b"")
+    user_id = None
+    if content_type.startswith(b"multipart/form-data"):
+        match = _MULTIPART_USER_ID.search(body)
+        user_id = match.group("value").decode("utf-8", "replace") if match else None
+    elif content_type.startswith(b"application/x-www-form-urlencoded"):
+        user_id = urllib.parse.parse_qs(body.decode("utf-8", "replace")).get("user_id", [None])[0]
+    if not user_id:
+        forwarded = headers.get(b"x-forwarded-for", b"").split(b",")[0].strip()
+        client = scope.get("client")
+        user_id = forwarded.decode() if forwarded else (client[0] if client else "anonymous")
+    return user_id
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits agent/team runs through their AdmissionController.
+
+    Only requests that start runs are limited; the slot is held until the
+    (streamed) response is complete. Rejections are JSON responses with status
+    429 or 503 and a Retry-After header.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]], agent_ids: Optional[Iterable[str]] = None):
+        self.app = app
+        # Only known agents get a controller; other ids fall through to the router's 404
+        self.agent_ids = set(agent_ids) if agent_ids is not None else None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if not ADMISSION_ENABLED or scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        match = _RUN_PATH.match(path)
+        agent_id = match.group("agent_id") if match else _PARALLEL_RUN_PATHS.get(path)
+        if agent_id is None or (self.agent_ids is not None and agent_id not in self.agent_ids):
+            return await self.app(scope, receive, send)
+
+        # Read the body to find the user id, then replay it to the app
+        messages = []
+        body = b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        user = _user_key(scope, body)
+        controller = get_admission_controller(agent_id)
+        try:
+            await controller.acquire(user)
+        except AdmissionRejected as e:
+            logger.info(f"Rejected run of '{agent_id}' for '{user}': {e.reason}")
+            return await _send_rejection(send, e)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            controller.release(user, held=time.perf_counter() - start)
+
+
+async def _send_rejection(send, rejected: AdmissionRejected) -> None:
+    if rejected.status_code == 429:
+        detail = "Too many runs in progress for this user, retry later"
+    else:
+        detail = f"Agent is busy ({rejected.reason}), retry later"
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": rejected.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(rejected.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, delete, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from .db import get_shared_db_engine
+
+logger = logging.getLogger(__name__)
+
+CACHE_SCHEMA = "ai"
+CACHE_TABLE = "response_cache"
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Collapse whitespace and case so near-identical prompts share a cache key."""
+    if value is None:
+        return ""
+    return " ".join(value.split()).casefold()
+
+
+def make_cache_key(*parts: Optional[str]) -> str:
+    """Build a stable sha256 cache key from normalized text parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(normalize_text(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with per-entry TTL.
+    """
+
+    def __init__(self, max_entries: int = 256, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PostgresCache:
+    """
+    JSON cache table shared by all workers through the shared SQLAlchemy engine.
+
+    Entries are partitioned by namespace so unrelated caches can share one table.
+    Every namespace is capped at max_rows; the oldest entries are pruned first.
+    """
+
+    _metadata = MetaData(schema=CACHE_SCHEMA)
+    _table = Table(
+        CACHE_TABLE,
+        _metadata,
+        Column("namespace", String, primary_key=True),
+        Column("cache_key", String, primary_key=True),
+        Column("value", postgresql.JSONB),
+        Column("size_bytes", Integer),
+        Column("created_at", BigInteger),
+        Column("expires_at", BigInteger, index=True),
+    )
+    _table_ready = False
+    _table_lock = threading.Lock()
+
+    def __init__(self, namespace: str, max_rows: int = 10000, prune_every: int = 100,
+                 db_engine: Optional[Engine] = None):
+        self.namespace = namespace
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self.db_engine = db_engine or get_shared_db_engine()
+        self._writes = 0
+
+    def _ensure_table(self) -> None:
+        if PostgresCache._table_ready:
+            return
+        with PostgresCache._table_lock:
+            if PostgresCache._table_ready:
+                return
+            with self.db_engine.begin() as conn:
+                conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {CACHE_SCHEMA}"))
+            self._metadata.create_all(self.db_engine, checkfirst=True)
+            PostgresCache._table_ready = True
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[int]]]:
+        """Returns (value, expires_at) of a live entry; expires_at is a unix time or None."""
+        table = self._table
+        try:
+            self._ensure_table()
+            with self.db_engine.connect() as conn:
+                row = conn.execute(
+                    select(table.c.value, table.c.expires_at).where(
+                        table.c.namespace == self.namespace,
+                        table.c.cache_key == key,
+                    )
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"Cache read failed for '{self.namespace}': {e}")
+            return None
+        if row is None:
+            return None
+        if row.expires_at is not None and row.expires_at <= int(time.time()):
+            return None
+        return row.value, row.expires_at
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size_bytes: Optional[int] = None) -> None:
+        table = self._table
+        now = int(time.time())
+        expires_at = now + int(ttl) if ttl else None
+        try:
+            self._ensure_table()
+            stmt = postgresql.insert(table).values(
+                namespace=self.namespace,
+                cache_key=key,
+                value=value,
+                size_bytes=size_bytes,
+                created_at=now,
+                expires_at=expires_at,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["namespace", "cache_key"],
+                set_=dict(value=value, size_bytes=size_bytes, created_at=now, expires_at=expires_at),
+            )
+            with self.db_engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception as e:
+            logger.warning(f"Cache write failed for '{self.namespace}': {e}")
+            return
+
+        self._writes += 1
+        if self.prune_every and self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        table = self._table
+        try:
+            with self.db_engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.namespace == self.namespace, table.c.cache_key == key))
+        except Exception as e:
+            logger.warning(f"Cache delete failed for '{self.namespace}': {e}")
+
+    def prune(self) -> None:
+        """Remove expired entries and trim the namespace to max_rows."""
+        table = self._table
+        try:
+            with self.db_engine.begin() as conn:
+                conn.execute(
+                    delete(table).where(
+                        table.c.namespace == self.namespace,
+                        table.c.expires_at <= int(time.time()),
+                    )
+                )
+                keep = (
+                    select(table.c.cache_key)
+                    .where(table.c.namespace == self.namespace)
+                    .order_by(table.c.created_at.desc())
+                    .limit(self.max_rows)
+                )
+                conn.execute(
+                    delete(table).where(
+                        table.c.namespace == self.namespace,
+                        table.c.cache_key.not_in(keep.scalar_subquery()),
+                    )
+                )
+        except Exception as e:
+            logger.warning(f"Cache prune failed for '{self.namespace}': {e}")
+
+
+class TieredCache:
+    """
+    In-memory LRU tier in front of an optional shared Postgres tier.
+
+    Values must be JSON serializable. Entries larger than max_entry_bytes are
+    not cached at all.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: Optional[float] = None,
+        max_entries: int = 256,
+        max_entry_bytes: int = 512 * 1024,
+        persistent: bool = True,
+        max_rows: int = 10000,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.memory = LRUCache(max_entries=max_entries, default_ttl=ttl)
+        self.store: Optional[PostgresCache] = PostgresCache(namespace, max_rows=max_rows) if persistent else None
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.store is None:
+            return None
+        entry = self.store.get_entry(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if value is not None:
+            # Promote to the memory tier for the rest of the entry's Postgres TTL
+            # (0: no expiry), so it doesn't outlive the shared copy
+            self.memory.set(key, value, ttl=expires_at - time.time() if expires_at is not None else 0)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        encoded = json.dumps(value, default=str)
+        size_bytes = len(encoded.encode("utf-8"))
+        if size_bytes > self.max_entry_bytes:
+            return False
+        ttl = ttl if ttl is not None else self.ttl
+        self.memory.set(key, value, ttl=ttl)
+        if self.store is not None:
+            self.store.set(key, value, ttl=ttl, size_bytes=size_bytes)
+        return True
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.store is not None:
+            self.store.delete(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self.store is None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self.store is None:
+            return self.set(key, value, ttl=ttl)
+        return await asyncio.to_thread(self.set, key, value, ttl)
@@ -0,0 +1,249 @@
+"""
+Compact binary encoding for stored sessions: msgpack, compressed with zstd, with
+large strings and bytes (base64 images, DALL·E results, big tool outputs) moved
+into a content-addressed blob table so every session that contains them stores
+only a 32 byte reference, and a blob is written once however often the session
+is saved.
+
+    codec = get_session_codec()
+    payload, blobs = codec.encode(values)
+    value, refs = codec.decode(payload)
+    value = codec.resolve(value, codec.blobs.get_many(refs))
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import BigInteger, Column, Integer, LargeBinary, MetaData, String, Table, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .cache import CACHE_SCHEMA, LRUCache
+from .db import get_shared_async_db_engine, get_shared_db_engine
+
+logger = logging.getLogger(__name__)
+
+# zstd compression level (1 fastest ... 19 smallest)
+STORAGE_ZSTD_LEVEL = int(os.getenv("STORAGE_ZSTD_LEVEL", "3"))
+# Strings/bytes at least this long are stored once in the blob table
+STORAGE_BLOB_MIN_BYTES = int(os.getenv("STORAGE_BLOB_MIN_BYTES", str(16 * 1024)))
+# Blobs kept in memory; they never change, so every worker may cache them
+STORAGE_BLOB_CACHE_SIZE = int(os.getenv("STORAGE_BLOB_CACHE_SIZE", "256"))
+
+BLOB_TABLE = "session_blobs"
+# Format of the encoded payloads, stored as their first byte
+CODEC_VERSION = b"\x01"
+# msgpack extension codes of blob references
+_STR_BLOB = 1
+_BYTES_BLOB = 2
+
+_shared_codec: Optional["SessionCodec"] = None
+_shared_codec_lock = threading.Lock()
+
+
+class BlobRef:
+    """Reference to an offloaded string/bytes value, replaced by resolve()."""
+
+    __slots__ = ("code", "hash")
+
+    def __init__(self, code: int, digest: bytes):
+        self.code = code
+        self.hash = digest.hex()
+
+
+class BlobStore:
+    """
+    Content-addressed blob table shared by all session tables.
+
+    Blobs are keyed by the sha256 of their content and are never updated.
+    Deleting a session leaves its blobs, other sessions may still use them.
+    """
+
+    _metadata = MetaData(schema=CACHE_SCHEMA)
+    table = Table(
+        BLOB_TABLE,
+        _metadata,
+        Column("hash", String, primary_key=True),
+        Column("data", LargeBinary),
+        Column("size_bytes", Integer),
+        Column("created_at", BigInteger),
+    )
+
+    def __init__(self, db_engine: Optional[Engine] = None, async_engine: Optional[AsyncEngine] = None,
+                 cache_size: int = STORAGE_BLOB_CACHE_SIZE):
+        self.db_engine = db_engine or get_shared_db_engine()
+        self.async_engine = async_engine or get_shared_async_db_engine()
+        self._cache = LRUCache(max_entries=cache_size)
+        # Hashes known to be in the table, so saving a session again doesn't resend them
+        self._stored = LRUCache(max_entries=cache_size * 16)
+
+    def create(self) -> None:
+        with self.db_engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {CACHE_SCHEMA}"))
+        self._metadata.create_all(self.db_engine, checkfirst=True)
+
+    def insert_stmt(self, blobs: Dict[str, bytes]):
+        """
+        Insert statement for the blobs not already stored, or None. Run it in
+        the same transaction as the row that references them.
+        """
+        new = {digest: data for digest, data in blobs.items() if self._stored.get(digest) is None}
+        if not new:
+            return None
+        now = int(time.time())
+        stmt = postgresql.insert(self.table).values(
+            [{"hash": digest, "data": data, "size_bytes": len(data), "created_at": now} for digest, data in new.items()]
+        )
+        return stmt.on_conflict_do_nothing(index_elements=["hash"])
+
+    def stored(self, blobs: Iterable[str]) -> None:
+        """Remember blobs whose insert was committed."""
+        for digest in blobs:
+            self._stored.set(digest, True)
+
+    def _cached(self, hashes: Iterable[str]) -> Tuple[Dict[str, bytes], List[str]]:
+        found, missing = {}, []
+        for digest in set(hashes):
+            data = self._cache.get(digest)
+            if data is None:
+                missing.append(digest)
+            else:
+                found[digest] = data
+        return found, missing
+
+    def _found(self, found: Dict[str, bytes], rows) -> Dict[str, bytes]:
+        for row in rows:
+            data = bytes(row.data)
+            self._cache.set(row.hash, data)
+            self._stored.set(row.hash, True)
+            found[row.hash] = data
+        return found
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, bytes]:
+        found, missing = self._cached(hashes)
+        if not missing:
+            return found
+        with self.db_engine.connect() as conn:
+            rows = conn.execute(select(self.table.c.hash, self.table.c.data).where(self.table.c.hash.in_(missing)))
+            return self._found(found, rows)
+
+    async def aget_many(self, hashes: Iterable[str]) -> Dict[str, bytes]:
+        found, missing = self._cached(hashes)
+        if not missing:
+            return found
+        async with self.async_engine.connect() as conn:
+            rows = await conn.execute(select(self.table.c.hash, self.table.c.data).where(self.table.c.hash.in_(missing)))
+            return self._found(found, rows)
+
+
+class SessionCodec:
+    """
+    msgpack + zstd codec for JSON-like values, offloading large strings and
+    bytes into a BlobStore.
+
+    Args:
+        blobs (BlobStore): Where offloaded values are stored.
+        level (int): zstd compression level.
+        blob_min_bytes (int): Strings/bytes at least this long are offloaded; 0 disables offloading.
+    """
+
+    def __init__(self, blobs: BlobStore, level: int = STORAGE_ZSTD_LEVEL, blob_min_bytes: int = STORAGE_BLOB_MIN_BYTES):
+        import msgpack
+        import zstandard
+
+        self._msgpack = msgpack
+        self._zstd = zstandard
+        self.blobs = blobs
+        self.level = level
+        self.blob_min_bytes = blob_min_bytes
+        # zstd (de)compressors aren't thread-safe, every thread gets its own
+        self._local = threading.local()
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = self._zstd.ZstdCompressor(level=self.level)
+        return compressor
+
+    def _decompressor(self):
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = self._zstd.ZstdDecompressor()
+        return decompressor
+
+    def _offload(self, value: Any, blobs: Dict[str, bytes]) -> Any:
+        if isinstance(value, dict):
+            return {key: self._offload(item, blobs) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._offload(item, blobs) for item in value]
+        if not self.blob_min_bytes or not isinstance(value, (str, bytes, bytearray)) or len(value) < self.blob_min_bytes:
+            return value
+        code, data = (_STR_BLOB, value.encode("utf-8")) if isinstance(value, str) else (_BYTES_BLOB, bytes(value))
+        digest = hashlib.sha256(data).digest()
+        blobs.setdefault(digest.hex(), self._compressor().compress(data))
+        return self._msgpack.ExtType(code, digest)
+
+    def encode(self, value: Any) -> Tuple[bytes, Dict[str, bytes]]:
+        """
+        Encode a value.
+
+        Returns:
+            Tuple[bytes, Dict[str, bytes]]: The payload, and the compressed blobs
+            it references by hash (to insert with BlobStore.insert_stmt).
+        """
+        blobs: Dict[str, bytes] = {}
+        packed = self._msgpack.packb(self._offload(value, blobs), use_bin_type=True, default=str)
+        return CODEC_VERSION + self._compressor().compress(packed), blobs
+
+    def decode(self, payload: bytes) -> Tuple[Any, Set[str]]:
+        """
+        Decode a payload. Offloaded values come back as BlobRef placeholders.
+
+        Returns:
+            Tuple[Any, Set[str]]: The value, and the hashes of the blobs it references.
+        """
+        payload = bytes(payload)
+        if payload[:1] != CODEC_VERSION:
+            raise ValueError(f"Unknown session payload format {payload[:1]!r}")
+        refs: Set[str] = set()
+
+        def ext_hook(code: int, data: bytes):
+            ref = BlobRef(code, data)
+            refs.add(ref.hash)
+            return ref
+
+        value = self._msgpack.unpackb(
+            self._decompressor().decompress(payload[1:]), raw=False, strict_map_key=False, ext_hook=ext_hook
+        )
+        return value, refs
+
+    def resolve(self, value: Any, blobs: Dict[str, bytes]) -> Any:
+        """Replace the BlobRef placeholders of a decoded value with the blob contents."""
+        if isinstance(value, dict):
+            return {key: self.resolve(item, blobs) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item, blobs) for item in value]
+        if not isinstance(value, BlobRef):
+            return value
+        if value.hash not in blobs:
+            logger.warning(f"Session blob {value.hash} is missing")
+            return None
+        data = self._decompressor().decompress(blobs[value.hash])
+        return data.decode("utf-8") if value.code == _STR_BLOB else data
+
+
+def get_session_codec() -> SessionCodec:
+    """
+    Returns the shared session codec and blob store.
+    Creates the codec if it doesn't exist yet.
+    """
+    global _shared_codec
+    if _shared_codec is None:
+        with _shared_codec_lock:
+            if _shared_codec is None:
+                _shared_codec = SessionCodec(BlobStore())
+    return _shared_codec
@@ -1,9 +1,14 @@
 # d:\0-dev\0-finley\finley2\finley2-backend\src\infra\db.py
 import os
+import threading
+import time
 import urllib.parse
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool
 
 # Attempt to load .env file from standard locations relative to this file or project root
 # This helps in development environments
@@ -19,6 +24,84 @@ else:
     load_dotenv()
 
 _shared_engine: Engine | None = None
+_shared_async_engine: AsyncEngine | None = None
+
+# Connection pool settings. Defaults are sized for the Supabase transaction pooler,
+# which hands out a small number of server connections per project.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_USE_LIFO = os.getenv("DB_POOL_USE_LIFO", "true").lower() == "true"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# SQLAlchemy compiled statement cache (client side, always safe)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+# psycopg server-side prepared statements: prepare after N executions of a query
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+# "auto" enables pgbouncer mode when connecting to the transaction pooler port (6543)
+DB_PGBOUNCER_MODE = os.getenv("DB_PGBOUNCER_MODE", "auto").lower()
+
+# Upper bounds (seconds) of the checkout latency histogram buckets
+POOL_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class PoolStats:
+    """
+    Thread-safe counters for connection checkouts from the shared pool.
+
+    The latency histogram (sum, max, buckets) covers successful checkouts only,
+    so its count is checkouts; timed out checkouts are counted in timeouts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * len(POOL_LATENCY_BUCKETS)
+
+    def record(self, latency: float, waited: bool, timed_out: bool = False) -> None:
+        with self._lock:
+            if waited:
+                self.waits += 1
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            for i, bound in enumerate(POOL_LATENCY_BUCKETS):
+                if latency <= bound:
+                    self.latency_buckets[i] += 1
+                    break
+
+
+_pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records checkout latency, waits and timeouts in _pool_stats.
+    """
+
+    def _do_get(self):
+        # The checkout has to wait when no idle connection is left and overflow is exhausted
+        waited = (
+            self._max_overflow > -1
+            and self._overflow >= self._max_overflow
+            and self._pool.qsize() == 0
+        )
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            _pool_stats.record(time.perf_counter() - start, waited, timed_out=True)
+            raise
+        _pool_stats.record(time.perf_counter() - start, waited)
+        return record
 
 def get_supabase_db_url():
     """
@@ -50,6 +133,39 @@ def get_supabase_db_url():
 
     return db_url
 
+def is_pgbouncer_mode() -> bool:
+    """
+    Whether to run in pgbouncer-compatible mode (no server-side prepared statements).
+    In "auto" mode this is enabled for the Supabase transaction pooler port.
+    """
+    if DB_PGBOUNCER_MODE == "auto":
+        return os.getenv("SUPABASE_DB_PORT", "6543") == "6543"
+    return DB_PGBOUNCER_MODE == "true"
+
+def get_engine_options() -> dict:
+    """
+    Returns the create_engine() keyword arguments built from the DB_* environment variables.
+    """
+    connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT}
+    if is_pgbouncer_mode():
+        # Transaction pooling hands each transaction to any server connection, so
+        # prepared statements from a previous transaction may not exist (or clash).
+        connect_args["prepare_threshold"] = None
+    else:
+        connect_args["prepare_threshold"] = DB_PREPARE_THRESHOLD
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_use_lifo": DB_POOL_USE_LIFO,
+        "query_cache_size": DB_QUERY_CACHE_SIZE,
+        "connect_args": connect_args,
+    }
+
 def get_shared_db_engine() -> Engine:
     """
     Returns a shared SQLAlchemy engine instance.
@@ -58,12 +174,64 @@ def get_shared_db_engine() -> Engine:
     global _shared_engine
     if _shared_engine is None:
         db_url = get_supabase_db_url()
-        # If SSL errors persist, consider adding connect_args:
-        # e.g., _shared_engine = create_engine(db_url, connect_args={"sslmode": "require"})
-        # For now, using default engine options.
-        _shared_engine = create_engine(db_url)
+        _shared_engine = create_engine(db_url, **get_engine_options())
     return _shared_engine
 
+def get_shared_async_db_engine() -> AsyncEngine:
+    """
+    Returns a shared async SQLAlchemy engine on psycopg3's async driver.
+    Creates the engine if it doesn't exist yet.
+
+    Async connections belong to the event loop that opened them, so this engine
+    should only be used from the application's server loop.
+    """
+    global _shared_async_engine
+    if _shared_async_engine is None:
+        db_url = get_supabase_db_url()
+        options = get_engine_options()
+        # The async engine uses SQLAlchemy's asyncio-adapted queue pool
+        options.pop("poolclass")
+        _shared_async_engine = create_async_engine(db_url, **options)
+    return _shared_async_engine
+
+def _dispose_after_fork() -> None:
+    """
+    Give a forked worker its own connection pools. The pooled connections belong
+    to the parent, so they are dropped without being closed (close=False) and the
+    child opens new ones on first use; the engine objects themselves stay valid.
+    """
+    global _pool_stats
+    if _shared_engine is not None:
+        _shared_engine.dispose(close=False)
+    if _shared_async_engine is not None:
+        _shared_async_engine.sync_engine.dispose(close=False)
+    # A lock held by another thread at fork time would never be released in the child
+    _pool_stats = PoolStats()
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+def get_pool_metrics() -> dict:
+    """
+    Returns a snapshot of the shared engine's connection pool metrics.
+    Pool gauges are zero until the engine has been created.
+    """
+    pool = _shared_engine.pool if _shared_engine is not None else None
+    with _pool_stats._lock:
+        metrics = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "in_use": pool.checkedout() if pool is not None else 0,
+            "idle": pool.checkedin() if pool is not None else 0,
+            "overflow": max(pool.overflow(), 0) if pool is not None else 0,
+            "checkouts_total": _pool_stats.checkouts,
+            "waits_total": _pool_stats.waits,
+            "timeouts_total": _pool_stats.timeouts,
+            "checkout_latency_seconds_sum": _pool_stats.latency_sum,
+            "checkout_latency_seconds_max": _pool_stats.latency_max,
+            "checkout_latency_buckets": dict(zip(POOL_LATENCY_BUCKETS, _pool_stats.latency_buckets)),
+        }
+    return metrics
+
 if __name__ == '__main__':
     try:
         print("Attempting to get shared Supabase DB engine...")
@@ -74,6 +242,7 @@ if __name__ == '__main__':
             with engine.connect() as connection:
                 result = connection.execute(text("SELECT 1 AS connection_test"))
                 print(f"Database connection successful. Test query result: {result.scalar_one()}")
+            print(f"Pool metrics: {get_pool_metrics()}")
         except Exception as e:
             print(f"Database connection failed: {e}")
     except ValueError as ve:
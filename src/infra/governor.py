@@ -0,0 +1,504 @@
+import asyncio
+import contextvars
+import email.utils
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+GOVERNOR_ENABLED = os.getenv("GOVERNOR_ENABLED", "true").lower() == "true"
+# Request/token rates per provider or provider:model, "name=requests_per_minute[:tokens_per_minute],..."
+GOVERNOR_LIMITS = os.getenv("GOVERNOR_LIMITS", "openai=5000:2000000,perplexity=50,tavily=100")
+# Rate for upstreams not listed in GOVERNOR_LIMITS (0 = unlimited)
+GOVERNOR_DEFAULT_RPM = float(os.getenv("GOVERNOR_DEFAULT_RPM", "0"))
+# Seconds of traffic a bucket may send at once after being idle
+GOVERNOR_BURST_SECONDS = float(os.getenv("GOVERNOR_BURST_SECONDS", "10"))
+# Retries of 429/5xx responses, with full-jitter exponential backoff (Retry-After is honoured)
+GOVERNOR_MAX_RETRIES = int(os.getenv("GOVERNOR_MAX_RETRIES", "4"))
+GOVERNOR_BACKOFF_BASE = float(os.getenv("GOVERNOR_BACKOFF_BASE", "0.5"))
+GOVERNOR_BACKOFF_MAX = float(os.getenv("GOVERNOR_BACKOFF_MAX", "30"))
+# Completion tokens assumed for a request without max_tokens, for the token buckets
+GOVERNOR_COMPLETION_TOKENS = int(os.getenv("GOVERNOR_COMPLETION_TOKENS", "1024"))
+# Token budget of one agent/team run, "agent-id=tokens,..." (0 or missing = unlimited)
+GOVERNOR_TOKEN_BUDGETS = os.getenv("GOVERNOR_TOKEN_BUDGETS", "new-product-development-team=400000")
+GOVERNOR_DEFAULT_TOKEN_BUDGET = int(os.getenv("GOVERNOR_DEFAULT_TOKEN_BUDGET", "0"))
+# Worker processes sharing the upstream quotas (set by src.serve or the platform);
+# each worker gets an equal share of the configured and reported limits
+GOVERNOR_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+PROVIDER_HOSTS = {"api.openai.com": "openai", "api.perplexity.ai": "perplexity", "api.tavily.com": "tavily"}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() takes the tokens right away (the level
+    may go negative) and returns how long the caller must wait, so threads and
+    event loops can share one bucket and each waits in its own way.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = GOVERNOR_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self.set_rate(per_minute)
+        self.level = self.capacity
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, per_minute: float) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * self.burst_seconds)
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, cost: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= min(cost, self.capacity)
+            wait = -self.level / self.rate if self.level < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for a while (the upstream said it is out of quota)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def sync(self, remaining: Optional[float], reset_seconds: Optional[float]) -> None:
+        """Align the level with the remaining quota the upstream reported."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if remaining is not None:
+                self.level = min(self.level, remaining)
+            if remaining is not None and remaining <= 0 and reset_seconds:
+                self.paused_until = max(self.paused_until, time.monotonic() + reset_seconds)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse "20ms", "1s", "6m0s" or plain seconds into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """Seconds to wait according to retry-after-ms / Retry-After (seconds or HTTP date)."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, date.timestamp() - time.time()) if date else None
+
+
+def _float_header(headers: Any, name: str) -> Optional[float]:
+    try:
+        return float(headers.get(name)) if headers.get(name) is not None else None
+    except ValueError:
+        return None
+
+
+class UpstreamGovernor:
+    """
+    Shared rate limiter and retry policy for the upstream APIs.
+
+    Requests are throttled by token buckets per provider and model (requests per
+    minute and, where configured, tokens per minute). Rate-limit headers on the
+    responses (x-ratelimit-remaining-*/reset-*/limit-*, Retry-After) adjust the
+    buckets, so every worker thread backs off together when a quota runs out
+    instead of retrying into it. 429/5xx responses are retried with full-jitter
+    exponential backoff.
+
+    With several worker processes every worker limits itself to 1/workers of each
+    quota, so together they stay within it without coordinating per request.
+    """
+
+    def __init__(self, limits: str = GOVERNOR_LIMITS, default_rpm: float = GOVERNOR_DEFAULT_RPM,
+                 workers: int = GOVERNOR_WORKERS):
+        self.limits = parse_limits(limits)
+        self.default_rpm = default_rpm
+        self.workers = workers
+        self._buckets: Dict[Tuple[str, str, str], Optional[TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, provider: str, model: Optional[str], kind: str) -> Optional[TokenBucket]:
+        key = (provider, model or "", kind)
+        if key in self._buckets:
+            return self._buckets[key]
+        with self._lock:
+            if key not in self._buckets:
+                rpm, tpm = self.limits.get(f"{provider}:{model}") or self.limits.get(provider) or (self.default_rpm, 0)
+                per_minute = (rpm if kind == "requests" else tpm) / self.workers
+                self._buckets[key] = TokenBucket(per_minute) if per_minute else None
+            return self._buckets[key]
+
+    def before(self, provider: str, model: Optional[str], tokens: int = 0) -> float:
+        """Reserve capacity for one request; returns the seconds to wait before sending it."""
+        wait = 0.0
+        requests_bucket = self._bucket(provider, model, "requests")
+        if requests_bucket is not None:
+            wait = requests_bucket.reserve(1)
+        tokens_bucket = self._bucket(provider, model, "tokens") if tokens else None
+        if tokens_bucket is not None:
+            wait = max(wait, tokens_bucket.reserve(tokens))
+        if wait > 0:
+            metrics.observe("upstream_throttle_seconds", wait, help="Time requests were held back by the governor.",
+                            provider=provider)
+        return wait
+
+    def after(self, provider: str, model: Optional[str], status: int, headers: Any, attempt: int) -> Optional[float]:
+        """
+        Update the buckets from a response.
+
+        Returns:
+            Optional[float]: Seconds to wait before retrying, or None to return the response.
+        """
+        metrics.inc("upstream_requests_total", help="Upstream API responses by status.",
+                    provider=provider, status=str(status))
+        for kind in ("requests", "tokens"):
+            bucket = self._bucket(provider, model, kind)
+            if bucket is None:
+                continue
+            limit = _float_header(headers, f"x-ratelimit-limit-{kind}")
+            if limit and kind == "requests" and abs(limit / self.workers - bucket.rate * 60) > 1:
+                bucket.set_rate(limit / self.workers)
+            remaining = _float_header(headers, f"x-ratelimit-remaining-{kind}")
+            bucket.sync(remaining / self.workers if remaining is not None else None,
+                        parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+
+        if status not in RETRYABLE_STATUS or attempt >= GOVERNOR_MAX_RETRIES:
+            return None
+        retry_after = retry_after_seconds(headers)
+        delay = random.uniform(0, min(GOVERNOR_BACKOFF_MAX, GOVERNOR_BACKOFF_BASE * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if status == 429:
+            # Everyone using this quota waits, not only the request that hit it
+            bucket = self._bucket(provider, model, "requests")
+            if bucket is not None:
+                bucket.pause(delay)
+        metrics.inc("upstream_retries_total", help="Upstream requests retried after 429/5xx.",
+                    provider=provider, status=str(status))
+        logger.info(f"Upstream {provider} returned {status}, retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "name=rpm[:tpm],..." into {name: (rpm, tpm)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[name.strip()] = (float(rpm or 0), float(tpm or 0))
+    return limits
+
+
+_shared_governor: Optional[UpstreamGovernor] = None
+_shared_governor_lock = threading.Lock()
+
+
+def get_governor() -> UpstreamGovernor:
+    """
+    Returns the process-wide upstream governor.
+    Creates the governor if it doesn't exist yet.
+    """
+    global _shared_governor
+    with _shared_governor_lock:
+        if _shared_governor is None:
+            _shared_governor = UpstreamGovernor()
+        return _shared_governor
+
+
+def _reset_after_fork() -> None:
+    # A forked worker starts with its own buckets (and a lock no parent thread holds)
+    global _shared_governor, _shared_governor_lock
+    _shared_governor = None
+    _shared_governor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def provider_for(host: Optional[str]) -> str:
+    return PROVIDER_HOSTS.get(host or "", host or "unknown")
+
+
+def _describe(host: Optional[str], body: Optional[bytes]) -> Tuple[str, Optional[str], int]:
+    """Provider, model and estimated tokens of an (OpenAI-style JSON) request."""
+    provider = provider_for(host)
+    model, tokens = None, 0
+    if body and body[:1] == b"{":
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            model = payload.get("model")
+            if "messages" in payload or "input" in payload:
+                completion = payload.get("max_completion_tokens") or payload.get("max_tokens")
+                tokens = len(body) // 4 + (completion or (GOVERNOR_COMPLETION_TOKENS if "messages" in payload else 0))
+    return provider, model, tokens
+
+
+class GovernedTransport(httpx.BaseTransport):
+    """httpx transport that sends every request through the upstream governor."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        provider, model, tokens = _describe(request.url.host, request.content)
+        governor = get_governor()
+        attempt = 0
+        while True:
+            wait = governor.before(provider, model, tokens)
+            if wait > 0:
+                time.sleep(wait)
+            response = self._transport.handle_request(request)
+            retry_in = governor.after(provider, model, response.status_code, response.headers, attempt)
+            if retry_in is None:
+                return response
+            response.close()
+            time.sleep(retry_in)
+            attempt += 1
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncGovernedTransport(httpx.AsyncBaseTransport):
+    """Async version of GovernedTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        provider, model, tokens = _describe(request.url.host, request.content)
+        governor = get_governor()
+        attempt = 0
+        while True:
+            wait = governor.before(provider, model, tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            response = await self._transport.handle_async_request(request)
+            retry_in = governor.after(provider, model, response.status_code, response.headers, attempt)
+            if retry_in is None:
+                return response
+            await response.aclose()
+            await asyncio.sleep(retry_in)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class GovernedHTTPAdapter(HTTPAdapter):
+    """requests adapter (for SDKs on requests, like Tavily) that goes through the upstream governor."""
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        body = request.body.encode() if isinstance(request.body, str) else request.body
+        provider, model, tokens = _describe(urllib.parse.urlparse(request.url).hostname, body)
+        governor = get_governor()
+        attempt = 0
+        while True:
+            wait = governor.before(provider, model, tokens)
+            if wait > 0:
+                time.sleep(wait)
+            response = super().send(request, **kwargs)
+            retry_in = governor.after(provider, model, response.status_code, response.headers, attempt)
+            if retry_in is None:
+                return response
+            response.close()
+            time.sleep(retry_in)
+            attempt += 1
+
+
+def govern_session(session: requests.Session) -> requests.Session:
+    """Mount the governed adapter on a requests session (no-op when the governor is disabled)."""
+    if GOVERNOR_ENABLED:
+        adapter = GovernedHTTPAdapter()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return session
+
+
+# Token budget of the current agent/team run
+
+_current_budget: contextvars.ContextVar[Optional["TokenBudget"]] = contextvars.ContextVar("token_budget", default=None)
+
+
+class TokenBudget:
+    """
+    Tokens one run may spend across all its model and Deepsearch calls.
+
+    Once the budget is used up, members and tools get a short "budget exhausted"
+    answer instead of new upstream calls, and the model of the agent/team that
+    owns the budget gets one last call without tools to write the final answer
+    from what it has. The run is cut short instead of failing.
+    """
+
+    def __init__(self, limit: int, owner: Any = None):
+        self.limit = limit
+        self.owner = owner
+        self.used = 0
+        self.final_call_used = False
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.limit
+
+    def charge(self, tokens: int) -> None:
+        with self._lock:
+            self.used += tokens
+
+
+def get_token_budget() -> Optional[TokenBudget]:
+    return _current_budget.get()
+
+
+def charge_token_budget(usage: Optional[Dict[str, Any]]) -> None:
+    """Add the tokens of a model/search response to the current run's budget."""
+    budget = _current_budget.get()
+    if budget is None or not usage:
+        return
+    total = usage.get("total_tokens") or (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    budget.charge(total)
+
+
+def token_budget_exhausted() -> bool:
+    budget = _current_budget.get()
+    return budget is not None and budget.exhausted
+
+
+def budget_decision(model: Any) -> Optional[str]:
+    """
+    What a model call may do under the current budget.
+
+    Returns:
+        None to call the model as usual, "final" for the owner's last call
+        (tools disabled), or "stop" to answer without calling the model.
+    """
+    budget = _current_budget.get()
+    if budget is None or not budget.exhausted:
+        return None
+    with budget._lock:
+        if model is budget.owner and not budget.final_call_used:
+            budget.final_call_used = True
+            metrics.inc("agent_token_budget_exhausted_total", help="Runs cut short by their token budget.")
+            return "final"
+    return "stop"
+
+
+def parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        budgets[name.strip()] = int(value)
+    return budgets
+
+
+_budgets = parse_budgets(GOVERNOR_TOKEN_BUDGETS)
+
+
+def _bound_stream(stream: Iterator[Any], budget: TokenBudget) -> Iterator[Any]:
+    while True:
+        token = _current_budget.set(budget)
+        try:
+            chunk = next(stream)
+        except StopIteration:
+            return
+        finally:
+            _current_budget.reset(token)
+        yield chunk
+
+
+async def _abound_stream(stream: AsyncIterator[Any], budget: TokenBudget) -> AsyncIterator[Any]:
+    while True:
+        token = _current_budget.set(budget)
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            _current_budget.reset(token)
+        yield chunk
+
+
+def apply_token_budget(agent: Any, agent_id: str, limit: Optional[int] = None) -> Any:
+    """
+    Give every run of an agent/team its own TokenBudget (GOVERNOR_TOKEN_BUDGETS).
+    Runs started inside another budgeted run share the outer budget.
+
+    Args:
+        agent: An agno Agent or Team.
+        agent_id (str): Registry id the budget is configured for.
+        limit (int, optional): Tokens per run, overrides the configuration.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    limit = limit if limit is not None else _budgets.get(agent_id, GOVERNOR_DEFAULT_TOKEN_BUDGET)
+    if not limit or getattr(agent, "_token_budget_applied", False):
+        return agent
+    run, arun = agent.run, agent.arun
+
+    def budgeted_run(*args, **kwargs):
+        if _current_budget.get() is not None:
+            return run(*args, **kwargs)
+        budget = TokenBudget(limit, owner=agent.model)
+        token = _current_budget.set(budget)
+        try:
+            result = run(*args, **kwargs)
+        finally:
+            _current_budget.reset(token)
+        return _bound_stream(result, budget) if isinstance(result, Iterator) else result
+
+    async def budgeted_arun(*args, **kwargs):
+        if _current_budget.get() is not None:
+            return await arun(*args, **kwargs)
+        budget = TokenBudget(limit, owner=agent.model)
+        token = _current_budget.set(budget)
+        try:
+            result = await arun(*args, **kwargs)
+        finally:
+            _current_budget.reset(token)
+        return _abound_stream(result, budget) if isinstance(result, AsyncIterator) else result
+
+    agent.run = budgeted_run
+    agent.arun = budgeted_arun
+    agent._token_budget_applied = True
+    return agent
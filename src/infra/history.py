@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, Text, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from .cache import CACHE_SCHEMA, LRUCache
+from .db import get_shared_db_engine
+from .llm import get_openai_client
+from .telemetry import get_current_span, metrics
+
+logger = logging.getLogger(__name__)
+
+# Replace the raw history of the agents (num_history_responses) with a rolling
+# summary plus the most recent turn(s)
+HISTORY_COMPACTION_ENABLED = os.getenv("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+# Runs that are still sent verbatim, everything before them is in the summary
+HISTORY_RECENT_RUNS = int(os.getenv("HISTORY_RECENT_RUNS", "1"))
+# Token budget of summary + recent runs in every prompt
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "3000"))
+# Token budget of the summary itself (a share of HISTORY_MAX_TOKENS)
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "800"))
+# Cheap model that folds each finished turn into the summary
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+# tiktoken encoding used to count tokens
+HISTORY_TOKENIZER = os.getenv("HISTORY_TOKENIZER", "o200k_base")
+# Summaries kept in memory per worker
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "2048"))
+
+SESSION_SUMMARY_TABLE = "session_summaries"
+HISTORY_TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 3000, 5000, 10000, 25000)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Fold the new turn into the existing summary. Keep the user's goals, facts about the user "
+    "and their business, decisions, open questions and the key figures from the answers. "
+    "Drop pleasantries, formatting and anything the new turn makes obsolete. "
+    "Write compact plain text, at most {max_tokens} tokens. Reply with the summary only."
+)
+
+_shared_summary_store: Optional["SessionSummaryStore"] = None
+_shared_summary_store_lock = threading.Lock()
+# Summaries are updated after the answer was sent, off the request path
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="history-summary")
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(HISTORY_TOKENIZER)
+        except Exception as e:
+            logger.warning(f"Tokenizer '{HISTORY_TOKENIZER}' unavailable, estimating 4 characters per token: {e}")
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(value: Optional[str]) -> int:
+    """Number of tokens in a text, counted with the HISTORY_TOKENIZER encoding."""
+    if not value:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(value) + 3) // 4
+    return len(encoding.encode(value, disallowed_special=()))
+
+
+def truncate_tokens(value: str, max_tokens: int, marker: str = " …[truncated]") -> str:
+    """Cut a text down to at most max_tokens tokens (marker included)."""
+    if count_tokens(value) <= max_tokens:
+        return value
+    keep = max(max_tokens - count_tokens(marker), 0)
+    encoding = _get_encoding()
+    if encoding is None:
+        return value[:keep * 4] + marker
+    return encoding.decode(encoding.encode(value, disallowed_special=())[:keep]) + marker
+
+
+class SessionSummaryStore:
+    """
+    Rolling conversation summaries, one per (agent, session).
+
+    A row holds the summary of every run except the latest one, plus the latest
+    turn as "pending" text: the latest run is still sent to the model verbatim,
+    so it is only folded into the summary once the next run has finished. Rows
+    live in ai.session_summaries so every worker sees the same summary, with an
+    in-process LRU in front; concurrent updates are serialized per session in a
+    worker and by a version check across workers.
+    """
+
+    _metadata = MetaData(schema=CACHE_SCHEMA)
+    _table = Table(
+        SESSION_SUMMARY_TABLE,
+        _metadata,
+        Column("agent_id", String, primary_key=True),
+        Column("session_id", String, primary_key=True),
+        Column("summary", Text),
+        Column("pending_turn", Text),
+        Column("runs", Integer),
+        Column("version", Integer),
+        Column("updated_at", BigInteger),
+    )
+
+    def __init__(self, db_engine: Optional[Engine] = None, model: str = HISTORY_SUMMARY_MODEL,
+                 max_summary_tokens: int = HISTORY_SUMMARY_MAX_TOKENS):
+        self.db_engine = db_engine or get_shared_db_engine()
+        self.model = model
+        self.max_summary_tokens = max_summary_tokens
+        self._recent = LRUCache(max_entries=HISTORY_SUMMARY_CACHE_SIZE)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._table_ready = False
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        with self.db_engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {CACHE_SCHEMA}"))
+        self._metadata.create_all(self.db_engine, checkfirst=True)
+        self._table_ready = True
+
+    @staticmethod
+    def _key(agent_id: str, session_id: str) -> str:
+        return f"{agent_id}\x1f{session_id}"
+
+    def get(self, agent_id: str, session_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Returns the summary row of a session ({"summary", "pending_turn", "runs", "version"}) or None.
+
+        Args:
+            agent_id (str): Registry id of the agent.
+            session_id (str): The agno session id.
+            refresh (bool): Read from Postgres even if this worker has the row in memory.
+        """
+        key = self._key(agent_id, session_id)
+        if not refresh:
+            cached = self._recent.get(key)
+            if cached is not None:
+                return cached
+        table = self._table
+        try:
+            self._ensure_table()
+            with self.db_engine.connect() as conn:
+                row = conn.execute(
+                    select(table.c.summary, table.c.pending_turn, table.c.runs, table.c.version).where(
+                        table.c.agent_id == agent_id, table.c.session_id == session_id
+                    )
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"Session summary read failed for '{agent_id}/{session_id}': {e}")
+            return self._recent.get(key)
+        if row is None:
+            return None
+        value = dict(row._mapping)
+        self._recent.set(key, value)
+        return value
+
+    async def aget(self, agent_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """Refresh a session's summary without blocking the event loop."""
+        return await asyncio.to_thread(self.get, agent_id, session_id, True)
+
+    def add_turn(self, agent_id: str, session_id: str, turn: str, attempts: int = 3) -> None:
+        """
+        Record a finished turn: fold the previous pending turn into the summary
+        and keep this one pending. Runs on the summary executor.
+        """
+        with self._session_lock(agent_id, session_id):
+            for _ in range(attempts):
+                current = self.get(agent_id, session_id, refresh=True)
+                summary = (current or {}).get("summary") or ""
+                pending = (current or {}).get("pending_turn")
+                if pending:
+                    try:
+                        summary = self.summarize(summary, pending)
+                    except Exception as e:
+                        logger.warning(f"Summarizing '{agent_id}/{session_id}' failed, keeping the old summary: {e}")
+                value = {
+                    "summary": summary,
+                    "pending_turn": turn,
+                    "runs": (current or {}).get("runs", 0) + 1,
+                    "version": (current or {}).get("version", 0) + 1,
+                }
+                if self._write(agent_id, session_id, value, expected_version=(current or {}).get("version")):
+                    self._recent.set(self._key(agent_id, session_id), value)
+                    return
+            logger.warning(
+                f"Session summary of '{agent_id}/{session_id}' kept changing or couldn't be written, dropped a turn"
+            )
+
+    def summarize(self, summary: str, turn: str) -> str:
+        """Fold one turn into a summary with the summary model."""
+        start = time.perf_counter()
+        response = get_openai_client(api_key=os.getenv("OPENAI_API_KEY")).chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_tokens=self.max_summary_tokens)},
+                {
+                    "role": "user",
+                    "content": f"<summary>\n{summary or '(empty)'}\n</summary>\n\n<new_turn>\n{turn}\n</new_turn>",
+                },
+            ],
+            max_tokens=self.max_summary_tokens,
+        )
+        metrics.observe("agent_history_summary_seconds", time.perf_counter() - start,
+                        help="Time spent updating conversation summaries.")
+        return truncate_tokens((response.choices[0].message.content or "").strip(), self.max_summary_tokens)
+
+    def _write(self, agent_id: str, session_id: str, value: Dict[str, Any], expected_version: Optional[int]) -> bool:
+        table = self._table
+        now = int(time.time())
+        try:
+            self._ensure_table()
+            with self.db_engine.begin() as conn:
+                if expected_version is None:
+                    stmt = postgresql.insert(table).values(
+                        agent_id=agent_id, session_id=session_id, updated_at=now, **value
+                    ).on_conflict_do_nothing()
+                else:
+                    stmt = update(table).where(
+                        table.c.agent_id == agent_id,
+                        table.c.session_id == session_id,
+                        table.c.version == expected_version,
+                    ).values(updated_at=now, **value)
+                # rowcount isn't reliable for INSERT .. ON CONFLICT DO NOTHING
+                return conn.execute(stmt.returning(table.c.version)).first() is not None
+        except Exception as e:
+            logger.warning(f"Session summary write failed for '{agent_id}/{session_id}': {e}")
+            # Not stored: add_turn reads the row again and retries
+            return False
+
+    def _session_lock(self, agent_id: str, session_id: str) -> threading.Lock:
+        key = self._key(agent_id, session_id)
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                if len(self._locks) >= HISTORY_SUMMARY_CACHE_SIZE:
+                    # Drop idle locks so the map doesn't grow with every session
+                    for idle in [k for k, v in self._locks.items() if not v.locked()]:
+                        del self._locks[idle]
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+
+def get_session_summary_store() -> SessionSummaryStore:
+    """
+    Returns the shared session summary store.
+    Creates the store if it doesn't exist yet.
+    """
+    global _shared_summary_store
+    with _shared_summary_store_lock:
+        if _shared_summary_store is None:
+            _shared_summary_store = SessionSummaryStore()
+        return _shared_summary_store
+
+
+def _message_text(message: Any) -> Optional[str]:
+    content = getattr(message, "content", None)
+    return content if isinstance(content, str) else None
+
+
+def _fit_messages(messages: List[Any], max_tokens: int) -> List[Any]:
+    """
+    Fit history messages into a token budget. Tool calls and their results are
+    dropped (the final answer already covers them), then every message gets an
+    even share of the budget, smallest first, and longer ones are truncated.
+    """
+    kept = [
+        message for message in messages
+        if message.role == "user" or (message.role == "assistant" and not message.tool_calls and _message_text(message))
+    ]
+    remaining = max_tokens
+    fitted = {}
+    by_size = sorted(kept, key=lambda message: count_tokens(_message_text(message)))
+    for position, message in enumerate(by_size):
+        share = remaining // (len(by_size) - position)
+        content = _message_text(message)
+        if content is None:
+            fitted[id(message)] = message
+            continue
+        if share <= 0:
+            continue
+        if count_tokens(content) > share:
+            message.content = truncate_tokens(content, share)
+        remaining -= count_tokens(message.content)
+        fitted[id(message)] = message
+    return [message for message in kept if id(message) in fitted]
+
+
+def _compact_run_messages(agent: Any, agent_id: str, run_messages: Any, row: Optional[Dict[str, Any]]) -> None:
+    from agno.models.message import Message
+
+    messages = run_messages.messages
+    history_at = [i for i, message in enumerate(messages) if getattr(message, "from_history", False)]
+    start = history_at[0] if history_at else next(
+        (i for i, message in enumerate(messages) if message.role != agent.system_message_role), len(messages)
+    )
+    history = [messages[i] for i in history_at]
+    rest = [message for i, message in enumerate(messages) if i not in set(history_at)]
+
+    compacted = []
+    summary = (row or {}).get("summary")
+    if summary:
+        summary = truncate_tokens(summary, HISTORY_SUMMARY_MAX_TOKENS)
+        compacted.append(Message(
+            role=agent.system_message_role,
+            content=f"<conversation_summary>\n{summary}\n</conversation_summary>",
+            from_history=True,
+        ))
+    budget = HISTORY_MAX_TOKENS - sum(count_tokens(_message_text(message)) for message in compacted)
+    compacted += _fit_messages(history, budget)
+
+    start = min(start, len(rest))
+    run_messages.messages = rest[:start] + compacted + rest[start:]
+
+    tokens = sum(count_tokens(_message_text(message)) for message in compacted)
+    metrics.observe("agent_history_tokens", tokens, help="Tokens of history sent with each run.",
+                    buckets=HISTORY_TOKEN_BUCKETS, agent=agent_id)
+    current = get_current_span()
+    if current is not None:
+        current.set(history_tokens=tokens, history_summary=bool(summary))
+
+
+def _format_turn(prompt: Optional[str], answer: Optional[str]) -> str:
+    # The summary model only needs the gist of a very long answer
+    answer = truncate_tokens(answer or "", HISTORY_MAX_TOKENS)
+    return f"User: {prompt or '(no text)'}\n\nAssistant: {answer}"
+
+
+def _collect_answer(stream: Iterator[Any], on_complete: Callable[[Optional[str], str], None]) -> Iterator[Any]:
+    parts, session_id = [], None
+    for chunk in stream:
+        session_id = getattr(chunk, "session_id", None) or session_id
+        if getattr(chunk, "event", None) == "RunError":
+            on_complete = None
+        elif getattr(chunk, "event", None) == "RunResponse" and isinstance(getattr(chunk, "content", None), str):
+            parts.append(chunk.content)
+        yield chunk
+    if on_complete is not None:
+        on_complete(session_id, "".join(parts))
+
+
+async def _acollect_answer(stream: AsyncIterator[Any], on_complete: Callable[[Optional[str], str], None]) -> AsyncIterator[Any]:
+    parts, session_id = [], None
+    async for chunk in stream:
+        session_id = getattr(chunk, "session_id", None) or session_id
+        if getattr(chunk, "event", None) == "RunError":
+            on_complete = None
+        elif getattr(chunk, "event", None) == "RunResponse" and isinstance(getattr(chunk, "content", None), str):
+            parts.append(chunk.content)
+        yield chunk
+    if on_complete is not None:
+        on_complete(session_id, "".join(parts))
+
+
+def enable_history_compaction(agent: Any, agent_id: str, store: Optional[SessionSummaryStore] = None) -> Any:
+    """
+    Send a rolling session summary plus only the most recent run(s) as history,
+    instead of the agent's last num_history_responses raw runs.
+
+    Every prompt gets the summary (as a system message) and the latest
+    HISTORY_RECENT_RUNS runs without their tool calls, together fitted into
+    HISTORY_MAX_TOKENS tokens. After each run the finished turn is folded into
+    the summary in the background, so a message sent before that finished sees
+    a summary that is one turn behind. Only agents with add_history_to_messages
+    are changed; calling this twice is a no-op.
+
+    Args:
+        agent: An agno Agent.
+        agent_id (str): Registry id, the summaries are stored per agent id and session.
+        store (SessionSummaryStore, optional): Defaults to the shared store.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    if (
+        getattr(agent, "_history_compaction_enabled", False)
+        or (store is None and not HISTORY_COMPACTION_ENABLED)
+        or not getattr(agent, "add_history_to_messages", False)
+    ):
+        return agent
+
+    # Agno copies num_history_responses into num_history_runs on every run
+    agent.num_history_responses = agent.num_history_runs = HISTORY_RECENT_RUNS
+    run, arun, get_run_messages = agent.run, agent.arun, agent.get_run_messages
+
+    def get_store() -> SessionSummaryStore:
+        return store or get_session_summary_store()
+
+    def compacted_run_messages(*args, **kwargs):
+        run_messages = get_run_messages(*args, **kwargs)
+        session_id = kwargs.get("session_id") or agent.session_id
+        if session_id:
+            _compact_run_messages(agent, agent_id, run_messages, get_store().get(agent_id, session_id))
+        return run_messages
+
+    def record_turn(prompt: Any, session_id: Optional[str], answer: Any) -> None:
+        if session_id and isinstance(answer, str) and answer.strip():
+            turn = _format_turn(prompt if isinstance(prompt, str) else None, answer)
+            _summary_executor.submit(get_store().add_turn, agent_id, session_id, turn)
+
+    def compacted_run(message: Any = None, *args, **kwargs):
+        result = run(message, *args, **kwargs)
+        if isinstance(result, Iterator):
+            return _collect_answer(result, lambda session_id, answer: record_turn(message, session_id, answer))
+        record_turn(message, getattr(result, "session_id", None), getattr(result, "content", None))
+        return result
+
+    async def compacted_arun(message: Any = None, *args, **kwargs):
+        # Load the summary off the event loop; get_run_messages then reads it from memory
+        session_id = kwargs.get("session_id")
+        if session_id:
+            await get_store().aget(agent_id, session_id)
+        result = await arun(message, *args, **kwargs)
+        if isinstance(result, AsyncIterator):
+            return _acollect_answer(result, lambda session_id, answer: record_turn(message, session_id, answer))
+        record_turn(message, getattr(result, "session_id", None), getattr(result, "content", None))
+        return result
+
+    agent.get_run_messages = compacted_run_messages
+    # Turns answered from a cache are added by semantic_cache.remember_cached_turn
+    agent._record_history_turn = record_turn
+    agent.run = compacted_run
+    agent.arun = compacted_arun
+    agent._history_compaction_enabled = True
+    return agent
@@ -0,0 +1,447 @@
+"""
+Image intake for vision agents: uploads are downsized and recompressed before
+they reach the model, the analysis of an image is cached per (image, prompt),
+and the session history keeps small thumbnails instead of the full uploads.
+
+    enable_image_intake(image_agent, "image-agent")
+
+The savings of every request (bytes, estimated vision tokens, cache hits) are
+set on its run span and added to the agent_image_* metrics.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cache import TieredCache, make_cache_key, normalize_text
+from .semantic_cache import (
+    _aiter,
+    _cached_chunks,
+    asession_has_runs,
+    namespace_for,
+    remember_cached_turn,
+    session_has_runs,
+)
+from .telemetry import get_current_span, metrics
+
+logger = logging.getLogger(__name__)
+
+# Comma separated agent ids (see src.agents.AGENT_REGISTRY), or "*" for all
+IMAGE_INTAKE_AGENTS = {
+    agent_id.strip() for agent_id in os.getenv("IMAGE_INTAKE_AGENTS", "image-agent").split(",") if agent_id.strip()
+}
+# Longest side (px) images are downsized to; the OpenAI vision models scale the
+# shortest side to 768px anyway, so 1024 keeps the detail of 4:3 photos
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+# JPEG quality of the recompressed images
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Vision detail sent with every image: low (85 tokens each), high or auto; unset leaves it to the model
+IMAGE_DETAIL = os.getenv("IMAGE_DETAIL") or None
+# Longest side (px) and JPEG quality of the thumbnails kept in the session history
+IMAGE_THUMBNAIL_SIDE = int(os.getenv("IMAGE_THUMBNAIL_SIDE", "256"))
+IMAGE_THUMBNAIL_QUALITY = int(os.getenv("IMAGE_THUMBNAIL_QUALITY", "70"))
+# Analysis cache (memory LRU tier + shared Postgres tier), keyed by image hashes + prompt
+IMAGE_ANALYSIS_CACHE = os.getenv("IMAGE_ANALYSIS_CACHE", "true").lower() == "true"
+IMAGE_ANALYSIS_CACHE_PERSISTENT = os.getenv("IMAGE_ANALYSIS_CACHE_PERSISTENT", "true").lower() == "true"
+IMAGE_ANALYSIS_CACHE_TTL = float(os.getenv("IMAGE_ANALYSIS_CACHE_TTL", "604800"))
+IMAGE_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_ANALYSIS_CACHE_MAX_ENTRIES", "512"))
+
+# Id prefix of the thumbnails that replaced the uploads in the session history
+THUMBNAIL_ID_PREFIX = "thumbnail:"
+
+_shared_analysis_cache: Optional[TieredCache] = None
+_shared_analysis_cache_lock = threading.Lock()
+# Cache writes happen after the answer was sent, off the request path
+_store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-cache")
+
+
+def vision_tokens(width: int, height: int, detail: Optional[str] = None) -> int:
+    """
+    Estimated input tokens of an image for the OpenAI vision models: 85 at low
+    detail, otherwise 85 + 170 per 512px tile after the image is fitted into
+    2048x2048 and its shortest side scaled down to 768px.
+    """
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _open(data: bytes, max_side: int):
+    from PIL import Image as PILImage, ImageOps
+
+    picture = PILImage.open(io.BytesIO(data))
+    size, source_format = picture.size, picture.format
+    # Let the JPEG decoder skip the resolution that would be thrown away
+    picture.draft("RGB", (max_side, max_side))
+    picture = ImageOps.exif_transpose(picture)
+    return picture, size, source_format
+
+
+def _jpeg(picture, max_side: int, quality: int) -> bytes:
+    from PIL import Image as PILImage
+
+    picture.thumbnail((max_side, max_side), PILImage.Resampling.LANCZOS)
+    if picture.mode in ("RGBA", "LA", "P"):
+        picture = picture.convert("RGBA")
+        background = PILImage.new("RGB", picture.size, (255, 255, 255))
+        background.paste(picture, mask=picture.getchannel("A"))
+        picture = background
+    elif picture.mode != "RGB":
+        picture = picture.convert("RGB")
+    output = io.BytesIO()
+    picture.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def _png(picture) -> bytes:
+    if picture.mode not in ("1", "L", "LA", "I", "P", "RGB", "RGBA"):
+        picture = picture.convert("RGB")
+    output = io.BytesIO()
+    picture.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _image_bytes(image: Any) -> Optional[bytes]:
+    content = getattr(image, "content", None)
+    if isinstance(content, (bytes, bytearray)):
+        return bytes(content)
+    filepath = getattr(image, "filepath", None)
+    if filepath:
+        try:
+            with open(filepath, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+    return None
+
+
+def prepare_image(image: Any, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_JPEG_QUALITY,
+                  detail: Optional[str] = IMAGE_DETAIL) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Downsize and recompress an uploaded image for the model.
+
+    The image is rotated upright, fitted into max_side x max_side and saved as
+    JPEG (agno sends bytes as image/jpeg). Downsized images that were not JPEG
+    (screenshots, diagrams) are saved as PNG instead when the JPEG isn't smaller,
+    and the original is kept when neither is. Images given by URL, or that can't
+    be decoded, are passed through.
+
+    Args:
+        image (agno.media.Image): The uploaded image.
+        max_side (int): Longest side in pixels.
+        quality (int): JPEG quality.
+        detail (str, optional): Vision detail to request, defaults to the image's own.
+
+    Returns:
+        Tuple[Image, Dict[str, Any]]: The image to send, and its stats: "hash"
+        (sha256 of the original, None for URLs), "bytes_in", "bytes_out",
+        "tokens_in" and "tokens_out" (estimated vision tokens).
+    """
+    from agno.media import Image
+
+    detail = detail or getattr(image, "detail", None)
+    data = _image_bytes(image)
+    stats: Dict[str, Any] = {"hash": None, "bytes_in": 0, "bytes_out": 0, "tokens_in": 0, "tokens_out": 0}
+    if data is None:
+        return image, stats
+    stats.update(hash=hashlib.sha256(data).hexdigest(), bytes_in=len(data), bytes_out=len(data))
+    try:
+        picture, (width, height), source_format = _open(data, max_side)
+        stats["tokens_in"] = stats["tokens_out"] = vision_tokens(width, height, getattr(image, "detail", None))
+        prepared, image_format = _jpeg(picture, max_side, quality), "jpeg"
+        if len(prepared) >= len(data) and source_format != "JPEG" and max(picture.size) < max(width, height):
+            # Text and flat colours compress worse as JPEG, try the downsized image losslessly
+            lossless = _png(picture)
+            if len(lossless) < len(prepared):
+                prepared, image_format = lossless, "png"
+        stats["tokens_out"] = vision_tokens(*picture.size, detail)
+    except Exception as e:
+        logger.warning(f"Could not preprocess image {stats['hash'][:12]}: {e}")
+        return image, stats
+    if len(prepared) >= len(data):
+        # Never send more bytes than were uploaded; the model downsizes the original itself
+        prepared, image_format = data, getattr(image, "format", None)
+        stats["tokens_out"] = vision_tokens(width, height, detail)
+    stats["bytes_out"] = len(prepared)
+    return Image(content=prepared, format=image_format, detail=detail, id=getattr(image, "id", None)), stats
+
+
+def make_thumbnail(image: Any, max_side: int = IMAGE_THUMBNAIL_SIDE,
+                   quality: int = IMAGE_THUMBNAIL_QUALITY) -> Optional[Any]:
+    """Low detail JPEG thumbnail of an image with bytes content, or None if it has none or can't be decoded."""
+    from agno.media import Image
+
+    data = _image_bytes(image)
+    if data is None:
+        return None
+    try:
+        picture, _, _ = _open(data, max_side)
+        thumbnail = _jpeg(picture, max_side, quality)
+    except Exception as e:
+        logger.warning(f"Could not create an image thumbnail: {e}")
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    return Image(content=thumbnail, format="jpeg", detail="low", id=f"{THUMBNAIL_ID_PREFIX}{digest}")
+
+
+def get_image_analysis_cache() -> Optional[TieredCache]:
+    """
+    Returns the shared image analysis cache, or None when IMAGE_ANALYSIS_CACHE is off.
+    Creates the cache if it doesn't exist yet.
+    """
+    global _shared_analysis_cache
+    if not IMAGE_ANALYSIS_CACHE:
+        return None
+    if _shared_analysis_cache is None:
+        with _shared_analysis_cache_lock:
+            if _shared_analysis_cache is None:
+                _shared_analysis_cache = TieredCache(
+                    "image_analysis",
+                    ttl=IMAGE_ANALYSIS_CACHE_TTL,
+                    max_entries=IMAGE_ANALYSIS_CACHE_MAX_ENTRIES,
+                    persistent=IMAGE_ANALYSIS_CACHE_PERSISTENT,
+                )
+    return _shared_analysis_cache
+
+
+def image_intake_enabled(agent_id: str) -> bool:
+    return "*" in IMAGE_INTAKE_AGENTS or agent_id in IMAGE_INTAKE_AGENTS
+
+
+def _record_intake(agent_id: str, stats: List[Dict[str, Any]]) -> Dict[str, int]:
+    totals = {key: sum(item[key] for item in stats) for key in ("bytes_in", "bytes_out", "tokens_in", "tokens_out")}
+    metrics.inc("agent_images_total", len(stats), help="Images received by the vision agents.", name=agent_id)
+    # Counters can't go down; a higher requested detail can make tokens_out exceed tokens_in
+    metrics.inc("agent_image_bytes_saved_total", max(0, totals["bytes_in"] - totals["bytes_out"]),
+                help="Image bytes removed by downsizing and recompressing before the model call.", name=agent_id)
+    metrics.inc("agent_image_tokens_saved_total", max(0, totals["tokens_in"] - totals["tokens_out"]),
+                help="Estimated vision input tokens saved, by reason.", name=agent_id, reason="resize")
+    current = get_current_span()
+    if current is not None:
+        current.set(
+            images=len(stats),
+            image_bytes_in=totals["bytes_in"],
+            image_bytes_out=totals["bytes_out"],
+            image_tokens_in=totals["tokens_in"],
+            image_tokens_out=totals["tokens_out"],
+        )
+    return totals
+
+
+def _record_lookup(agent_id: str, hit: bool, tokens: int) -> None:
+    metrics.inc("agent_cache_requests_total", help="Cache lookups by result.",
+                kind="image_analysis", name=agent_id, result="hit" if hit else "miss")
+    if hit:
+        metrics.inc("agent_image_tokens_saved_total", tokens,
+                    help="Estimated vision input tokens saved, by reason.", name=agent_id, reason="cache")
+    current = get_current_span()
+    if current is not None:
+        current.set(image_cache="hit" if hit else "miss")
+
+
+def _record_skip(reason: str) -> None:
+    current = get_current_span()
+    if current is not None:
+        current.set(image_cache=reason)
+
+
+def _analysis_key(namespace: str, message: Any, kwargs: Dict[str, Any], stats: List[Dict[str, Any]]) -> Optional[str]:
+    """Cache key of an analysis, or None if the request can't be served from the cache."""
+    if message is not None and not isinstance(message, str):
+        return None
+    if any(kwargs.get(key) for key in ("audio", "videos", "files", "messages")):
+        return None
+    if any(item["hash"] is None for item in stats):
+        return None
+    settings = f"{IMAGE_MAX_SIDE}:{IMAGE_JPEG_QUALITY}:{IMAGE_DETAIL}"
+    return make_cache_key(namespace, normalize_text(message), settings, *[item["hash"] for item in stats])
+
+
+def _cacheable(chunk: Any) -> bool:
+    """Answers that called tools (web research, DALL·E) depend on more than the image and prompt."""
+    event = getattr(chunk, "event", None) or ""
+    return not (event == "RunError" or event.startswith("ToolCall")
+                or getattr(chunk, "tools", None) or getattr(chunk, "images", None))
+
+
+def _store_later(cache: TieredCache, key: str, answer: Any) -> None:
+    if isinstance(answer, str) and answer.strip():
+        _store_executor.submit(cache.set, key, {"answer": answer})
+
+
+def _collect_analysis(stream: Iterator[Any], on_complete) -> Iterator[Any]:
+    parts = []
+    for chunk in stream:
+        if not _cacheable(chunk):
+            on_complete = None
+        elif getattr(chunk, "event", None) == "RunResponse" and isinstance(getattr(chunk, "content", None), str):
+            parts.append(chunk.content)
+        yield chunk
+    if on_complete is not None:
+        on_complete("".join(parts))
+
+
+async def _acollect_analysis(stream: AsyncIterator[Any], on_complete) -> AsyncIterator[Any]:
+    parts = []
+    async for chunk in stream:
+        if not _cacheable(chunk):
+            on_complete = None
+        elif getattr(chunk, "event", None) == "RunResponse" and isinstance(getattr(chunk, "content", None), str):
+            parts.append(chunk.content)
+        yield chunk
+    if on_complete is not None:
+        on_complete("".join(parts))
+
+
+def _stored_messages(memory: Any) -> Iterable[Any]:
+    """Every message of the runs in an agent's memory (AgentMemory or Memory)."""
+    runs = getattr(memory, "runs", None) or []
+    if isinstance(runs, dict):
+        runs = [run for session_runs in runs.values() for run in session_runs]
+    for run in runs:
+        if getattr(run, "message", None) is not None:
+            yield run.message
+        yield from getattr(run, "messages", None) or []
+        response = getattr(run, "response", None)
+        if response is not None:
+            yield from getattr(response, "messages", None) or []
+
+
+def thumbnail_history(agent: Any) -> int:
+    """
+    Replace the images of the messages in an agent's memory by thumbnails, so
+    the stored session (and the history sent with later runs) doesn't carry
+    the full uploads. Returns the bytes saved.
+    """
+    saved = 0
+    for message in _stored_messages(getattr(agent, "memory", None)):
+        images = getattr(message, "images", None)
+        if not images:
+            continue
+        thumbnails = []
+        for image in images:
+            if str(getattr(image, "id", None) or "").startswith(THUMBNAIL_ID_PREFIX):
+                thumbnails.append(image)
+                continue
+            size = len(_image_bytes(image) or b"")
+            thumbnail = make_thumbnail(image)
+            if thumbnail is None or len(thumbnail.content) >= size:
+                thumbnails.append(image)
+                continue
+            saved += size - len(thumbnail.content)
+            thumbnails.append(thumbnail)
+        message.images = thumbnails
+    return saved
+
+
+def enable_image_intake(agent: Any, agent_id: str, cache: Optional[TieredCache] = None) -> Any:
+    """
+    Preprocess the images of an agent's runs, cache their analysis and keep
+    thumbnails in its session history, when image intake is enabled for it.
+
+    Images are downsized and recompressed (prepare_image) before the run. A
+    request that starts a session and whose prompt and images were analysed
+    before is answered from the cache without running the agent, and recorded
+    in the session history like the semantic cache does; turns of sessions that
+    already have runs depend on their history and always run. Answers that used
+    tools are not cached. Before the session is written, the images in the
+    agent's memory are replaced by thumbnails. Calling this twice is a no-op.
+
+    Args:
+        agent: An agno Agent.
+        agent_id (str): Registry id, checked against IMAGE_INTAKE_AGENTS.
+        cache (TieredCache, optional): Defaults to the shared analysis cache.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    if getattr(agent, "_image_intake_enabled", False) or (cache is None and not image_intake_enabled(agent_id)):
+        return agent
+
+    namespace = namespace_for(agent, agent_id)
+    run, arun, write_to_storage = agent.run, agent.arun, agent.write_to_storage
+
+    def get_cache() -> Optional[TieredCache]:
+        return cache or get_image_analysis_cache()
+
+    def intake(message: Any, kwargs: Dict[str, Any]) -> Tuple[Optional[str], int]:
+        prepared = [prepare_image(image) for image in kwargs["images"]]
+        kwargs["images"] = [image for image, _ in prepared]
+        stats = [item for _, item in prepared]
+        totals = _record_intake(agent_id, stats)
+        key = _analysis_key(namespace, message, kwargs, stats) if get_cache() is not None else None
+        return key, totals["tokens_out"]
+
+    def cached_chunks(message: Any, answer: str, kwargs: Dict[str, Any]) -> Tuple[List[Any], bool]:
+        stream = kwargs.get("stream")
+        stream = stream if stream is not None else bool(getattr(agent, "stream", False))
+        session_id = kwargs.get("session_id") or agent.session_id
+        run_id = remember_cached_turn(agent, message, answer, session_id, kwargs.get("user_id"), kwargs["images"])
+        return _cached_chunks(agent, answer, session_id, stream, run_id), stream
+
+    def intake_run(message: Any = None, *args, **kwargs):
+        if not kwargs.get("images") or args:
+            return run(message, *args, **kwargs)
+        key, tokens = intake(message, kwargs)
+        if key is not None and session_has_runs(agent, kwargs.get("session_id") or agent.session_id):
+            _record_skip("history")
+            return run(message, **kwargs)
+        if key is not None:
+            hit = get_cache().get(key)
+            _record_lookup(agent_id, hit is not None, tokens)
+            if hit is not None:
+                chunks, stream = cached_chunks(message, hit["answer"], kwargs)
+                return iter(chunks) if stream else chunks[0]
+        result = run(message, **kwargs)
+        if key is None:
+            return result
+        if isinstance(result, Iterator):
+            return _collect_analysis(result, lambda answer: _store_later(get_cache(), key, answer))
+        if _cacheable(result):
+            _store_later(get_cache(), key, getattr(result, "content", None))
+        return result
+
+    async def intake_arun(message: Any = None, *args, **kwargs):
+        if not kwargs.get("images") or args:
+            return await arun(message, *args, **kwargs)
+        # Decoding and resizing is CPU work, keep it off the event loop
+        key, tokens = await asyncio.to_thread(intake, message, kwargs)
+        if key is not None and await asession_has_runs(agent, kwargs.get("session_id") or agent.session_id):
+            _record_skip("history")
+            return await arun(message, **kwargs)
+        if key is not None:
+            hit = await asyncio.to_thread(get_cache().get, key)
+            _record_lookup(agent_id, hit is not None, tokens)
+            if hit is not None:
+                chunks, stream = cached_chunks(message, hit["answer"], kwargs)
+                return _aiter(chunks) if stream else chunks[0]
+        result = await arun(message, **kwargs)
+        if key is None:
+            return result
+        if isinstance(result, AsyncIterator):
+            return _acollect_analysis(result, lambda answer: _store_later(get_cache(), key, answer))
+        if _cacheable(result):
+            _store_later(get_cache(), key, getattr(result, "content", None))
+        return result
+
+    def thumbnailed_write_to_storage(*args, **kwargs):
+        saved = thumbnail_history(agent)
+        if saved:
+            metrics.inc("agent_image_stored_bytes_saved_total", saved,
+                        help="Image bytes kept out of the session history by thumbnails.", name=agent_id)
+        return write_to_storage(*args, **kwargs)
+
+    agent.run = intake_run
+    agent.arun = intake_arun
+    agent.write_to_storage = thumbnailed_write_to_storage
+    agent._image_intake_enabled = True
+    return agent
@@ -0,0 +1,389 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, Text, and_, or_, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from .cache import CACHE_SCHEMA
+from .db import get_shared_db_engine
+from .telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+# Jobs one web worker runs at the same time; the rest wait in Postgres for any worker
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "2"))
+# How often (seconds) an idle worker looks for queued or abandoned jobs
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "2"))
+# A running job whose worker hasn't sent a heartbeat for this long is resumed by another worker
+JOBS_HEARTBEAT_INTERVAL = float(os.getenv("JOBS_HEARTBEAT_INTERVAL", "10"))
+JOBS_STALE_AFTER = float(os.getenv("JOBS_STALE_AFTER", "60"))
+# Jobs that were (re)started this many times without finishing are failed; a job handed
+# back by a worker that shut down cleanly doesn't use up an attempt
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+# How often (seconds) an SSE stream checks for new events, and sends a keep-alive
+JOBS_EVENT_POLL_INTERVAL = float(os.getenv("JOBS_EVENT_POLL_INTERVAL", "1"))
+JOBS_KEEPALIVE_INTERVAL = float(os.getenv("JOBS_KEEPALIVE_INTERVAL", "15"))
+
+JOBS_TABLE = "team_jobs"
+JOB_EVENTS_TABLE = "team_job_events"
+TERMINAL_STATUSES = ("completed", "failed")
+JOB_DURATION_BUCKETS = (10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+
+_shared_job_manager: Optional["JobManager"] = None
+_shared_job_manager_lock = threading.Lock()
+
+
+class JobManager:
+    """
+    Background runs of long team reports, persisted in Postgres.
+
+    submit() stores a job and returns its id right away. Every web worker runs a
+    poll loop that claims queued jobs (SELECT ... FOR UPDATE SKIP LOCKED, so each
+    job goes to exactly one worker) up to JOBS_CONCURRENCY at a time and runs them
+    with a ParallelTeamRunner. The research context and every finished member are
+    saved to the job's progress as they arrive, and appended to an event log that
+    clients can poll or follow as SSE from any worker.
+
+    A running job sends heartbeats; if its worker dies, another worker claims it
+    once the heartbeat is older than JOBS_STALE_AFTER and resumes it with the saved
+    context and completed members, so only the unfinished members run again.
+    Polling is used instead of LISTEN/NOTIFY because the Supabase transaction
+    pooler doesn't support it.
+    """
+
+    _metadata = MetaData(schema=CACHE_SCHEMA)
+    _jobs = Table(
+        JOBS_TABLE,
+        _metadata,
+        Column("id", String, primary_key=True),
+        Column("kind", String, nullable=False),
+        Column("query", Text, nullable=False),
+        Column("user_id", String, index=True),
+        Column("status", String, index=True, nullable=False),
+        Column("progress", postgresql.JSONB),
+        Column("result", postgresql.JSONB),
+        Column("error", Text),
+        Column("attempts", Integer, nullable=False, default=0),
+        Column("worker_id", String),
+        Column("heartbeat_at", BigInteger),
+        Column("created_at", BigInteger),
+        Column("updated_at", BigInteger),
+    )
+    _events = Table(
+        JOB_EVENTS_TABLE,
+        _metadata,
+        Column("id", BigInteger, primary_key=True, autoincrement=True),
+        Column("job_id", String, index=True, nullable=False),
+        Column("event", String, nullable=False),
+        Column("data", postgresql.JSONB),
+        Column("created_at", BigInteger),
+    )
+
+    def __init__(self, runners: Optional[Dict[str, Callable[[], Any]]] = None,
+                 concurrency: int = JOBS_CONCURRENCY, db_engine: Optional[Engine] = None):
+        """
+        Args:
+            runners (Dict[str, Callable], optional): Job kind -> function returning the
+                ParallelTeamRunner for it. Called in a worker thread, so it may build agents.
+            concurrency (int): Jobs this worker runs at the same time.
+            db_engine (Engine, optional): Defaults to the shared engine.
+        """
+        self.runners: Dict[str, Callable[[], Any]] = dict(runners or {})
+        self.concurrency = concurrency
+        self.db_engine = db_engine or get_shared_db_engine()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._table_ready = False
+
+    def register(self, kind: str, runner_factory: Callable[[], Any]) -> None:
+        self.runners[kind] = runner_factory
+
+    def _ensure_tables(self) -> None:
+        if self._table_ready:
+            return
+        with self.db_engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {CACHE_SCHEMA}"))
+        self._metadata.create_all(self.db_engine, checkfirst=True)
+        self._table_ready = True
+
+    # Client side
+
+    async def submit(self, kind: str, query: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a new job; a worker with a free slot picks it up.
+
+        Args:
+            kind (str): A registered job kind.
+            query (str): The user request.
+            user_id (str, optional): Owner of the job.
+
+        Returns:
+            dict: The job, see get().
+
+        Raises:
+            KeyError: If the kind isn't registered.
+        """
+        if kind not in self.runners:
+            raise KeyError(f"Unknown job kind '{kind}'")
+        job_id = str(uuid.uuid4())
+        now = int(time.time())
+        values = dict(id=job_id, kind=kind, query=query, user_id=user_id, status="queued",
+                      progress={"context": None, "members": {}}, attempts=0, created_at=now, updated_at=now)
+
+        def insert():
+            self._ensure_tables()
+            with self.db_engine.begin() as conn:
+                conn.execute(self._jobs.insert().values(**values))
+                self._add_event(conn, job_id, "queued", {"kind": kind})
+
+        await asyncio.to_thread(insert)
+        metrics.inc("agent_jobs_total", help="Background jobs by kind and outcome.", kind=kind, result="submitted")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a job with its status, progress (context and member results) and result, or None."""
+        def read():
+            self._ensure_tables()
+            with self.db_engine.connect() as conn:
+                return conn.execute(select(self._jobs).where(self._jobs.c.id == job_id)).fetchone()
+
+        row = await asyncio.to_thread(read)
+        if row is None:
+            return None
+        job = dict(row._mapping)
+        job["job_id"] = job.pop("id")
+        job.pop("heartbeat_at")
+        return job
+
+    async def events(self, job_id: str, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Events of a job with an id greater than after_id, oldest first."""
+        def read():
+            self._ensure_tables()
+            with self.db_engine.connect() as conn:
+                return conn.execute(
+                    select(self._events.c.id, self._events.c.event, self._events.c.data)
+                    .where(self._events.c.job_id == job_id, self._events.c.id > after_id)
+                    .order_by(self._events.c.id)
+                ).fetchall()
+
+        return [dict(row._mapping) for row in await asyncio.to_thread(read)]
+
+    async def stream_events(self, job_id: str, after_id: int = 0) -> AsyncIterator[str]:
+        """
+        Follow a job's events as server-sent events, starting after the event id
+        after_id (the client's Last-Event-ID). Ends after the completed/failed event.
+        """
+        last_sent = time.monotonic()
+        while True:
+            for event in await self.events(job_id, after_id):
+                after_id = event["id"]
+                last_sent = time.monotonic()
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["event"] in TERMINAL_STATUSES:
+                    return
+            if time.monotonic() - last_sent >= JOBS_KEEPALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(JOBS_EVENT_POLL_INTERVAL)
+
+    # Worker side
+
+    def start(self) -> None:
+        """Start claiming and running jobs on the running event loop."""
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        """
+        Stop running jobs and hand the unfinished ones back to the queue, so another
+        worker resumes them right away instead of after JOBS_STALE_AFTER.
+        """
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        job_ids = list(self._tasks)
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if job_ids:
+            await asyncio.to_thread(self._release, job_ids)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                while len(self._tasks) < self.concurrency:
+                    job = await asyncio.to_thread(self._claim)
+                    if job is None:
+                        break
+                    task = asyncio.get_running_loop().create_task(self._run(job))
+                    self._tasks[job["id"]] = task
+                    task.add_done_callback(lambda _, job_id=job["id"]: self._job_done(job_id))
+            except Exception as e:
+                logger.warning(f"Claiming jobs failed: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _job_done(self, job_id: str) -> None:
+        self._tasks.pop(job_id, None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job, or a running one whose worker stopped sending heartbeats."""
+        jobs = self._jobs
+        self._ensure_tables()
+        while True:
+            now = int(time.time())
+            with self.db_engine.begin() as conn:
+                row = conn.execute(
+                    select(jobs)
+                    .where(or_(
+                        jobs.c.status == "queued",
+                        and_(jobs.c.status == "running", jobs.c.heartbeat_at < now - JOBS_STALE_AFTER),
+                    ))
+                    .where(jobs.c.kind.in_(list(self.runners)))
+                    .order_by(jobs.c.created_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row.attempts >= JOBS_MAX_ATTEMPTS:
+                    # Keeps crashing its workers, don't hand it to the next one
+                    error = f"Gave up after {row.attempts} attempts"
+                    conn.execute(update(jobs).where(jobs.c.id == row.id).values(
+                        status="failed", error=error, worker_id=None, updated_at=now))
+                    self._add_event(conn, row.id, "failed", {"error": error})
+                    metrics.inc("agent_jobs_total", help="Background jobs by kind and outcome.",
+                                kind=row.kind, result="failed")
+                    continue
+                conn.execute(update(jobs).where(jobs.c.id == row.id).values(
+                    status="running", attempts=row.attempts + 1, worker_id=self.worker_id,
+                    heartbeat_at=now, updated_at=now))
+                members = (row.progress or {}).get("members") or {}
+                resumed = [name for name, member in members.items() if member["status"] == "completed"]
+                self._add_event(conn, row.id, "started", {"attempt": row.attempts + 1, "resumed_members": resumed})
+            return dict(row._mapping, attempts=row.attempts + 1)
+
+    def _release(self, job_ids: List[str]) -> None:
+        """Queue this worker's unfinished jobs again and give back the attempt _claim counted."""
+        jobs = self._jobs
+        with self.db_engine.begin() as conn:
+            conn.execute(update(jobs).where(
+                jobs.c.id.in_(job_ids), jobs.c.worker_id == self.worker_id, jobs.c.status == "running",
+            ).values(status="queued", worker_id=None, attempts=jobs.c.attempts - 1, updated_at=int(time.time())))
+
+    def _add_event(self, conn, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        conn.execute(self._events.insert().values(job_id=job_id, event=event, data=data, created_at=int(time.time())))
+
+    def _update(self, job_id: str, event: Optional[str] = None, data: Optional[Dict[str, Any]] = None,
+                **values) -> bool:
+        """Update a job this worker owns (and log an event); False if another worker took it over."""
+        jobs = self._jobs
+        now = int(time.time())
+        with self.db_engine.begin() as conn:
+            owned = conn.execute(
+                update(jobs)
+                .where(jobs.c.id == job_id, jobs.c.worker_id == self.worker_id)
+                .values(updated_at=now, heartbeat_at=now, **values)
+                .returning(jobs.c.id)
+            ).first() is not None
+            if owned and event is not None:
+                self._add_event(conn, job_id, event, data or {})
+        return owned
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(JOBS_HEARTBEAT_INTERVAL)
+            if not await asyncio.to_thread(self._update, job_id):
+                logger.warning(f"Job {job_id} was taken over by another worker, stopping it here")
+                task.cancel()
+                return
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        from ..agents.parallel_team import MemberResult
+
+        job_id, kind = job["id"], job["kind"]
+        progress = job["progress"] or {}
+        progress = {"context": progress.get("context"), "members": dict(progress.get("members") or {})}
+        completed = {
+            name: MemberResult(**member)
+            for name, member in progress["members"].items() if member["status"] == "completed"
+        }
+        lock = asyncio.Lock()
+
+        async def save(event: str, data: Dict[str, Any], change: Callable[[], None]) -> None:
+            # Change progress and write a copy of it under the lock, so a member that
+            # finishes meanwhile can't modify it while the thread serializes it
+            async with lock:
+                change()
+                await asyncio.to_thread(self._update, job_id, event, data, progress=copy.deepcopy(progress))
+
+        async def on_context(context: str) -> None:
+            await save("context", {"context": context}, lambda: progress.update(context=context))
+
+        async def on_member_done(member) -> None:
+            await save("member", asdict(member), lambda: progress["members"].update({member.name: asdict(member)}))
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, asyncio.current_task()))
+        start = time.perf_counter()
+        try:
+            runner = await asyncio.to_thread(self.runners[kind])
+            result = await runner.arun(
+                job["query"],
+                context=progress["context"],
+                completed=completed,
+                on_context=on_context,
+                on_member_done=on_member_done,
+            )
+            await asyncio.to_thread(self._update, job_id, "completed", result.to_dict(),
+                                    status="completed", result=result.to_dict(), worker_id=None)
+            outcome = "completed"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            await asyncio.to_thread(self._update, job_id, "failed", {"error": str(e)},
+                                    status="failed", error=str(e), worker_id=None)
+            outcome = "failed"
+        finally:
+            heartbeat.cancel()
+        metrics.inc("agent_jobs_total", help="Background jobs by kind and outcome.", kind=kind, result=outcome)
+        metrics.observe("agent_job_duration_seconds", time.perf_counter() - start,
+                        help="Time from claiming to finishing a job.", buckets=JOB_DURATION_BUCKETS, kind=kind)
+
+    @property
+    def running(self) -> Set[str]:
+        """Ids of the jobs this worker is running."""
+        return set(self._tasks)
+
+
+def get_job_manager() -> JobManager:
+    """
+    Returns the shared job manager.
+    Creates the manager if it doesn't exist yet.
+    """
+    global _shared_job_manager
+    with _shared_job_manager_lock:
+        if _shared_job_manager is None:
+            _shared_job_manager = JobManager()
+        return _shared_job_manager
@@ -0,0 +1,470 @@
+import asyncio
+import collections.abc
+import os
+import threading
+import time
+import weakref
+from types import GeneratorType
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+import httpx
+from agno.exceptions import AgentRunException
+from agno.models.message import Message
+from agno.models.openai import OpenAIChat
+from agno.models.response import ModelResponse, ModelResponseEvent
+from agno.tools.function import FunctionCall
+from agno.utils.timer import Timer
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from .governor import (
+    GOVERNOR_ENABLED,
+    AsyncGovernedTransport,
+    GovernedTransport,
+    budget_decision,
+    charge_token_budget,
+)
+from .prompt_layout import prefix_hash, stable_messages
+from .routing import escalate_route, routed_model_id
+from .telemetry import finish_span, record_usage, span, start_span
+from .tool_executor import TOOL_PARALLEL_CALLS, get_tool_executor
+
+# Shared HTTP client settings for every OpenAI-compatible upstream (OpenAI, Perplexity)
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+# Retries of failed connection attempts, done by the httpx transport
+LLM_CONNECT_RETRIES = int(os.getenv("LLM_CONNECT_RETRIES", "2"))
+# Retries of 408/409/429/5xx responses and timeouts, done by the OpenAI SDK with
+# exponential backoff and jitter (Retry-After is honoured). With the upstream
+# governor, which retries 429/5xx itself across all clients, they are off by default.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0" if GOVERNOR_ENABLED else "3"))
+# Answer given to model calls once the run's token budget is used up
+BUDGET_EXHAUSTED_MESSAGE = "[Stopped: the token budget for this request is used up.]"
+
+_shared_http_client: Optional[httpx.Client] = None
+_shared_http_client_lock = threading.Lock()
+# httpx.AsyncClient connections are bound to the event loop that opened them,
+# so the shared async pool is kept per loop.
+_shared_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+_openai_clients: Dict[Tuple, OpenAI] = {}
+_openai_clients_lock = threading.Lock()
+_async_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+
+
+def _http2_enabled() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options() -> Dict[str, Any]:
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+    return {
+        "timeout": httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        "limits": limits,
+        "http2": _http2_enabled(),
+        "retries": LLM_CONNECT_RETRIES,
+    }
+
+
+def get_shared_http_client() -> httpx.Client:
+    """
+    Returns the process-wide pooled keep-alive httpx.Client.
+    Creates the client if it doesn't exist yet.
+    """
+    global _shared_http_client
+    with _shared_http_client_lock:
+        if _shared_http_client is None or _shared_http_client.is_closed:
+            options = _client_options()
+            transport = httpx.HTTPTransport(
+                http2=options["http2"], limits=options["limits"], retries=options["retries"]
+            )
+            if GOVERNOR_ENABLED:
+                transport = GovernedTransport(transport)
+            _shared_http_client = httpx.Client(timeout=options["timeout"], transport=transport)
+        return _shared_http_client
+
+
+def get_shared_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled keep-alive httpx.AsyncClient for the running event loop.
+    Creates the client if it doesn't exist yet.
+    """
+    loop = asyncio.get_running_loop()
+    client = _shared_async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        options = _client_options()
+        transport = httpx.AsyncHTTPTransport(
+            http2=options["http2"], limits=options["limits"], retries=options["retries"]
+        )
+        if GOVERNOR_ENABLED:
+            transport = AsyncGovernedTransport(transport)
+        client = httpx.AsyncClient(timeout=options["timeout"], transport=transport)
+        _shared_async_http_clients[loop] = client
+    return client
+
+
+def _client_key(params: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((key, repr(value)) for key, value in params.items()))
+
+
+def get_openai_client(**params) -> OpenAI:
+    """
+    Returns a shared OpenAI client on the pooled HTTP client.
+
+    Clients are cached per parameter set (api_key, base_url, timeout, ...), so
+    every caller with the same settings shares one client and one pool.
+
+    Args:
+        **params: Keyword arguments for openai.OpenAI, except http_client.
+
+    Returns:
+        OpenAI: The shared client.
+    """
+    params.setdefault("max_retries", LLM_MAX_RETRIES)
+    key = _client_key(params)
+    http_client = get_shared_http_client()
+    with _openai_clients_lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            client = OpenAI(http_client=http_client, **params)
+            _openai_clients[key] = client
+        return client
+
+
+def get_async_openai_client(**params) -> AsyncOpenAI:
+    """
+    Returns a shared AsyncOpenAI client for the running event loop.
+
+    Args:
+        **params: Keyword arguments for openai.AsyncOpenAI, except http_client.
+
+    Returns:
+        AsyncOpenAI: The shared client.
+    """
+    params.setdefault("max_retries", LLM_MAX_RETRIES)
+    loop = asyncio.get_running_loop()
+    clients = _async_openai_clients.setdefault(loop, {})
+    key = _client_key(params)
+    client = clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(http_client=get_shared_async_http_client(), **params)
+        clients[key] = client
+    return client
+
+
+class PooledOpenAIChat(OpenAIChat):
+    """
+    OpenAIChat that reuses the shared pooled clients.
+
+    Agno builds a new OpenAI client (and, for async runs, a new connection pool)
+    on every model call; this model instead hands out the process-wide clients,
+    so warm connections are reused across agents, team members and requests.
+    """
+
+    def get_client(self) -> OpenAI:
+        if self.http_client is not None:
+            return super().get_client()
+        return get_openai_client(**self._get_client_params())
+
+    def get_async_client(self) -> AsyncOpenAI:
+        if self.http_client is not None:
+            return super().get_async_client()
+        return get_async_openai_client(**self._get_client_params())
+
+    def get_request_kwargs(self, *args, **kwargs) -> Dict[str, Any]:
+        params = super().get_request_kwargs(*args, **kwargs)
+        # The run may be routed to a smaller model (see infra.routing); agno
+        # always passes model=self.id, the request body override takes precedence
+        model_id = routed_model_id(self.id)
+        if model_id != self.id:
+            params["extra_body"] = {**(params.get("extra_body") or {}), "model": model_id}
+        return params
+
+    # Every upstream request and tool call is recorded as a telemetry span, and
+    # charged to the run's token budget (see infra.governor.TokenBudget)
+
+    def _apply_budget(self, kwargs: Dict[str, Any]) -> bool:
+        """Returns False if the call must not reach the model because the budget is used up."""
+        decision = budget_decision(self)
+        if decision == "final" and kwargs.get("tools"):
+            kwargs["tool_choice"] = "none"
+        return decision != "stop"
+
+    def _apply_layout(self, current, args: Tuple, kwargs: Dict[str, Any]) -> Tuple:
+        """Send the messages with a byte-stable system prefix (see infra.prompt_layout)."""
+        if args:
+            args = (stable_messages(args[0]),) + args[1:]
+            messages = args[0]
+        else:
+            messages = kwargs["messages"] = stable_messages(kwargs.get("messages") or [])
+        current.set(prefix_hash=prefix_hash(messages))
+        return args
+
+    def invoke(self, *args, **kwargs):
+        if not self._apply_budget(kwargs):
+            return _budget_exhausted_completion(self.id)
+        with span("llm", routed_model_id(self.id)) as current:
+            args = self._apply_layout(current, args, kwargs)
+            response = super().invoke(*args, **kwargs)
+            if response.usage:
+                record_usage(current, response.usage.model_dump())
+                charge_token_budget(response.usage.model_dump())
+            if response.choices and response.choices[0].message.tool_calls:
+                escalate_route("tool_calls")
+            return response
+
+    async def ainvoke(self, *args, **kwargs):
+        if not self._apply_budget(kwargs):
+            return _budget_exhausted_completion(self.id)
+        with span("llm", routed_model_id(self.id)) as current:
+            args = self._apply_layout(current, args, kwargs)
+            response = await super().ainvoke(*args, **kwargs)
+            if response.usage:
+                record_usage(current, response.usage.model_dump())
+                charge_token_budget(response.usage.model_dump())
+            if response.choices and response.choices[0].message.tool_calls:
+                escalate_route("tool_calls")
+            return response
+
+    def invoke_stream(self, *args, **kwargs) -> Iterator[Any]:
+        if not self._apply_budget(kwargs):
+            yield _budget_exhausted_chunk(self.id)
+            return
+        current = start_span("llm", routed_model_id(self.id), stream=True)
+        try:
+            args = self._apply_layout(current, args, kwargs)
+            for chunk in super().invoke_stream(*args, **kwargs):
+                _record_stream_chunk(current, chunk)
+                yield chunk
+        except Exception as e:
+            current.fail(e)
+            raise
+        finally:
+            finish_span(current)
+
+    async def ainvoke_stream(self, *args, **kwargs) -> AsyncIterator[Any]:
+        if not self._apply_budget(kwargs):
+            yield _budget_exhausted_chunk(self.id)
+            return
+        current = start_span("llm", routed_model_id(self.id), stream=True)
+        try:
+            args = self._apply_layout(current, args, kwargs)
+            async for chunk in super().ainvoke_stream(*args, **kwargs):
+                _record_stream_chunk(current, chunk)
+                yield chunk
+        except Exception as e:
+            current.fail(e)
+            raise
+        finally:
+            finish_span(current)
+
+    # The tool calls of one assistant message run concurrently (see infra.tool_executor)
+
+    def run_function_calls(
+        self, function_calls: List[FunctionCall], function_call_results: List[Message],
+        tool_call_limit: Optional[int] = None,
+    ) -> Iterator[ModelResponse]:
+        executor = get_tool_executor()
+        if not TOOL_PARALLEL_CALLS or len(function_calls) < 2 or executor.in_worker():
+            yield from super().run_function_calls(function_calls, function_call_results, tool_call_limit)
+            return
+        if self._function_call_stack is None:
+            self._function_call_stack = []
+        if tool_call_limit:
+            # Agno stops after the call that reaches the limit
+            function_calls = function_calls[:max(1, tool_call_limit - len(self._function_call_stack))]
+        additional_messages: List[Message] = []
+        first = len(function_call_results)
+        batch = start_span("tools", self.id, calls=len(function_calls))
+
+        for fc in function_calls:
+            yield ModelResponse(
+                content=fc.get_call_str(),
+                tool_calls=[{
+                    "role": self.tool_message_role,
+                    "tool_call_id": fc.call_id,
+                    "tool_name": fc.function.name,
+                    "tool_args": fc.arguments,
+                }],
+                event=ModelResponseEvent.tool_call_started.value,
+            )
+        try:
+            started = executor.start(function_calls)
+            # Results in the order the model asked for them
+            for fc, call in zip(function_calls, started):
+                success, timer = executor.wait(fc, call)
+                if isinstance(success, AgentRunException):
+                    self._handle_agent_exception(success, additional_messages)
+                    success = False
+
+                output = ""
+                if isinstance(fc.result, (GeneratorType, collections.abc.Iterator)):
+                    for item in fc.result:
+                        output += str(item)
+                        if fc.function.show_result:
+                            yield ModelResponse(content=str(item))
+                else:
+                    output = str(fc.result)
+                    if fc.function.show_result:
+                        yield ModelResponse(content=output)
+
+                result = self._create_function_call_result(fc, success=success, output=output, timer=timer)
+                yield ModelResponse(
+                    content=f"{fc.get_call_str()} completed in {timer.elapsed:.4f}s.",
+                    tool_calls=[result.to_function_call_dict()],
+                    event=ModelResponseEvent.tool_call_completed.value,
+                )
+                function_call_results.append(result)
+                self._function_call_stack.append(fc)
+        except Exception as e:
+            batch.fail(e)
+            raise
+        finally:
+            _finish_tool_batch(batch, function_call_results[first:])
+
+        if tool_call_limit and len(self._function_call_stack) >= tool_call_limit:
+            self._tool_choice = "none"
+        if additional_messages:
+            function_call_results.extend(additional_messages)
+
+    async def arun_function_calls(
+        self, function_calls: List[FunctionCall], function_call_results: List[Message],
+        tool_call_limit: Optional[int] = None,
+    ) -> AsyncIterator[ModelResponse]:
+        # Agno already gathers the calls; record the batch like the sync path does
+        batch = start_span("tools", self.id, calls=len(function_calls)) if len(function_calls) > 1 else None
+        first = len(function_call_results)
+        try:
+            async for response in super().arun_function_calls(function_calls, function_call_results, tool_call_limit):
+                yield response
+        except Exception as e:
+            if batch is not None:
+                batch.fail(e)
+            raise
+        finally:
+            if batch is not None:
+                _finish_tool_batch(batch, function_call_results[first:])
+
+    async def _arun_function_call(self, function_call: FunctionCall):
+        if not TOOL_PARALLEL_CALLS:
+            return await super()._arun_function_call(function_call)
+        return await get_tool_executor().arun(function_call)
+
+    def _create_function_call_result(
+        self, fc: FunctionCall, success: bool, output: Optional[Union[List[Any], str]], timer: Timer
+    ) -> Message:
+        current = start_span("tool", fc.function.name, model=self.id)
+        streamed = isinstance(fc.result, (collections.abc.Iterator, collections.abc.AsyncIterator))
+        # Generator tools are consumed after the timer stops, so measure up to now for them
+        if streamed and timer.start_time is not None:
+            current.duration = time.perf_counter() - timer.start_time
+        else:
+            current.duration = timer.elapsed
+        current.start_time = time.time() - current.duration
+        current.set(streamed=streamed or None, output_chars=len(output) if isinstance(output, str) else None)
+        if not success:
+            current.fail(fc.error or "tool call failed")
+        finish_span(current)
+        return super()._create_function_call_result(fc, success=success, output=output, timer=timer)
+
+
+def _finish_tool_batch(batch, results: List[Message]) -> None:
+    # serial_seconds: how long the batch would have taken one call after another
+    serial = sum(result.metrics.time or 0 for result in results if result.metrics)
+    batch.set(serial_seconds=round(serial, 4))
+    finish_span(batch)
+
+
+def _record_stream_chunk(current, chunk: Any) -> None:
+    if "ttft" not in current.attributes and getattr(chunk, "choices", None):
+        current.set(ttft=current.elapsed())
+    if getattr(chunk, "usage", None):
+        record_usage(current, chunk.usage.model_dump())
+        charge_token_budget(chunk.usage.model_dump())
+    if getattr(chunk, "choices", None) and chunk.choices[0].delta.tool_calls:
+        escalate_route("tool_calls")
+
+
+def _budget_exhausted_completion(model: str) -> ChatCompletion:
+    return ChatCompletion(
+        id="budget-exhausted",
+        object="chat.completion",
+        created=int(time.time()),
+        model=model,
+        choices=[{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": BUDGET_EXHAUSTED_MESSAGE},
+        }],
+    )
+
+
+def _budget_exhausted_chunk(model: str) -> ChatCompletionChunk:
+    return ChatCompletionChunk(
+        id="budget-exhausted",
+        object="chat.completion.chunk",
+        created=int(time.time()),
+        model=model,
+        choices=[{
+            "index": 0,
+            "finish_reason": "stop",
+            "delta": {"role": "assistant", "content": BUDGET_EXHAUSTED_MESSAGE},
+        }],
+    )
+
+
+def build_openai_model(id: str, api_key: Optional[str] = None, **kwargs) -> PooledOpenAIChat:
+    """
+    Build an OpenAI chat model for an agent or team on the shared client pool.
+
+    Args:
+        id (str): Model id, e.g. "gpt-4o".
+        api_key (str, optional): OpenAI API key. Defaults to OPENAI_API_KEY.
+        **kwargs: Other OpenAIChat fields.
+
+    Returns:
+        PooledOpenAIChat: The model.
+    """
+    kwargs.setdefault("max_retries", LLM_MAX_RETRIES)
+    return PooledOpenAIChat(id=id, api_key=api_key or os.getenv("OPENAI_API_KEY"), **kwargs)
+
+
+def _reset_after_fork() -> None:
+    """
+    Drop the parent's HTTP/OpenAI clients in a forked worker. Their keep-alive
+    sockets (and TLS state) are shared with the parent, so they are forgotten
+    rather than closed, and the worker builds new pools on first use.
+    """
+    global _shared_http_client, _shared_http_client_lock, _openai_clients_lock
+    _shared_http_client = None
+    _shared_http_client_lock = threading.Lock()
+    _shared_async_http_clients.clear()
+    _openai_clients.clear()
+    _openai_clients_lock = threading.Lock()
+    _async_openai_clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+async def aclose_shared_clients() -> None:
+    """Close the shared async client of the running loop (call on shutdown)."""
+    loop = asyncio.get_running_loop()
+    _async_openai_clients.pop(loop, None)
+    client = _shared_async_http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
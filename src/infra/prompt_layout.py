@@ -0,0 +1,76 @@
+"""
+Cache-friendly message layout for the upstream model calls.
+
+OpenAI (and compatible APIs) reuse the work done for the longest prompt prefix
+they have seen recently: tools, then messages, byte for byte, from 1024 tokens
+on. Agno writes "The current time is ..." into the system message of every agent
+with add_datetime_to_instructions, so the prefix changes on every call and the
+description, instructions and tool schemas behind it are never cached.
+
+With PROMPT_LAYOUT=stable, PooledOpenAIChat sends a copy of the messages in which
+the system message holds only the static part (description, instructions, tool
+instructions) and the volatile parts follow it: the history as agno adds it,
+then a short system note with the current time right before the turn's user
+message. The stored run messages are not changed.
+"""
+import hashlib
+import os
+import re
+from typing import List, Optional, Tuple
+
+from agno.models.message import Message
+
+# "stable": static system prompt first, the current time after the history;
+# "agno": send the messages as agno builds them
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "stable").lower()
+
+# Lines agno adds to <additional_information> (agents end them with ".", teams don't)
+_VOLATILE_LINE = re.compile(r"\n- (The current time is [^\n]*)")
+_EMPTY_BLOCK = re.compile(r"<additional_information>\s*</additional_information>\s*")
+
+_SYSTEM_ROLES = ("system", "developer")
+
+
+def split_system_content(content: str) -> Tuple[str, List[str]]:
+    """Split agno system message content into its static part and the volatile lines."""
+    volatile = _VOLATILE_LINE.findall(content)
+    if not volatile:
+        return content, []
+    static = _EMPTY_BLOCK.sub("", _VOLATILE_LINE.sub("", content))
+    return static.rstrip(), volatile
+
+
+def prefix_hash(messages: List[Message]) -> Optional[str]:
+    """Short hash of the system message sent upstream, to check that it stays byte-stable."""
+    if messages and messages[0].role in _SYSTEM_ROLES and isinstance(messages[0].content, str):
+        return hashlib.sha1(messages[0].content.encode()).hexdigest()[:12]
+    return None
+
+
+def stable_messages(messages: List[Message]) -> List[Message]:
+    """
+    Returns the messages to send with the volatile lines moved out of the system message.
+
+    The first message is replaced by a copy without them and the lines are sent as
+    a system note right before the last user message that isn't from the history;
+    other messages are passed on as they are. Messages without volatile lines are
+    returned unchanged.
+    """
+    if PROMPT_LAYOUT != "stable" or not messages:
+        return messages
+    system = messages[0]
+    if system.role not in _SYSTEM_ROLES or not isinstance(system.content, str):
+        return messages
+    static, volatile = split_system_content(system.content)
+    if not volatile:
+        return messages
+
+    note = Message(role=system.role, content="\n".join(line.rstrip(".") + "." for line in volatile))
+    laid_out = [system.model_copy(update={"content": static})] + messages[1:]
+    user_at = next(
+        (i for i in range(len(laid_out) - 1, 0, -1)
+         if laid_out[i].role == "user" and not laid_out[i].from_history),
+        len(laid_out),
+    )
+    laid_out.insert(user_at, note)
+    return laid_out
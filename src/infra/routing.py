@@ -0,0 +1,404 @@
+"""
+Cost/latency-aware model routing: every turn is classified before the run, and
+simple turns ("thanks", "show that as a table") are answered by a smaller,
+faster model instead of the agent's own (gpt-4o).
+
+    enable_model_routing(basic_agent, "basic-agent")
+
+Turns are classified by a local heuristic (length, media, keywords, whether the
+agent has tools); turns it can't decide go to the agent's model, or to a small
+classifier model if MODEL_ROUTING_CLASSIFIER_MODEL is set. A light run whose
+model starts calling tools is escalated to the agent's model for the rest of the
+run. Decisions and run latencies per tier are recorded on the run span and in
+the agent_model_route* metrics.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from .cache import LRUCache, normalize_text
+from .telemetry import get_current_span, metrics
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+# Per agent policies, "agent-id=light_model[:max_chars],...": simple turns of the
+# agent (at most max_chars long) go to light_model; agents not listed are never routed
+MODEL_ROUTING_POLICIES = os.getenv(
+    "MODEL_ROUTING_POLICIES",
+    "basic-agent=gpt-4o-mini,finance-agent=gpt-4o-mini,reasoning-agent=gpt-4o-mini,image-agent=gpt-4o-mini",
+)
+# Longest turn (characters) that may count as simple, unless the policy sets its own
+MODEL_ROUTING_MAX_CHARS = int(os.getenv("MODEL_ROUTING_MAX_CHARS", "160"))
+# Small model asked about the turns the heuristic can't decide (unset = they go to the agent's model)
+MODEL_ROUTING_CLASSIFIER_MODEL = os.getenv("MODEL_ROUTING_CLASSIFIER_MODEL", "")
+MODEL_ROUTING_CLASSIFIER_TIMEOUT = float(os.getenv("MODEL_ROUTING_CLASSIFIER_TIMEOUT", "3"))
+# Switch a light run to the agent's model once the light model calls a tool
+MODEL_ROUTING_ESCALATE_ON_TOOLS = os.getenv("MODEL_ROUTING_ESCALATE_ON_TOOLS", "true").lower() == "true"
+
+ROUTE_LATENCY_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+# Weight of the latest run in the per tier latency averages
+_LATENCY_SMOOTHING = 0.1
+
+# Turns that are complex whatever their length: analysis, planning, fresh data
+_COMPLEX = re.compile(
+    r"\b(analy[sz]e|analysis|compare|comparison|strategy|plan|forecast|predict|research|step by step|why|explain"
+    r"|calculate|design|evaluate|report|latest|news|price|stock|image|picture|draw)\b"
+    r"|分析|比较|对比|策略|计划|规划|预测|研究|为什么|解释|计算|设计|评估|报告|最新|新闻|股价|价格|图片|生成|画",
+    re.IGNORECASE,
+)
+# Whole-message greetings and acknowledgements
+_SMALL_TALK = re.compile(
+    r"^(hi|hello|hey|thanks?|thank you|thx|ok(ay)?|got it|great|cool|nice|perfect|bye|good ?bye"
+    r"|你好|您好|谢谢|多谢|谢了|好的|好|收到|明白|了解|知道了|再见|嗯)[\s!.,。！，~]*$",
+    re.IGNORECASE,
+)
+# Follow-ups that only reshape the previous answer
+_FOLLOW_UP = re.compile(
+    r"\b(as a table|in a table|table format|as a list|bullet points?|shorter|more concise|summari[sz]e (that|this|it)"
+    r"|translate|in english|in chinese|reformat|rephrase)\b"
+    r"|表格|列表|简短|简洁|缩短|总结一下|翻译|用英文|用中文|换个说法|重新排版",
+    re.IGNORECASE,
+)
+
+CLASSIFIER_INSTRUCTIONS = (
+    "Classify the user's latest message to an AI assistant. Reply 'simple' if a small, fast model can answer "
+    "it from the conversation alone (greetings, thanks, reformatting, translating or shortening the previous "
+    "answer, short follow-up questions). Reply 'complex' if it needs analysis, multi-step reasoning, fresh data "
+    "or tools. Reply with one word."
+)
+
+# Route of the current run, read by PooledOpenAIChat for every model call
+_current_route: contextvars.ContextVar[Optional["Route"]] = contextvars.ContextVar("model_route", default=None)
+
+_shared_router: Optional["ModelRouter"] = None
+_shared_router_lock = threading.Lock()
+
+
+class Route:
+    """Routing decision of one run: which tier answers it, and why."""
+
+    __slots__ = ("agent_id", "strong", "light", "tier", "reason", "escalated")
+
+    def __init__(self, agent_id: str, strong: str, light: str, tier: str, reason: str):
+        self.agent_id = agent_id
+        self.strong = strong
+        self.light = light
+        self.tier = tier
+        self.reason = reason
+        self.escalated = False
+
+    def model_id(self, model_id: str) -> str:
+        """The model a call meant for model_id is sent to."""
+        if self.tier == "light" and not self.escalated and model_id == self.strong:
+            return self.light
+        return model_id
+
+    @property
+    def outcome(self) -> str:
+        return "escalated" if self.escalated else self.tier
+
+
+def parse_policies(spec: str) -> Dict[str, Tuple[str, int]]:
+    """Parse "agent-id=light_model[:max_chars],..." into {agent_id: (light_model, max_chars)}."""
+    policies = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        agent_id, _, values = item.partition("=")
+        model, _, max_chars = values.partition(":")
+        if model.strip():
+            policies[agent_id.strip()] = (model.strip(), int(max_chars or MODEL_ROUTING_MAX_CHARS))
+    return policies
+
+
+def routed_model_id(model_id: str) -> str:
+    """The model id a call of the current run must use instead of model_id."""
+    route = _current_route.get()
+    return route.model_id(model_id) if route is not None else model_id
+
+
+def escalate_route(reason: str) -> None:
+    """Send the remaining model calls of the current light run to the agent's own model."""
+    route = _current_route.get()
+    if route is None or route.tier != "light" or route.escalated or not MODEL_ROUTING_ESCALATE_ON_TOOLS:
+        return
+    route.escalated = True
+    metrics.inc("agent_model_route_escalations_total", help="Light runs moved to the agent's model mid-run.",
+                name=route.agent_id, reason=reason)
+
+
+def classify_turn(message: Any, kwargs: Dict[str, Any], has_tools: bool,
+                  max_chars: int = MODEL_ROUTING_MAX_CHARS) -> Tuple[Optional[str], str]:
+    """
+    Local heuristic for a turn.
+
+    Returns:
+        Tuple[Optional[str], str]: The tier ("light", "strong" or None when
+        undecided) and the reason.
+    """
+    if not isinstance(message, str) or kwargs.get("messages"):
+        return "strong", "structured"
+    if any(kwargs.get(key) for key in ("audio", "images", "videos", "files")):
+        return "strong", "media"
+    text = message.strip()
+    if "```" in text:
+        return "strong", "code"
+    if len(text) > max_chars:
+        return "strong", "long"
+    if _COMPLEX.search(text):
+        return "strong", "keywords"
+    if _SMALL_TALK.match(text):
+        return "light", "small_talk"
+    if _FOLLOW_UP.search(text):
+        return "light", "follow_up"
+    if not has_tools:
+        return "light", "short"
+    return None, "uncertain"
+
+
+class ModelRouter:
+    """
+    Decides the tier of each turn and keeps per agent and tier latency
+    averages, from which the latency delta of every light run is reported.
+
+    Args:
+        classifier_model (str): Small model for the turns the heuristic can't decide, "" to send them to the strong tier.
+        classifier_timeout (float): Seconds to wait for the classifier before choosing the strong tier.
+    """
+
+    def __init__(self, classifier_model: str = MODEL_ROUTING_CLASSIFIER_MODEL,
+                 classifier_timeout: float = MODEL_ROUTING_CLASSIFIER_TIMEOUT):
+        self.classifier_model = classifier_model
+        self.classifier_timeout = classifier_timeout
+        # Classifier answers by normalized turn
+        self._classified = LRUCache(max_entries=4096)
+        self._latency: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def _request(self, message: str) -> Dict[str, Any]:
+        return {
+            "model": self.classifier_model,
+            "messages": [{"role": "system", "content": CLASSIFIER_INSTRUCTIONS}, {"role": "user", "content": message}],
+            "max_tokens": 3,
+            "temperature": 0,
+            "timeout": self.classifier_timeout,
+        }
+
+    def _classified_tier(self, message: str, answer: Any) -> str:
+        tier = "light" if str(answer or "").strip().lower().startswith("simple") else "strong"
+        self._classified.set(normalize_text(message), tier)
+        return tier
+
+    def classify(self, message: str) -> Tuple[str, str]:
+        """Ask the classifier model; failures choose the strong tier."""
+        from .llm import get_openai_client
+
+        tier = self._classified.get(normalize_text(message))
+        if tier is not None:
+            return tier, "classifier"
+        try:
+            response = get_openai_client(api_key=os.getenv("OPENAI_API_KEY")).chat.completions.create(
+                **self._request(message)
+            )
+            return self._classified_tier(message, response.choices[0].message.content), "classifier"
+        except Exception as e:
+            logger.warning(f"Routing classifier failed, using the strong model: {e}")
+            return "strong", "classifier_error"
+
+    async def aclassify(self, message: str) -> Tuple[str, str]:
+        """Async version of classify()."""
+        from .llm import get_async_openai_client
+
+        tier = self._classified.get(normalize_text(message))
+        if tier is not None:
+            return tier, "classifier"
+        try:
+            response = await get_async_openai_client(api_key=os.getenv("OPENAI_API_KEY")).chat.completions.create(
+                **self._request(message)
+            )
+            return self._classified_tier(message, response.choices[0].message.content), "classifier"
+        except Exception as e:
+            logger.warning(f"Routing classifier failed, using the strong model: {e}")
+            return "strong", "classifier_error"
+
+    def decide(self, agent_id: str, strong: str, light: str, max_chars: int, has_tools: bool,
+               message: Any, kwargs: Dict[str, Any]) -> Route:
+        tier, reason = classify_turn(message, kwargs, has_tools, max_chars)
+        if tier is None:
+            tier, reason = self.classify(message) if self.classifier_model else ("strong", "tools")
+        return Route(agent_id, strong, light, tier, reason)
+
+    async def adecide(self, agent_id: str, strong: str, light: str, max_chars: int, has_tools: bool,
+                      message: Any, kwargs: Dict[str, Any]) -> Route:
+        """Async version of decide()."""
+        tier, reason = classify_turn(message, kwargs, has_tools, max_chars)
+        if tier is None:
+            tier, reason = await self.aclassify(message) if self.classifier_model else ("strong", "tools")
+        return Route(agent_id, strong, light, tier, reason)
+
+    def finish(self, route: Route, duration: float) -> Optional[float]:
+        """
+        Record a finished run.
+
+        Returns:
+            Optional[float]: For light runs, the seconds saved against the
+            average strong run of the agent (negative if slower), once known.
+        """
+        key = (route.agent_id, route.outcome)
+        with self._lock:
+            average = self._latency.get(key)
+            self._latency[key] = duration if average is None else average + _LATENCY_SMOOTHING * (duration - average)
+            strong = self._latency.get((route.agent_id, "strong"))
+        metrics.observe("agent_model_route_duration_seconds", duration,
+                        help="Run duration by routing outcome (light, strong, escalated).",
+                        buckets=ROUTE_LATENCY_BUCKETS, name=route.agent_id, tier=route.outcome)
+        if route.outcome != "light" or strong is None:
+            return None
+        return strong - duration
+
+
+def get_model_router() -> ModelRouter:
+    """
+    Returns the shared model router.
+    Creates the router if it doesn't exist yet.
+    """
+    global _shared_router
+    if _shared_router is None:
+        with _shared_router_lock:
+            if _shared_router is None:
+                _shared_router = ModelRouter()
+    return _shared_router
+
+
+_policies = parse_policies(MODEL_ROUTING_POLICIES)
+
+
+def _record_decision(route: Route) -> None:
+    metrics.inc("agent_model_routes_total", help="Routing decisions by tier and reason.",
+                name=route.agent_id, tier=route.tier, reason=route.reason)
+    current = get_current_span()
+    if current is not None:
+        current.set(route_tier=route.tier, route_reason=route.reason,
+                    route_model=route.light if route.tier == "light" else route.strong)
+
+
+def _record_finish(router: ModelRouter, route: Route, current: Any, started: float) -> None:
+    delta = router.finish(route, time.perf_counter() - started)
+    if current is not None:
+        current.set(route_escalated=route.escalated or None,
+                    route_latency_delta=round(delta, 3) if delta is not None else None)
+    # Counters can't go down: the signed delta stays on the span, saved and lost time are counted apart
+    if delta is not None:
+        metrics.inc("agent_model_route_saved_seconds_total", max(0.0, delta),
+                    help="Run time saved by light runs faster than the agent's average strong run.",
+                    name=route.agent_id)
+        metrics.inc("agent_model_route_lost_seconds_total", max(0.0, -delta),
+                    help="Run time lost by light runs slower than the agent's average strong run.",
+                    name=route.agent_id)
+
+
+def _routed_stream(stream: Iterator[Any], route: Route, on_complete) -> Iterator[Any]:
+    while True:
+        token = _current_route.set(route)
+        try:
+            chunk = next(stream)
+        except StopIteration:
+            break
+        finally:
+            _current_route.reset(token)
+        yield chunk
+    on_complete()
+
+
+async def _arouted_stream(stream: AsyncIterator[Any], route: Route, on_complete) -> AsyncIterator[Any]:
+    while True:
+        token = _current_route.set(route)
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            break
+        finally:
+            _current_route.reset(token)
+        yield chunk
+    on_complete()
+
+
+def enable_model_routing(agent: Any, agent_id: str, light_model: Optional[str] = None,
+                         router: Optional[ModelRouter] = None) -> Any:
+    """
+    Route the simple turns of an agent or team to a smaller model, per its
+    MODEL_ROUTING_POLICIES entry.
+
+    Only model calls meant for the agent's own model are rerouted, so a routed
+    team run sends the members that use the same model to the light model as
+    well. Runs started inside another routed run keep the outer route. Calling
+    this twice is a no-op.
+
+    Args:
+        agent: An agno Agent or Team whose model is a PooledOpenAIChat.
+        agent_id (str): Registry id the policy is configured for.
+        light_model (str, optional): Overrides the policy's light model.
+        router (ModelRouter, optional): Defaults to the shared router.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    policy = _policies.get(agent_id) or _policies.get("*")
+    if light_model is not None:
+        policy = (light_model, policy[1] if policy else MODEL_ROUTING_MAX_CHARS)
+    strong = getattr(getattr(agent, "model", None), "id", None)
+    if (
+        getattr(agent, "_model_routing_enabled", False)
+        or not MODEL_ROUTING_ENABLED
+        or policy is None
+        or strong is None
+        or policy[0] == strong
+    ):
+        return agent
+
+    light, max_chars = policy
+    has_tools = bool(getattr(agent, "tools", None) or getattr(agent, "members", None))
+    run, arun = agent.run, agent.arun
+
+    def get_router() -> ModelRouter:
+        return router or get_model_router()
+
+    def routed_run(message: Any = None, *args, **kwargs):
+        if _current_route.get() is not None or args:
+            return run(message, *args, **kwargs)
+        started, current = time.perf_counter(), get_current_span()
+        route = get_router().decide(agent_id, strong, light, max_chars, has_tools, message, kwargs)
+        _record_decision(route)
+        token = _current_route.set(route)
+        try:
+            result = run(message, **kwargs)
+        finally:
+            _current_route.reset(token)
+        if isinstance(result, Iterator):
+            return _routed_stream(result, route, lambda: _record_finish(get_router(), route, current, started))
+        _record_finish(get_router(), route, current, started)
+        return result
+
+    async def routed_arun(message: Any = None, *args, **kwargs):
+        if _current_route.get() is not None or args:
+            return await arun(message, *args, **kwargs)
+        started, current = time.perf_counter(), get_current_span()
+        route = await get_router().adecide(agent_id, strong, light, max_chars, has_tools, message, kwargs)
+        _record_decision(route)
+        token = _current_route.set(route)
+        try:
+            result = await arun(message, **kwargs)
+        finally:
+            _current_route.reset(token)
+        if isinstance(result, AsyncIterator):
+            return _arouted_stream(result, route, lambda: _record_finish(get_router(), route, current, started))
+        _record_finish(get_router(), route, current, started)
+        return result
+
+    agent.run = routed_run
+    agent.arun = routed_arun
+    agent._model_routing_enabled = True
+    return agent
@@ -0,0 +1,553 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, Column, Float, MetaData, String, Table, Text, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from .cache import CACHE_SCHEMA, make_cache_key, normalize_text
+from .db import get_shared_db_engine
+from .llm import get_async_openai_client, get_openai_client
+from .telemetry import get_current_span, metrics
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: comma separated agent ids (see src.agents.AGENT_REGISTRY), or "*" for all
+SEMANTIC_CACHE_AGENTS = {
+    agent_id.strip() for agent_id in os.getenv("SEMANTIC_CACHE_AGENTS", "").split(",") if agent_id.strip()
+}
+# Cosine similarity a previous prompt needs to reuse its answer
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+# Keep the vectors in Postgres so every worker shares them (otherwise in-process only)
+SEMANTIC_CACHE_PERSISTENT = os.getenv("SEMANTIC_CACHE_PERSISTENT", "true").lower() == "true"
+# Per agent cap of the in-process index
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+# How often (seconds) an index pulls entries other workers added to Postgres
+SEMANTIC_CACHE_SYNC_INTERVAL = float(os.getenv("SEMANTIC_CACHE_SYNC_INTERVAL", "5"))
+# Answers longer than this are not cached
+SEMANTIC_CACHE_MAX_ANSWER_CHARS = int(os.getenv("SEMANTIC_CACHE_MAX_ANSWER_CHARS", "100000"))
+# Size of the chunks a cached answer is streamed in
+SEMANTIC_CACHE_REPLAY_CHUNK_SIZE = int(os.getenv("SEMANTIC_CACHE_REPLAY_CHUNK_SIZE", "400"))
+
+SEMANTIC_CACHE_TABLE = "semantic_cache"
+
+_shared_semantic_cache: Optional["SemanticCache"] = None
+_shared_semantic_cache_lock = threading.Lock()
+# Cache writes happen after the answer was sent, off the request path
+_store_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="semantic-cache")
+
+
+class VectorIndex:
+    """
+    In-process nearest neighbour index over unit vectors (brute force cosine
+    similarity with numpy), with per-entry expiry and a size cap.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None
+        self._expires_at = np.empty(0)
+        self._values: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, vector: np.ndarray, value: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            row = vector.reshape(1, -1).astype(np.float32)
+            if self._vectors is None or self._vectors.shape[1] != row.shape[1]:
+                self._vectors, self._expires_at, self._values = row, np.array([expires_at]), [value]
+                return
+            self._vectors = np.vstack([self._vectors, row])
+            self._expires_at = np.append(self._expires_at, expires_at)
+            self._values.append(value)
+            # Drop expired entries first, then the oldest
+            keep = self._expires_at > time.time()
+            if len(self._values) > self.max_entries and not keep.all():
+                self._compact(keep)
+            if len(self._values) > self.max_entries:
+                self._compact(np.arange(len(self._values)) >= len(self._values) - self.max_entries)
+
+    def _compact(self, keep: np.ndarray) -> None:
+        self._vectors = self._vectors[keep]
+        self._expires_at = self._expires_at[keep]
+        self._values = [value for value, kept in zip(self._values, keep) if kept]
+
+    def search(self, vector: np.ndarray, threshold: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Returns (similarity, value) of the closest live entry at or above the threshold."""
+        with self._lock:
+            if self._vectors is None or not self._values:
+                return None
+            scores = self._vectors @ vector.astype(np.float32)
+            scores[self._expires_at <= time.time()] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < threshold:
+                return None
+            return float(scores[best]), self._values[best]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class SemanticCache:
+    """
+    Cache of final answers looked up by prompt similarity.
+
+    Prompts are embedded with the OpenAI embeddings API. Entries are partitioned
+    by namespace (agent id + a hash of its name, instructions and model), so a
+    cached answer is only reused by the same agent configuration. Every namespace
+    has an in-process VectorIndex; with a Postgres tier the entries are also
+    stored in ai.semantic_cache and the indexes pick up rows written by other
+    workers every SEMANTIC_CACHE_SYNC_INTERVAL seconds.
+    """
+
+    _metadata = MetaData(schema=CACHE_SCHEMA)
+    _table = Table(
+        SEMANTIC_CACHE_TABLE,
+        _metadata,
+        Column("id", BigInteger, primary_key=True, autoincrement=True),
+        Column("namespace", String, index=True, nullable=False),
+        Column("prompt", Text),
+        Column("embedding", postgresql.ARRAY(Float(precision=24))),
+        Column("answer", Text),
+        Column("created_at", BigInteger),
+        Column("expires_at", BigInteger, index=True),
+    )
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        embedding_model: str = SEMANTIC_CACHE_EMBEDDING_MODEL,
+        persistent: bool = SEMANTIC_CACHE_PERSISTENT,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        db_engine: Optional[Engine] = None,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.embedding_model = embedding_model
+        self.persistent = persistent
+        self.max_entries = max_entries
+        self.db_engine = db_engine or (get_shared_db_engine() if persistent else None)
+        self._indexes: Dict[str, VectorIndex] = {}
+        # namespace -> (last synced row id, last sync time)
+        self._synced: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._table_ready = False
+        # Rows this worker inserted, already in its indexes
+        self._own_ids: set = set()
+
+    # Embeddings
+
+    def _client_params(self) -> Dict[str, Any]:
+        return {"api_key": os.getenv("OPENAI_API_KEY")}
+
+    def embed(self, prompt: str) -> np.ndarray:
+        response = get_openai_client(**self._client_params()).embeddings.create(
+            model=self.embedding_model, input=normalize_text(prompt)
+        )
+        return _unit(response.data[0].embedding)
+
+    async def aembed(self, prompt: str) -> np.ndarray:
+        response = await get_async_openai_client(**self._client_params()).embeddings.create(
+            model=self.embedding_model, input=normalize_text(prompt)
+        )
+        return _unit(response.data[0].embedding)
+
+    # Lookups
+
+    def lookup(self, namespace: str, prompt: str) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Find a cached answer for a prompt similar to this one.
+
+        Args:
+            namespace (str): Agent namespace, see namespace_for().
+            prompt (str): The user prompt.
+
+        Returns:
+            tuple: (hit or None, prompt embedding or None). A hit is a dict with
+            "answer", "prompt" and "score". Pass the embedding to store() on a miss.
+        """
+        try:
+            embedding = self.embed(prompt)
+            self._sync(namespace)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed for '{namespace}': {e}")
+            return None, None
+        return self._search(namespace, embedding), embedding
+
+    async def alookup(self, namespace: str, prompt: str) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """Async version of lookup()."""
+        try:
+            embedding = await self.aembed(prompt)
+            if self._sync_due(namespace):
+                await asyncio.to_thread(self._sync, namespace)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed for '{namespace}': {e}")
+            return None, None
+        return self._search(namespace, embedding), embedding
+
+    def _search(self, namespace: str, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        found = self._index(namespace).search(embedding, self.threshold)
+        if found is None:
+            return None
+        score, value = found
+        return {"answer": value["answer"], "prompt": value["prompt"], "score": score}
+
+    def store(self, namespace: str, prompt: str, embedding: np.ndarray, answer: str) -> None:
+        """Add an answer to the cache (and to Postgres when persistent)."""
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else float("inf")
+        self._index(namespace).add(embedding, {"prompt": prompt, "answer": answer}, expires_at)
+        if not self.persistent:
+            return
+        try:
+            self._ensure_table()
+            with self.db_engine.begin() as conn:
+                row_id = conn.execute(
+                    self._table.insert().returning(self._table.c.id).values(
+                        namespace=namespace,
+                        prompt=prompt,
+                        embedding=embedding.tolist(),
+                        answer=answer,
+                        created_at=int(now),
+                        expires_at=int(expires_at) if self.ttl else None,
+                    )
+                ).scalar_one()
+            self._own_ids.add(row_id)
+        except Exception as e:
+            logger.warning(f"Semantic cache write failed for '{namespace}': {e}")
+
+    def _index(self, namespace: str) -> VectorIndex:
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = VectorIndex(max_entries=self.max_entries)
+            return index
+
+    # Postgres tier
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        with self.db_engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {CACHE_SCHEMA}"))
+        self._metadata.create_all(self.db_engine, checkfirst=True)
+        self._table_ready = True
+
+    def _sync_due(self, namespace: str) -> bool:
+        if not self.persistent:
+            return False
+        _, synced_at = self._synced.get(namespace, (0, 0.0))
+        return time.time() - synced_at >= SEMANTIC_CACHE_SYNC_INTERVAL
+
+    def _sync(self, namespace: str) -> None:
+        """Load entries written since the last sync (by any worker) into the index."""
+        if not self._sync_due(namespace):
+            return
+        last_id, _ = self._synced.get(namespace, (0, 0.0))
+        table = self._table
+        now = int(time.time())
+        self._ensure_table()
+        stmt = (
+            select(table.c.id, table.c.prompt, table.c.embedding, table.c.answer, table.c.expires_at)
+            .where(
+                table.c.namespace == namespace,
+                table.c.id > last_id,
+                (table.c.expires_at.is_(None)) | (table.c.expires_at > now),
+            )
+            .order_by(table.c.id.desc())
+            .limit(self.max_entries)
+        )
+        with self.db_engine.connect() as conn:
+            rows = conn.execute(stmt).fetchall()
+        index = self._index(namespace)
+        for row in reversed(rows):
+            if row.id in self._own_ids:
+                self._own_ids.discard(row.id)
+            else:
+                index.add(_unit(row.embedding), {"prompt": row.prompt, "answer": row.answer},
+                          row.expires_at if row.expires_at is not None else float("inf"))
+        self._synced[namespace] = (max([last_id] + [row.id for row in rows]), time.time())
+
+
+def _unit(vector: Any) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Returns the shared semantic answer cache.
+    Creates the cache if it doesn't exist yet.
+    """
+    global _shared_semantic_cache
+    with _shared_semantic_cache_lock:
+        if _shared_semantic_cache is None:
+            _shared_semantic_cache = SemanticCache()
+        return _shared_semantic_cache
+
+
+def namespace_for(agent: Any, agent_id: str) -> str:
+    """Cache namespace of an agent: its id plus a hash of the settings that shape its answers."""
+    model = getattr(agent, "model", None)
+    context = json.dumps(
+        {
+            "name": agent.name,
+            "description": getattr(agent, "description", None),
+            "instructions": getattr(agent, "instructions", None),
+            "expected_output": getattr(agent, "expected_output", None),
+            "model": getattr(model, "id", None),
+        },
+        default=str,
+        sort_keys=True,
+    )
+    return f"{agent_id}:{make_cache_key(context)[:16]}"
+
+
+def _record_skip(reason: str) -> None:
+    current = get_current_span()
+    if current is not None:
+        current.set(semantic_cache=reason)
+
+
+def _record_lookup(agent_id: str, hit: Optional[Dict[str, Any]]) -> None:
+    metrics.inc("agent_cache_requests_total", help="Cache lookups by result.",
+                kind="semantic", name=agent_id, result="hit" if hit else "miss")
+    current = get_current_span()
+    if current is not None:
+        current.set(semantic_cache="hit" if hit else "miss",
+                    semantic_cache_score=round(hit["score"], 4) if hit else None)
+
+
+def _cacheable_prompt(agent: Any, message: Any, kwargs: Dict[str, Any]) -> Optional[str]:
+    """Only plain text prompts without media or extra messages, to agents without structured output, are cached."""
+    if not isinstance(message, str) or not message.strip():
+        return None
+    if getattr(agent, "response_model", None) is not None or getattr(agent, "structured_outputs", False):
+        return None
+    for key in ("audio", "images", "videos", "files", "messages"):
+        if kwargs.get(key):
+            return None
+    return message
+
+
+def _initialize(agent: Any) -> None:
+    # What agno does at the start of a run: storage mode, ids and the default memory
+    if hasattr(agent, "members"):
+        agent.initialize_team()
+    else:
+        agent.initialize_agent()
+
+
+def _has_runs(agent: Any, session_id: Optional[str]) -> Optional[bool]:
+    """Whether the session has runs in the agent's memory, or None if its storage must be asked."""
+    if not session_id:
+        return False
+    _initialize(agent)
+    runs = getattr(getattr(agent, "memory", None), "runs", None)
+    if isinstance(runs, dict) and runs.get(session_id):
+        return True
+    return None if getattr(agent, "storage", None) is not None else False
+
+
+def session_has_runs(agent: Any, session_id: Optional[str]) -> bool:
+    """
+    Whether a session already has runs. Answers cached for a prompt don't know
+    the conversation before it, so such sessions must not be served from a cache.
+    """
+    known = _has_runs(agent, session_id)
+    if known is not None:
+        return known
+    session = agent.storage.read(session_id=session_id)
+    return bool(session is not None and (session.memory or {}).get("runs"))
+
+
+async def asession_has_runs(agent: Any, session_id: Optional[str]) -> bool:
+    """Async version of session_has_runs that reads the session without blocking the event loop."""
+    known = _has_runs(agent, session_id)
+    if known is not None:
+        return known
+    storage = agent.storage
+    if hasattr(storage, "aread"):
+        session = await storage.aread(session_id)
+    else:
+        session = await asyncio.to_thread(storage.read, session_id)
+    return bool(session is not None and (session.memory or {}).get("runs"))
+
+
+def _cached_response(agent: Any, content: str, **fields: Any) -> Any:
+    from agno.run.response import RunEvent, RunResponse
+    from agno.run.team import TeamRunResponse
+
+    if hasattr(agent, "members"):
+        return TeamRunResponse(content=content, event=RunEvent.run_response.value, team_id=agent.team_id, **fields)
+    return RunResponse(content=content, event=RunEvent.run_response.value, agent_id=agent.agent_id, **fields)
+
+
+def _cached_chunks(agent: Any, answer: str, session_id: Optional[str], stream: bool, run_id: Optional[str] = None) -> List[Any]:
+    ids = {"run_id": run_id or str(uuid.uuid4()), "session_id": session_id}
+    size = SEMANTIC_CACHE_REPLAY_CHUNK_SIZE
+    parts = [answer[i:i + size] for i in range(0, len(answer), size)] if stream else [answer]
+    return [_cached_response(agent, part, **ids) for part in parts or [""]]
+
+
+def remember_cached_turn(agent: Any, prompt: Optional[str], answer: str, session_id: Optional[str],
+                         user_id: Optional[str] = None, images: Optional[List[Any]] = None) -> Optional[str]:
+    """
+    Add a turn answered from a cache to the agent's session, as agno does after a
+    run: the run goes into the session memory and storage, and into the rolling
+    summary if history compaction is enabled, so the next turn sees it.
+
+    Returns:
+        The run id of the recorded turn, or None if it wasn't recorded.
+    """
+    from agno.memory.v2.memory import Memory
+    from agno.models.message import Message
+
+    if not session_id:
+        return None
+    try:
+        _initialize(agent)
+        if not isinstance(agent.memory, Memory):
+            return None
+        run_id = str(uuid.uuid4())
+        messages = [Message(role="user", content=prompt, images=images), Message(role="assistant", content=answer)]
+        agent.memory.add_run(session_id, _cached_response(agent, answer, run_id=run_id, session_id=session_id,
+                                                          messages=messages))
+        agent.write_to_storage(session_id=session_id, user_id=user_id)
+    except Exception as e:
+        logger.warning(f"Could not add a cached answer to session '{session_id}': {e}")
+        return None
+    record_turn = getattr(agent, "_record_history_turn", None)
+    if record_turn is not None:
+        record_turn(prompt, session_id, answer)
+    return run_id
+
+
+def _store_later(cache: SemanticCache, namespace: str, prompt: str, embedding: np.ndarray, answer: Any) -> None:
+    if isinstance(answer, str) and answer.strip() and len(answer) <= SEMANTIC_CACHE_MAX_ANSWER_CHARS:
+        _store_executor.submit(cache.store, namespace, prompt, embedding, answer)
+
+
+def _collect_stream(stream: Iterator[Any], on_complete) -> Iterator[Any]:
+    parts = []
+    for chunk in stream:
+        if getattr(chunk, "event", None) == "RunError":
+            on_complete = None
+        elif getattr(chunk, "event", None) == "RunResponse" and isinstance(getattr(chunk, "content", None), str):
+            parts.append(chunk.content)
+        yield chunk
+    if on_complete is not None:
+        on_complete("".join(parts))
+
+
+async def _acollect_stream(stream: AsyncIterator[Any], on_complete) -> AsyncIterator[Any]:
+    parts = []
+    async for chunk in stream:
+        if getattr(chunk, "event", None) == "RunError":
+            on_complete = None
+        elif getattr(chunk, "event", None) == "RunResponse" and isinstance(getattr(chunk, "content", None), str):
+            parts.append(chunk.content)
+        yield chunk
+    if on_complete is not None:
+        on_complete("".join(parts))
+
+
+def semantic_cache_enabled(agent_id: str) -> bool:
+    return "*" in SEMANTIC_CACHE_AGENTS or agent_id in SEMANTIC_CACHE_AGENTS
+
+
+def enable_semantic_cache(agent: Any, agent_id: str, cache: Optional[SemanticCache] = None) -> Any:
+    """
+    Serve an agent's or team's answers from the semantic cache when it's enabled for it.
+
+    Text prompts that start a session are looked up before the run; on a hit
+    the cached answer is returned (or streamed in chunks) without running the
+    agent and recorded in the session history, on a miss the final answer is
+    added to the cache after the run finishes. Turns of sessions that already
+    have runs depend on their history and always run. Calling this twice is a
+    no-op.
+
+    Args:
+        agent: An agno Agent or Team.
+        agent_id (str): Registry id, checked against SEMANTIC_CACHE_AGENTS.
+        cache (SemanticCache, optional): Defaults to the shared cache.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    if getattr(agent, "_semantic_cache_enabled", False) or (cache is None and not semantic_cache_enabled(agent_id)):
+        return agent
+
+    namespace = namespace_for(agent, agent_id)
+    run, arun = agent.run, agent.arun
+
+    def get_cache() -> SemanticCache:
+        return cache or get_semantic_cache()
+
+    def cached_chunks(prompt: str, answer: str, kwargs: Dict[str, Any]) -> Tuple[List[Any], bool]:
+        stream = kwargs.get("stream")
+        stream = stream if stream is not None else bool(getattr(agent, "stream", False))
+        session_id = kwargs.get("session_id") or agent.session_id
+        run_id = remember_cached_turn(agent, prompt, answer, session_id, kwargs.get("user_id"))
+        return _cached_chunks(agent, answer, session_id, stream, run_id), stream
+
+    def cached_run(message: Any = None, *args, **kwargs):
+        prompt = _cacheable_prompt(agent, message, kwargs)
+        if prompt is None or args:
+            return run(message, *args, **kwargs)
+        if session_has_runs(agent, kwargs.get("session_id") or agent.session_id):
+            _record_skip("history")
+            return run(message, **kwargs)
+        hit, embedding = get_cache().lookup(namespace, prompt)
+        _record_lookup(agent_id, hit)
+        if hit:
+            chunks, stream = cached_chunks(prompt, hit["answer"], kwargs)
+            return iter(chunks) if stream else chunks[0]
+        result = run(message, **kwargs)
+        if embedding is None:
+            return result
+        if isinstance(result, Iterator):
+            return _collect_stream(result, lambda answer: _store_later(get_cache(), namespace, prompt, embedding, answer))
+        _store_later(get_cache(), namespace, prompt, embedding, getattr(result, "content", None))
+        return result
+
+    async def cached_arun(message: Any = None, *args, **kwargs):
+        prompt = _cacheable_prompt(agent, message, kwargs)
+        if prompt is None or args:
+            return await arun(message, *args, **kwargs)
+        if await asession_has_runs(agent, kwargs.get("session_id") or agent.session_id):
+            _record_skip("history")
+            return await arun(message, **kwargs)
+        hit, embedding = await get_cache().alookup(namespace, prompt)
+        _record_lookup(agent_id, hit)
+        if hit:
+            chunks, stream = cached_chunks(prompt, hit["answer"], kwargs)
+            return _aiter(chunks) if stream else chunks[0]
+        result = await arun(message, **kwargs)
+        if embedding is None:
+            return result
+        if isinstance(result, AsyncIterator):
+            return _acollect_stream(result, lambda answer: _store_later(get_cache(), namespace, prompt, embedding, answer))
+        _store_later(get_cache(), namespace, prompt, embedding, getattr(result, "content", None))
+        return result
+
+    agent.run = cached_run
+    agent.arun = cached_arun
+    agent._semantic_cache_enabled = True
+    return agent
+
+
+async def _aiter(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
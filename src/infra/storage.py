@@ -0,0 +1,687 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from agno.storage.postgres import PostgresStorage
+from agno.storage.session import Session
+from agno.storage.session.agent import AgentSession
+from agno.storage.session.team import TeamSession
+from agno.storage.session.workflow import WorkflowSession
+from sqlalchemy import BigInteger, Column, Index, LargeBinary, MetaData, String, Table, UniqueConstraint, func, null, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.sql.expression import select
+
+from .cache import LRUCache
+from .codec import SessionCodec, get_session_codec
+from .db import get_shared_async_db_engine, get_shared_db_engine
+from .telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# "sync" keeps agno's PostgresAgentStorage, "async" uses AsyncPostgresAgentStorage,
+# "append" uses AppendOnlyPostgresAgentStorage
+AGENT_STORAGE_MODE = os.getenv("AGENT_STORAGE_MODE", "async").lower()
+# Number of recently written sessions kept in memory per storage
+STORAGE_SESSION_CACHE_SIZE = int(os.getenv("STORAGE_SESSION_CACHE_SIZE", "512"))
+# Number of most recent runs loaded back into a session in "append" mode.
+# Must be at least the agents' num_history_responses.
+HISTORY_LOAD_RUNS = int(os.getenv("HISTORY_LOAD_RUNS", "10"))
+# Worker processes serving the same sessions (set by src.serve or the platform)
+STORAGE_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# "json" keeps agno's JSONB columns, "msgpack-zstd" stores sessions (runs in "append"
+# mode) as compressed msgpack with large values in a shared blob table (see infra.codec)
+STORAGE_CODEC = os.getenv("STORAGE_CODEC", "json").lower()
+
+_SESSION_CLASSES = {"agent": AgentSession, "team": TeamSession, "workflow": WorkflowSession}
+_ENTITY_COLUMNS = {"agent": "agent_id", "team": "team_id", "workflow": "workflow_id"}
+
+
+class AsyncPostgresAgentStorage(PostgresStorage):
+    """
+    Drop-in replacement for PostgresAgentStorage that keeps session I/O off the event loop.
+
+    aread/aupsert/adelete_session run on psycopg3's async driver. Agno calls the
+    sync read/upsert from inside Agent.arun, so when an event loop is running:
+
+    - upsert() caches the session and schedules the write on the loop (write-behind),
+      coalescing queued writes for the same session and keeping them in order;
+    - read() serves sessions this worker wrote recently, or that apreload() read
+      for the current request, from memory and only falls back to a blocking query
+      for sessions it has not seen. With several workers (WEB_CONCURRENCY) only
+      sessions with a write still queued or preloaded are served from memory.
+
+    enable_session_io() preloads the session before an agent's async run and waits
+    for its queued writes (afinish) before the run's response ends, so the
+    next request for the session, on any worker, reads what this one wrote.
+
+    Outside an event loop both behave exactly like PostgresAgentStorage.
+
+    With a codec, the JSONB columns of a session are written as one compressed
+    "payload" column instead (added to existing tables on first use); rows written
+    before are still read from their JSONB columns.
+    """
+
+    # Whether the codec packs the session row (AppendOnlyPostgresAgentStorage packs the runs)
+    packs_session_row = True
+
+    def __init__(
+        self,
+        table_name: str,
+        schema: Optional[str] = "ai",
+        db_engine=None,
+        async_engine: Optional[AsyncEngine] = None,
+        codec: Optional[SessionCodec] = None,
+        **kwargs,
+    ):
+        # Set before agno builds the table, get_table_v1() needs it
+        self.codec = codec
+        super().__init__(table_name=table_name, schema=schema, db_engine=db_engine or get_shared_db_engine(), **kwargs)
+        self.async_engine: AsyncEngine = async_engine or get_shared_async_db_engine()
+        self._recent = LRUCache(max_entries=STORAGE_SESSION_CACHE_SIZE)
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._latest: Dict[str, Session] = {}
+        # session_id -> session read by apreload() for the current request
+        self._preloaded: contextvars.ContextVar[Optional[Dict[str, Optional[Session]]]] = contextvars.ContextVar(
+            f"preloaded_{table_name}", default=None
+        )
+
+    def get_table_v1(self) -> Table:
+        table = super().get_table_v1()
+        if self.codec is not None and self.packs_session_row and "payload" not in table.c:
+            table.append_column(Column("payload", LargeBinary))
+        return table
+
+    def create(self) -> None:
+        super().create()
+        if self.codec is None:
+            return
+        if self.packs_session_row:
+            with self.db_engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {self.table.fullname} ADD COLUMN IF NOT EXISTS payload BYTEA"))
+        self.codec.blobs.create()
+
+    def _unpack_row(self, row) -> Tuple[Optional[dict], Set[str]]:
+        """Column values of a row with its payload decoded, and the blobs they reference."""
+        if row is None:
+            return None, set()
+        values = dict(row._mapping)
+        payload = values.pop("payload", None)
+        if payload is None:
+            return values, set()
+        data, refs = self.codec.decode(payload)
+        values.update(data)
+        return values, refs
+
+    def _build_session(self, values: Optional[dict], blobs: Dict[str, bytes]) -> Optional[Session]:
+        if values is None:
+            return None
+        if blobs:
+            values = self.codec.resolve(values, blobs)
+        return _SESSION_CLASSES[self.mode].from_dict(values)
+
+    def _session_from_row(self, row) -> Optional[Session]:
+        values, refs = self._unpack_row(row)
+        return self._build_session(values, self.codec.blobs.get_many(refs) if refs else {})
+
+    async def _asession_from_row(self, row) -> Optional[Session]:
+        values, refs = self._unpack_row(row)
+        return self._build_session(values, await self.codec.blobs.aget_many(refs) if refs else {})
+
+    def _session_values(self, session: Session) -> dict:
+        """Column values for a session, limited to the columns of this table."""
+        columns = set(self.table.c.keys()) - {"created_at", "updated_at", "payload"}
+        return {key: value for key, value in session.to_dict().items() if key in columns}
+
+    def _row_values(self, session: Session) -> Tuple[dict, Dict[str, bytes]]:
+        """
+        Column values to write for a session, with the JSONB columns packed into
+        the payload when there is a codec, and the blobs the payload references.
+        """
+        values = self._session_values(session)
+        if self.codec is None or not self.packs_session_row:
+            return values, {}
+        packed = [column.name for column in self.table.columns if isinstance(column.type, postgresql.JSONB)]
+        data = {key: values.pop(key) for key in packed if key in values}
+        payload, blobs = self.codec.encode(data)
+        # SQL NULL rather than a JSON null
+        values.update({key: null() for key in data}, payload=payload)
+        return values, blobs
+
+    def _blobs_stmt(self, blobs: Dict[str, bytes]):
+        return self.codec.blobs.insert_stmt(blobs) if blobs else None
+
+    def _blobs_written(self, blobs: Dict[str, bytes]) -> None:
+        if blobs:
+            self.codec.blobs.stored(blobs)
+
+    async def _ensure_table(self) -> None:
+        await asyncio.to_thread(self.create)
+
+    async def aread(self, session_id: str, user_id: Optional[str] = None, create_and_retry: bool = True) -> Optional[Session]:
+        """
+        Read a Session from the database without blocking the event loop.
+        """
+        stmt = select(self.table).where(self.table.c.session_id == session_id)
+        if user_id:
+            stmt = stmt.where(self.table.c.user_id == user_id)
+        try:
+            async with self.async_engine.connect() as conn:
+                row = (await conn.execute(stmt)).fetchone()
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                # Creates the table, or adds the payload column to an existing one
+                await self._ensure_table()
+                return await self.aread(session_id, user_id=user_id, create_and_retry=False)
+            logger.warning(f"Exception reading from table {self.table.fullname}: {e}")
+            return None
+        return await self._asession_from_row(row)
+
+    def _upsert_stmt(self, values: dict):
+        stmt = postgresql.insert(self.table).values(**values)
+        return stmt.on_conflict_do_update(
+            index_elements=["session_id"],
+            set_=dict(values, updated_at=int(time.time())),
+        )
+
+    async def aupsert(self, session: Session, create_and_retry: bool = True) -> Optional[Session]:
+        """
+        Insert or update a Session without blocking the event loop.
+        """
+        values, blobs = self._row_values(session)
+        blobs_stmt = self._blobs_stmt(blobs)
+        try:
+            async with self.async_engine.begin() as conn:
+                if blobs_stmt is not None:
+                    await conn.execute(blobs_stmt)
+                await conn.execute(self._upsert_stmt(values))
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                await self._ensure_table()
+                return await self.aupsert(session, create_and_retry=False)
+            logger.warning(f"Exception upserting into table {self.table.fullname}: {e}")
+            return None
+        self._blobs_written(blobs)
+        return session
+
+    async def adelete_session(self, session_id: Optional[str] = None) -> None:
+        if session_id is None:
+            return
+        self._forget(session_id)
+        async with self.async_engine.begin() as conn:
+            await conn.execute(self.table.delete().where(self.table.c.session_id == session_id))
+
+    def _read_db(self, session_id: str, user_id: Optional[str] = None, create_and_retry: bool = True) -> Optional[Session]:
+        """Blocking read used when the session is not in memory."""
+        if self.codec is None:
+            return super().read(session_id, user_id=user_id)
+        stmt = select(self.table).where(self.table.c.session_id == session_id)
+        if user_id:
+            stmt = stmt.where(self.table.c.user_id == user_id)
+        try:
+            with self.db_engine.connect() as conn:
+                row = conn.execute(stmt).fetchone()
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                # Creates the table, or adds the payload column to an existing one
+                self.create()
+                return self._read_db(session_id, user_id=user_id, create_and_retry=False)
+            logger.warning(f"Exception reading from table {self.table.fullname}: {e}")
+            return None
+        return self._session_from_row(row)
+
+    def _upsert_db(self, session: Session, create_and_retry: bool = True) -> Optional[Session]:
+        """Blocking upsert used outside an event loop."""
+        if self.codec is None:
+            return super().upsert(session, create_and_retry=create_and_retry)
+        values, blobs = self._row_values(session)
+        blobs_stmt = self._blobs_stmt(blobs)
+        try:
+            with self.db_engine.begin() as conn:
+                if blobs_stmt is not None:
+                    conn.execute(blobs_stmt)
+                conn.execute(self._upsert_stmt(values))
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                self.create()
+                return self._upsert_db(session, create_and_retry=False)
+            logger.warning(f"Exception upserting into table {self.table.fullname}: {e}")
+            return None
+        self._blobs_written(blobs)
+        return session
+
+    def get_all_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[Session]:
+        if self.codec is None:
+            return super().get_all_sessions(user_id=user_id, entity_id=entity_id)
+        stmt = select(self.table)
+        if user_id is not None:
+            stmt = stmt.where(self.table.c.user_id == user_id)
+        if entity_id is not None:
+            stmt = stmt.where(self.table.c[_ENTITY_COLUMNS[self.mode]] == entity_id)
+        try:
+            with self.db_engine.connect() as conn:
+                rows = conn.execute(stmt.order_by(self.table.c.created_at.desc())).fetchall()
+        except Exception as e:
+            if "does not exist" in str(e):
+                self.create()
+            else:
+                logger.warning(f"Exception reading from table {self.table.fullname}: {e}")
+            return []
+        unpacked = [self._unpack_row(row) for row in rows]
+        refs = set().union(*(row_refs for _, row_refs in unpacked))
+        blobs = self.codec.blobs.get_many(refs) if refs else {}
+        return [self._build_session(values, blobs) for values, _ in unpacked]
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[Session]:
+        with span("storage", f"{self.table_name}.read") as current:
+            preloaded = self._preloaded.get()
+            if preloaded is not None and session_id in preloaded and session_id not in self._pending:
+                session = preloaded[session_id]
+                if session is None or not user_id or session.user_id == user_id:
+                    current.set(cache_hit=True, preloaded=True)
+                    return session
+            session = self._recent.get(session_id)
+            if STORAGE_WORKERS > 1 and session_id not in self._pending:
+                # Another worker may have written the session since, only a write
+                # still queued here is newer than the database
+                session = None
+            if session is not None and (not user_id or session.user_id == user_id):
+                current.set(cache_hit=True)
+                return session
+            current.set(cache_hit=False)
+            return self._read_db(session_id, user_id=user_id)
+
+    def upsert(self, session: Session, create_and_retry: bool = True) -> Optional[Session]:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._recent.delete(session.session_id)
+            with span("storage", f"{self.table_name}.upsert"):
+                return self._upsert_db(session, create_and_retry=create_and_retry)
+
+        session_id = session.session_id
+        self._recent.set(session_id, session)
+        self._latest[session_id] = session
+        preloaded = self._preloaded.get()
+        if preloaded is not None and session_id in preloaded:
+            preloaded[session_id] = session
+        task = loop.create_task(self._write_behind(session_id, self._pending.get(session_id)))
+        self._pending[session_id] = task
+        task.add_done_callback(lambda t: self._pending.pop(session_id, None) if self._pending.get(session_id) is t else None)
+        return session
+
+    async def _write_behind(self, session_id: str, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        session = self._latest.get(session_id)
+        if session is None:
+            # Already written by a newer queued write, or deleted
+            return
+        self._latest.pop(session_id, None)
+        with span("storage", f"{self.table_name}.write_behind"):
+            await self.aupsert(session)
+
+    async def apreload(self, session_id: str, user_id: Optional[str] = None) -> None:
+        """
+        Read a session without blocking the event loop, so that read() serves it
+        from memory for the rest of the current request (context).
+        """
+        if session_id in self._pending:
+            # The newest version is the one queued here, read() serves it
+            return
+        session = await self.aread(session_id, user_id=user_id)
+        preloaded = dict(self._preloaded.get() or {})
+        preloaded[session_id] = session
+        self._preloaded.set(preloaded)
+
+    async def afinish(self, session_id: str) -> None:
+        """
+        End a request's use of a session: wait until its queued writes are in the
+        database and drop the copy apreload() kept.
+        """
+        while session_id in self._pending:
+            await asyncio.gather(self._pending[session_id], return_exceptions=True)
+        preloaded = self._preloaded.get()
+        if preloaded is not None:
+            preloaded.pop(session_id, None)
+
+    async def aflush(self) -> None:
+        """Wait for all queued session writes to finish."""
+        while self._pending:
+            await asyncio.gather(*list(self._pending.values()), return_exceptions=True)
+
+    def _forget(self, session_id: str) -> None:
+        self._recent.delete(session_id)
+        self._latest.pop(session_id, None)
+        preloaded = self._preloaded.get()
+        if preloaded is not None:
+            preloaded.pop(session_id, None)
+
+    def delete_session(self, session_id: Optional[str] = None):
+        if session_id is not None:
+            self._forget(session_id)
+        return super().delete_session(session_id)
+
+
+def _run_id(run: Dict[str, Any]) -> Optional[str]:
+    """Run id of a stored run, for both RunResponse dicts and legacy AgentRun dicts."""
+    return run.get("run_id") or (run.get("response") or {}).get("run_id")
+
+
+def _title_stub(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Smallest version of a run that still lets the playground title the session."""
+    if "response" in run:
+        return {"message": run.get("message"), "response": {"run_id": _run_id(run)}}
+    stub = {key: run[key] for key in ("run_id", "session_id", "agent_id", "team_id", "created_at") if key in run}
+    stub["messages"] = [message for message in run.get("messages") or [] if message.get("role") == "user"][:1]
+    return stub
+
+
+class AppendOnlyPostgresAgentStorage(AsyncPostgresAgentStorage):
+    """
+    Session storage that appends each run as its own row instead of rewriting the whole history.
+
+    Runs are kept in "<table_name>_runs", one row per (session_id, run_id). The
+    session row only holds the session metadata, the agent memory without its runs
+    and a stub of the first run so the playground can still title the session.
+    A turn therefore writes the session row plus the new run, and a read loads the
+    session row plus the latest HISTORY_LOAD_RUNS runs through the (session_id, id)
+    index, so per-turn I/O stays flat however long the conversation gets.
+
+    Sessions written by the other storages are read as they are; their runs are
+    moved to the runs table on the next write. With a codec, the runs (not the
+    already small session row) are stored as compressed payloads.
+    """
+
+    packs_session_row = False
+
+    def __init__(self, table_name: str, history_runs: Optional[int] = None, **kwargs):
+        super().__init__(table_name, **kwargs)
+        self.history_runs = history_runs or HISTORY_LOAD_RUNS
+        self.runs_table = Table(
+            f"{table_name}_runs",
+            MetaData(schema=self.schema),
+            Column("id", BigInteger, primary_key=True, autoincrement=True),
+            Column("session_id", String, nullable=False),
+            Column("run_id", String, nullable=False),
+            Column("run", postgresql.JSONB),
+            Column("created_at", BigInteger),
+            UniqueConstraint("session_id", "run_id", name=f"uq_{table_name}_runs_session_run"),
+            Index(f"idx_{table_name}_runs_session_id", "session_id", "id"),
+        )
+        if self.codec is not None:
+            self.runs_table.append_column(Column("payload", LargeBinary))
+        # session_id -> run ids already in the runs table
+        self._stored_runs = LRUCache(max_entries=STORAGE_SESSION_CACHE_SIZE)
+
+    def create(self) -> None:
+        super().create()
+        self.runs_table.create(self.db_engine, checkfirst=True)
+        if self.codec is not None:
+            with self.db_engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {self.runs_table.fullname} ADD COLUMN IF NOT EXISTS payload BYTEA"))
+
+    def _split_runs(self, session: Session) -> Tuple[dict, List[Dict[str, Any]]]:
+        """
+        Split a session into its compact row values and the runs that still need writing.
+
+        The latest run is always rewritten because agno upserts the session more than
+        once during a run.
+        """
+        values = self._session_values(session)
+        memory = dict(values.get("memory") or {})
+        runs = [run for run in memory.pop("runs", None) or [] if _run_id(run)]
+        memory["runs"] = [_title_stub(runs[0])] if runs else []
+        values["memory"] = memory
+
+        stored = self._stored_runs.get(session.session_id) or set()
+        new_runs = [run for run in runs[:-1] if _run_id(run) not in stored] + runs[-1:]
+        return values, new_runs
+
+    def _session_upsert_stmt(self, values: dict):
+        stmt = postgresql.insert(self.table).values(**values)
+        # Keep the title stub of the first run once the session row exists
+        memory = stmt.excluded.memory.op("||")(
+            func.jsonb_build_object("runs", func.coalesce(self.table.c.memory["runs"], stmt.excluded.memory["runs"]))
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=["session_id"],
+            set_=dict(values, memory=memory, updated_at=int(time.time())),
+        )
+
+    def _runs_upsert_stmt(self, session_id: str, runs: List[Dict[str, Any]]) -> Tuple[Any, Dict[str, bytes]]:
+        """Upsert statement for the runs, and the blobs their payloads reference."""
+        now = int(time.time())
+        rows, blobs = [], {}
+        for run in runs:
+            row = {"session_id": session_id, "run_id": _run_id(run), "run": run, "created_at": now}
+            if self.codec is not None:
+                row["run"] = null()
+                row["payload"], run_blobs = self.codec.encode(run)
+                blobs.update(run_blobs)
+            rows.append(row)
+        stmt = postgresql.insert(self.runs_table).values(rows)
+        update = {"run": stmt.excluded.run}
+        if self.codec is not None:
+            update["payload"] = stmt.excluded.payload
+        return stmt.on_conflict_do_update(index_elements=["session_id", "run_id"], set_=update), blobs
+
+    def _recent_runs_stmt(self, session_id: str):
+        columns = [self.runs_table.c.run]
+        if self.codec is not None:
+            columns.append(self.runs_table.c.payload)
+        return (
+            select(*columns)
+            .where(self.runs_table.c.session_id == session_id)
+            .order_by(self.runs_table.c.id.desc())
+            .limit(self.history_runs)
+        )
+
+    def _unpack_runs(self, rows) -> Tuple[List[Any], Set[str]]:
+        """The stored runs of a _recent_runs_stmt() result, and the blobs they reference."""
+        runs, refs = [], set()
+        for row in rows:
+            payload = getattr(row, "payload", None)
+            if payload is None:
+                runs.append(row.run)
+                continue
+            run, run_refs = self.codec.decode(payload)
+            runs.append(run)
+            refs |= run_refs
+        return runs, refs
+
+    def _resolve_runs(self, runs: List[Any], blobs: Dict[str, bytes]) -> List[Dict[str, Any]]:
+        return self.codec.resolve(runs, blobs) if blobs else runs
+
+    def _merge_runs(self, session: Optional[Session], runs: List[Dict[str, Any]]) -> Optional[Session]:
+        if session is None:
+            return None
+        if runs:
+            runs.reverse()
+            session.memory = dict(session.memory or {}, runs=runs)
+            self._stored_runs.set(session.session_id, {_run_id(run) for run in runs})
+        return session
+
+    def _remember_written(self, session_id: str, runs: List[Dict[str, Any]]) -> None:
+        stored = self._stored_runs.get(session_id) or set()
+        self._stored_runs.set(session_id, stored | {_run_id(run) for run in runs})
+
+    def _read_db(self, session_id: str, user_id: Optional[str] = None, create_and_retry: bool = True) -> Optional[Session]:
+        stmt = select(self.table).where(self.table.c.session_id == session_id)
+        if user_id:
+            stmt = stmt.where(self.table.c.user_id == user_id)
+        try:
+            with self.db_engine.connect() as conn:
+                row = conn.execute(stmt).fetchone()
+                rows = conn.execute(self._recent_runs_stmt(session_id)).fetchall() if row is not None else []
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                self.create()
+                return self._read_db(session_id, user_id=user_id, create_and_retry=False)
+            logger.warning(f"Exception reading from table {self.table.fullname}: {e}")
+            return None
+        runs, refs = self._unpack_runs(rows)
+        runs = self._resolve_runs(runs, self.codec.blobs.get_many(refs) if refs else {})
+        return self._merge_runs(self._session_from_row(row), runs)
+
+    def _upsert_db(self, session: Session, create_and_retry: bool = True) -> Optional[Session]:
+        values, runs = self._split_runs(session)
+        runs_stmt, blobs = self._runs_upsert_stmt(session.session_id, runs) if runs else (None, {})
+        blobs_stmt = self._blobs_stmt(blobs)
+        try:
+            with self.db_engine.begin() as conn:
+                if blobs_stmt is not None:
+                    conn.execute(blobs_stmt)
+                conn.execute(self._session_upsert_stmt(values))
+                if runs_stmt is not None:
+                    conn.execute(runs_stmt)
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                self.create()
+                return self._upsert_db(session, create_and_retry=False)
+            logger.warning(f"Exception upserting into table {self.table.fullname}: {e}")
+            return None
+        self._blobs_written(blobs)
+        self._remember_written(session.session_id, runs)
+        return session
+
+    async def aread(self, session_id: str, user_id: Optional[str] = None, create_and_retry: bool = True) -> Optional[Session]:
+        """
+        Read a Session and its latest runs without blocking the event loop.
+        """
+        stmt = select(self.table).where(self.table.c.session_id == session_id)
+        if user_id:
+            stmt = stmt.where(self.table.c.user_id == user_id)
+        try:
+            async with self.async_engine.connect() as conn:
+                row = (await conn.execute(stmt)).fetchone()
+                rows = (await conn.execute(self._recent_runs_stmt(session_id))).fetchall() if row is not None else []
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                # Creates the table, or adds the payload column to an existing one
+                await self._ensure_table()
+                return await self.aread(session_id, user_id=user_id, create_and_retry=False)
+            logger.warning(f"Exception reading from table {self.table.fullname}: {e}")
+            return None
+        runs, refs = self._unpack_runs(rows)
+        runs = self._resolve_runs(runs, await self.codec.blobs.aget_many(refs) if refs else {})
+        return self._merge_runs(await self._asession_from_row(row), runs)
+
+    async def aupsert(self, session: Session, create_and_retry: bool = True) -> Optional[Session]:
+        """
+        Write the session row and its new runs in one transaction without blocking the event loop.
+        """
+        values, runs = self._split_runs(session)
+        runs_stmt, blobs = self._runs_upsert_stmt(session.session_id, runs) if runs else (None, {})
+        blobs_stmt = self._blobs_stmt(blobs)
+        try:
+            async with self.async_engine.begin() as conn:
+                if blobs_stmt is not None:
+                    await conn.execute(blobs_stmt)
+                await conn.execute(self._session_upsert_stmt(values))
+                if runs_stmt is not None:
+                    await conn.execute(runs_stmt)
+        except Exception as e:
+            if create_and_retry and "does not exist" in str(e):
+                await self._ensure_table()
+                return await self.aupsert(session, create_and_retry=False)
+            logger.warning(f"Exception upserting into table {self.table.fullname}: {e}")
+            return None
+        self._blobs_written(blobs)
+        self._remember_written(session.session_id, runs)
+        return session
+
+    def _forget(self, session_id: str) -> None:
+        super()._forget(session_id)
+        self._stored_runs.delete(session_id)
+
+    def delete_session(self, session_id: Optional[str] = None):
+        if session_id is not None:
+            try:
+                with self.db_engine.begin() as conn:
+                    conn.execute(self.runs_table.delete().where(self.runs_table.c.session_id == session_id))
+            except Exception as e:
+                logger.warning(f"Exception deleting runs from table {self.runs_table.fullname}: {e}")
+        return super().delete_session(session_id)
+
+    async def adelete_session(self, session_id: Optional[str] = None) -> None:
+        if session_id is not None:
+            try:
+                async with self.async_engine.begin() as conn:
+                    await conn.execute(self.runs_table.delete().where(self.runs_table.c.session_id == session_id))
+            except Exception as e:
+                logger.warning(f"Exception deleting runs from table {self.runs_table.fullname}: {e}")
+        await super().adelete_session(session_id)
+
+
+def build_agent_storage(table_name: str) -> PostgresStorage:
+    """
+    Build the session storage for an agent according to AGENT_STORAGE_MODE.
+
+    Args:
+        table_name (str): Name of the table to store the agent's sessions.
+
+    Returns:
+        PostgresStorage: A storage usable as Agent(storage=...).
+    """
+    if AGENT_STORAGE_MODE == "sync":
+        return PostgresStorage(table_name=table_name, db_engine=get_shared_db_engine())
+    codec = get_session_codec() if STORAGE_CODEC == "msgpack-zstd" else None
+    if AGENT_STORAGE_MODE == "append":
+        return AppendOnlyPostgresAgentStorage(table_name=table_name, codec=codec)
+    return AsyncPostgresAgentStorage(table_name=table_name, codec=codec)
+
+
+async def _session_stream(storage: AsyncPostgresAgentStorage, session_id: str, user_id: Optional[str],
+                          start: Callable[[], Any]) -> AsyncIterator[Any]:
+    # The run starts when the stream is iterated, so preload in the iterating context
+    await storage.apreload(session_id, user_id)
+    async for chunk in await start():
+        yield chunk
+    await storage.afinish(session_id)
+
+
+def enable_session_io(agent: Any) -> Any:
+    """
+    Keep the session I/O of an agent's async runs off the event loop and out of
+    the way of other workers.
+
+    Before the run its session is read with aread() (apreload), so agno's sync
+    read() doesn't block the loop; before the run returns, or its stream ends,
+    the session writes it queued are awaited (afinish). Only agents with an
+    AsyncPostgresAgentStorage are changed; calling this twice is a no-op.
+
+    Args:
+        agent: An agno Agent or Team.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    storage = getattr(agent, "storage", None)
+    if getattr(agent, "_session_io_enabled", False) or not isinstance(storage, AsyncPostgresAgentStorage):
+        return agent
+
+    arun = agent.arun
+
+    async def session_arun(message: Any = None, *args, **kwargs):
+        session_id = kwargs.get("session_id") or agent.session_id
+        if not session_id:
+            return await arun(message, *args, **kwargs)
+        if storage.mode is None:
+            # Set by agno at the start of the run, aread() needs it to build the session
+            storage.mode = "team" if hasattr(agent, "members") else "agent"
+        user_id = kwargs.get("user_id")
+        stream = kwargs.get("stream")
+        if stream if stream is not None else bool(getattr(agent, "stream", False)):
+            return _session_stream(storage, session_id, user_id, lambda: arun(message, *args, **kwargs))
+        await storage.apreload(session_id, user_id)
+        result = await arun(message, *args, **kwargs)
+        await storage.afinish(session_id)
+        return result
+
+    agent.arun = session_arun
+    agent._session_io_enabled = True
+    return agent
@@ -0,0 +1,457 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+# JSON-lines file every finished span is appended to; empty disables the log
+TELEMETRY_SPAN_LOG = os.getenv("TELEMETRY_SPAN_LOG", "logs/spans.jsonl")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+CACHE_RATIO_BUCKETS = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """One timed unit of work: an agent run, a model call, a tool call, a storage call..."""
+
+    kind: str  # "run", "llm", "tool", "external", "storage", ...
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    status: str = "ok"  # "ok" or "error"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def fail(self, error: Any) -> None:
+        self.status = "error"
+        self.error = str(error)
+
+    def elapsed(self) -> float:
+        """Seconds since the span started."""
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_start")
+        return data
+
+
+class MetricsRegistry:
+    """
+    Minimal thread-safe counter/histogram store rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, List[float]]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+        self._help: Dict[str, str] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> LabelSet:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, metric: str, /, value: float = 1.0, help: str = "", **labels: Any) -> None:
+        with self._lock:
+            self._help.setdefault(metric, help)
+            series = self._counters.setdefault(metric, {})
+            key = self._labels(labels)
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, metric: str, value: float, /, help: str = "",
+                buckets: Sequence[float] = LATENCY_BUCKETS, **labels: Any) -> None:
+        with self._lock:
+            self._help.setdefault(metric, help)
+            bounds = self._buckets.setdefault(metric, buckets)
+            series = self._histograms.setdefault(metric, {})
+            key = self._labels(labels)
+            # Per-bucket counts followed by sum and count
+            values = series.setdefault(key, [0.0] * (len(bounds) + 2))
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name) or name}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                bounds = self._buckets[name]
+                lines.append(f"# HELP {name} {self._help.get(name) or name}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, values in series.items():
+                    lines.extend(_histogram_lines(name, labels, bounds, values[:-2], values[-2], values[-1]))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _histogram_lines(name: str, labels: LabelSet, bounds: Sequence[float], counts: Sequence[float],
+                     total: float, count: float) -> List[str]:
+    lines = []
+    cumulative = 0.0
+    for bound, bucket_count in zip(bounds, counts):
+        cumulative += bucket_count
+        lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(float(bound))),))} {_format_value(cumulative)}")
+    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {_format_value(count)}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(count)}")
+    return lines
+
+
+class SpanLogWriter:
+    """
+    Appends finished spans to a JSON-lines file from a background thread,
+    so recording a span never blocks the event loop on disk I/O.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+
+    def write(self, span: Dict[str, Any]) -> None:
+        if self._disabled:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="span-log-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put(span)
+
+    def _run(self) -> None:
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            f = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Span log disabled, cannot open {self.path}: {e}")
+            self._disabled = True
+            return
+        with f:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    break
+                f.write(json.dumps(span, default=str) + "\n")
+                # Drain whatever queued up meanwhile before flushing
+                while True:
+                    try:
+                        span = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if span is None:
+                        f.flush()
+                        return
+                    f.write(json.dumps(span, default=str) + "\n")
+                f.flush()
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+
+metrics = MetricsRegistry()
+_span_log: Optional[SpanLogWriter] = SpanLogWriter(TELEMETRY_SPAN_LOG) if TELEMETRY_SPAN_LOG else None
+
+
+def _reset_after_fork() -> None:
+    # The parent's writer thread doesn't exist in a forked worker, and its queued
+    # spans and metrics were already recorded by the parent
+    global _span_log
+    metrics._lock = threading.Lock()
+    metrics.clear()
+    _span_log = SpanLogWriter(TELEMETRY_SPAN_LOG) if TELEMETRY_SPAN_LOG else None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(kind: str, name: str, **attributes: Any) -> Span:
+    """Start a span as a child of the current span (or a new trace)."""
+    parent = _current_span.get()
+    span = Span(
+        kind=kind,
+        name=name,
+        trace_id=parent.trace_id if parent is not None else uuid.uuid4().hex,
+        parent_id=parent.span_id if parent is not None else None,
+    )
+    span.set(**attributes)
+    return span
+
+
+def finish_span(span: Span) -> None:
+    """Record a finished span in the metrics and the span log."""
+    if span.duration is None:
+        span.duration = span.elapsed()
+    if not TELEMETRY_ENABLED:
+        return
+    try:
+        _record_span(span)
+    except Exception as e:
+        # Telemetry must never break a run
+        logger.warning(f"Could not record span {span.kind}/{span.name}: {e}")
+
+
+def _record_span(span: Span) -> None:
+    labels = {"kind": span.kind, "name": span.name}
+    metrics.observe("agent_span_duration_seconds", span.duration,
+                    help="Duration of agent runs, model calls, tool calls and external requests.",
+                    status=span.status, **labels)
+    if span.status != "ok":
+        metrics.inc("agent_span_errors_total", help="Spans that ended with an error.", **labels)
+
+    attributes = span.attributes
+    for token_type in ("input", "output", "cached"):
+        tokens = attributes.get(f"{token_type}_tokens")
+        if tokens:
+            metrics.inc("agent_tokens_total", tokens, help="Tokens reported by the upstream model APIs.",
+                        type=token_type, **labels)
+    if "cache_ratio" in attributes:
+        metrics.observe("agent_prompt_cache_ratio", attributes["cache_ratio"],
+                        help="Share of the prompt tokens served from the upstream prompt cache.",
+                        buckets=CACHE_RATIO_BUCKETS, **labels)
+    if "ttft" in attributes:
+        metrics.observe("agent_time_to_first_token_seconds", attributes["ttft"],
+                        help="Time until the first streamed chunk arrived.", **labels)
+    if "cache_hit" in attributes:
+        metrics.inc("agent_cache_requests_total", help="Cache lookups by result.",
+                    result="hit" if attributes["cache_hit"] else "miss", **labels)
+
+    if _span_log is not None:
+        _span_log.write(span.to_dict())
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a block of code as a span. Exceptions mark the span as failed and are re-raised.
+
+    Works in sync and async code alike; spans opened inside the block become children.
+    """
+    current = start_span(kind, name, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        finish_span(current)
+
+
+def record_usage(target: Span, usage: Optional[Dict[str, Any]]) -> None:
+    """Copy token counts from an OpenAI-style usage dict onto a span."""
+    if not usage:
+        return
+    details = usage.get("prompt_tokens_details") or {}
+    input_tokens = usage.get("prompt_tokens", usage.get("input_tokens"))
+    cached_tokens = details.get("cached_tokens") if isinstance(details, dict) else None
+    target.set(
+        input_tokens=input_tokens,
+        output_tokens=usage.get("completion_tokens", usage.get("output_tokens")),
+        cached_tokens=cached_tokens,
+    )
+    if input_tokens and cached_tokens is not None:
+        # Share of the prompt the upstream served from its prompt cache
+        target.set(cache_ratio=round(cached_tokens / input_tokens, 4))
+
+
+def _record_run(current: Span, response: Any) -> None:
+    current.set(
+        run_id=getattr(response, "run_id", None),
+        session_id=getattr(response, "session_id", None),
+        model=getattr(response, "model", None),
+    )
+
+
+def _traced_stream(stream: Iterator[Any], current: Span) -> Iterator[Any]:
+    try:
+        while True:
+            token = _current_span.set(current)
+            try:
+                chunk = next(stream)
+            except StopIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            if "ttft" not in current.attributes and getattr(chunk, "content", None):
+                current.set(ttft=current.elapsed())
+            _record_run(current, chunk)
+            yield chunk
+    except Exception as e:
+        current.fail(e)
+        raise
+    finally:
+        finish_span(current)
+
+
+async def _atraced_stream(stream: AsyncIterator[Any], current: Span) -> AsyncIterator[Any]:
+    try:
+        while True:
+            token = _current_span.set(current)
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            if "ttft" not in current.attributes and getattr(chunk, "content", None):
+                current.set(ttft=current.elapsed())
+            _record_run(current, chunk)
+            yield chunk
+    except Exception as e:
+        current.fail(e)
+        raise
+    finally:
+        finish_span(current)
+
+
+def instrument_agent(agent: Any) -> Any:
+    """
+    Record every run of an agent or team as a "run" span.
+
+    Model calls and tool calls made during the run become its children. Team
+    members are instrumented as well. Calling this twice is a no-op.
+
+    Args:
+        agent: An agno Agent or Team.
+
+    Returns:
+        The same agent, for chaining.
+    """
+    if getattr(agent, "_telemetry_instrumented", False):
+        return agent
+    for member in getattr(agent, "members", None) or []:
+        instrument_agent(member)
+
+    name = agent.name or type(agent).__name__
+    run, arun = agent.run, agent.arun
+
+    def traced_run(*args, **kwargs):
+        current = start_span("run", name)
+        token = _current_span.set(current)
+        try:
+            result = run(*args, **kwargs)
+        except Exception as e:
+            current.fail(e)
+            _current_span.reset(token)
+            finish_span(current)
+            raise
+        _current_span.reset(token)
+        if isinstance(result, Iterator):
+            return _traced_stream(result, current)
+        _record_run(current, result)
+        finish_span(current)
+        return result
+
+    async def traced_arun(*args, **kwargs):
+        current = start_span("run", name)
+        token = _current_span.set(current)
+        try:
+            result = await arun(*args, **kwargs)
+        except Exception as e:
+            current.fail(e)
+            _current_span.reset(token)
+            finish_span(current)
+            raise
+        _current_span.reset(token)
+        if isinstance(result, AsyncIterator):
+            return _atraced_stream(result, current)
+        _record_run(current, result)
+        finish_span(current)
+        return result
+
+    agent.run = traced_run
+    agent.arun = traced_arun
+    agent._telemetry_instrumented = True
+    return agent
+
+
+def _pool_metrics_lines() -> List[str]:
+    # Imported here so importing telemetry doesn't load SQLAlchemy at startup
+    from .db import POOL_LATENCY_BUCKETS, get_pool_metrics
+
+    pool = get_pool_metrics()
+    lines = []
+    for key in ("pool_size", "max_overflow", "in_use", "idle", "overflow"):
+        lines.append(f"# TYPE db_pool_{key} gauge")
+        lines.append(f"db_pool_{key} {pool[key]}")
+    for key in ("checkouts_total", "waits_total", "timeouts_total"):
+        lines.append(f"# TYPE db_pool_{key} counter")
+        lines.append(f"db_pool_{key} {pool[key]}")
+    lines.append("# TYPE db_pool_checkout_seconds histogram")
+    buckets = pool["checkout_latency_buckets"]
+    lines.extend(_histogram_lines(
+        "db_pool_checkout_seconds", (), POOL_LATENCY_BUCKETS,
+        [buckets[bound] for bound in POOL_LATENCY_BUCKETS],
+        pool["checkout_latency_seconds_sum"], pool["checkouts_total"],
+    ))
+    return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return metrics.render() + "\n".join(_pool_metrics_lines()) + "\n"
+
+
+def close_span_log() -> None:
+    """Flush and close the span log (call on shutdown)."""
+    if _span_log is not None:
+        _span_log.close()
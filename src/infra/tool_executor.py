@@ -0,0 +1,209 @@
+"""
+Concurrent execution of the tool calls of one model turn.
+
+Agno runs the tool calls of an assistant message one after another in sync runs,
+and on the default executor without timeouts in async runs. PooledOpenAIChat
+hands them to the shared ToolExecutor instead: blocking tools (yfinance, DDGS,
+DALL·E) run on a bounded thread pool, async tools as asyncio tasks, every call
+has a timeout (TOOL_TIMEOUT, per tool TOOL_TIMEOUTS), and the results are still
+returned in the order the model asked for them, so a turn takes as long as its
+slowest tool instead of the sum of all of them.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from inspect import isasyncgenfunction, iscoroutine, iscoroutinefunction
+from typing import Dict, List, Optional, Tuple, Union
+
+from agno.exceptions import AgentRunException
+from agno.tools.function import FunctionCall
+from agno.utils.timer import Timer
+
+from .telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+# Run the tool calls of one model turn concurrently (otherwise one after another, as agno does)
+TOOL_PARALLEL_CALLS = os.getenv("TOOL_PARALLEL_CALLS", "true").lower() == "true"
+# Threads running blocking tools, shared by every agent of the worker
+TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "16"))
+# Seconds a tool call may take, and per tool overrides "tool_name=seconds,..."
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "120"))
+TOOL_TIMEOUTS = os.getenv("TOOL_TIMEOUTS", "create_image=180")
+
+TOOL_THREAD_PREFIX = "tool-call"
+
+_shared_tool_executor: Optional["ToolExecutor"] = None
+_shared_tool_executor_lock = threading.Lock()
+
+Outcome = Union[bool, AgentRunException]
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """Parse "tool_name=seconds,..." into {tool_name: seconds}."""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+def _is_async(fc: FunctionCall) -> bool:
+    entrypoint = fc.function.entrypoint
+    if iscoroutinefunction(entrypoint) or isasyncgenfunction(entrypoint) or iscoroutine(entrypoint):
+        return True
+    # Agno runs the call asynchronously as soon as one of its hooks is async
+    return any(iscoroutinefunction(hook) for hook in fc.function.tool_hooks or [])
+
+
+class PendingCall:
+    """A submitted tool call: its future, timer and whether its result is still wanted."""
+
+    __slots__ = ("future", "timer", "submitted", "abandoned", "lock")
+
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self.timer = Timer()
+        self.submitted = time.perf_counter()
+        self.abandoned = False
+        self.lock = threading.Lock()
+
+
+class ToolExecutor:
+    """
+    Runs tool calls on a bounded thread pool (blocking tools) or as asyncio
+    tasks (async tools), with per tool timeouts.
+
+    A call that times out fails with an error message the model sees as the tool
+    result. A call still queued when its time is up never runs; a blocking tool
+    that is already running keeps its thread until it returns, as threads can't
+    be interrupted, but its result is discarded. Tool calls of runs started from a pool thread (a tool that
+    runs another agent) don't use the pool, so nested runs can't exhaust it and
+    deadlock.
+
+    Args:
+        workers (int): Size of the thread pool.
+        timeout (float): Default seconds per call, 0 for none.
+        timeouts (Dict[str, float], optional): Seconds per tool name.
+    """
+
+    def __init__(self, workers: int = TOOL_EXECUTOR_WORKERS, timeout: float = TOOL_TIMEOUT,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.timeout = timeout
+        self.timeouts = timeouts if timeouts is not None else parse_timeouts(TOOL_TIMEOUTS)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=TOOL_THREAD_PREFIX)
+
+    def timeout_for(self, name: str) -> Optional[float]:
+        return self.timeouts.get(name, self.timeout) or None
+
+    @staticmethod
+    def in_worker() -> bool:
+        return threading.current_thread().name.startswith(TOOL_THREAD_PREFIX)
+
+    @staticmethod
+    def _execute(fc: FunctionCall, call: PendingCall) -> Outcome:
+        if call.abandoned:
+            # Timed out while it was still queued
+            return False
+        # Run a copy, so a call that times out while running can't change the
+        # result the model was already given
+        running = fc.model_copy()
+        call.timer.start()
+        try:
+            success: Outcome = running.execute()
+        except AgentRunException as e:
+            success = e
+        finally:
+            call.timer.stop()
+        with call.lock:
+            if not call.abandoned:
+                fc.result, fc.error = running.result, running.error
+        return success
+
+    def _timed_out(self, fc: FunctionCall, timeout: float, call: PendingCall) -> Tuple[Outcome, Timer]:
+        with call.lock:
+            call.abandoned = True
+        if call.future is not None:
+            # Calls still queued never run
+            call.future.cancel()
+        # Time since the call was submitted, it may not have started at all
+        timer = Timer()
+        timer.start_time = call.submitted
+        timer.elapsed_time = time.perf_counter() - call.submitted
+        fc.result = None
+        fc.error = f"Tool {fc.function.name} timed out after {timeout:g}s"
+        logger.warning(fc.error)
+        metrics.inc("agent_tool_timeouts_total", help="Tool calls that exceeded their timeout.", name=fc.function.name)
+        return False, timer
+
+    def start(self, function_calls: List[FunctionCall]) -> List[PendingCall]:
+        """Submit blocking tool calls to the pool, each with a copy of the caller's context."""
+        started = []
+        for fc in function_calls:
+            call = PendingCall()
+            call.future = self._pool.submit(contextvars.copy_context().run, self._execute, fc, call)
+            started.append(call)
+        return started
+
+    def wait(self, fc: FunctionCall, call: PendingCall) -> Tuple[Outcome, Timer]:
+        """Result of a call returned by start(), or a timeout failure once its time is up."""
+        timeout = self.timeout_for(fc.function.name)
+        remaining = max(0.0, call.submitted + timeout - time.perf_counter()) if timeout else None
+        try:
+            return call.future.result(timeout=remaining), call.timer
+        except FutureTimeoutError:
+            return self._timed_out(fc, timeout, call)
+
+    async def arun(self, fc: FunctionCall) -> Tuple[Outcome, Timer, FunctionCall]:
+        """Run one tool call from an async run; returns what agno's Model._arun_function_call does."""
+        timeout = self.timeout_for(fc.function.name)
+        call = PendingCall()
+        try:
+            if _is_async(fc):
+                call.timer.start()
+                try:
+                    # Cancelled on timeout
+                    success: Outcome = await asyncio.wait_for(fc.aexecute(), timeout)
+                finally:
+                    call.timer.stop()
+            elif self.in_worker():
+                success = await asyncio.wait_for(asyncio.to_thread(self._execute, fc, call), timeout)
+            else:
+                loop = asyncio.get_running_loop()
+                # Cancelling the asyncio future on timeout cancels the pool's future if it hasn't started
+                running = loop.run_in_executor(self._pool, contextvars.copy_context().run, self._execute, fc, call)
+                success = await asyncio.wait_for(running, timeout)
+        except AgentRunException as e:
+            success = e
+        except asyncio.TimeoutError:
+            success, timer = self._timed_out(fc, timeout, call)
+            return success, timer, fc
+        return success, call.timer, fc
+
+
+def get_tool_executor() -> ToolExecutor:
+    """
+    Returns the process-wide tool executor.
+    Creates the executor if it doesn't exist yet.
+    """
+    global _shared_tool_executor
+    if _shared_tool_executor is None:
+        with _shared_tool_executor_lock:
+            if _shared_tool_executor is None:
+                _shared_tool_executor = ToolExecutor()
+    return _shared_tool_executor
+
+
+def _reset_after_fork() -> None:
+    # The pool's threads don't survive a fork, the worker starts its own
+    global _shared_tool_executor, _shared_tool_executor_lock
+    _shared_tool_executor = None
+    _shared_tool_executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,18 +1,153 @@
-from agno.playground import Playground, serve_playground_app
+import asyncio
+import logging
 import os
+import threading
+from typing import List, Optional, Set
 from dotenv import load_dotenv
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .agents import all_agents
+from .agents import AGENT_REGISTRY, INTERNAL_AGENTS, get_agent, is_built, list_agents
+from .infra.admission import AdmissionMiddleware
+from .infra.jobs import JOBS_ENABLED, get_job_manager
+from .infra.telemetry import close_span_log, render_metrics
 
 # 加载.env文件中的环境变量
 load_dotenv()
 
 # 从环境变量读取是否允许localhost CORS的标志
 ALLOW_LOCALHOST_CORS = os.getenv("ALLOW_LOCALHOST_CORS", "false").lower() == "true"
+# Build every agent in the background right after startup (otherwise on first request)
+PLAYGROUND_WARMUP = os.getenv("PLAYGROUND_WARMUP", "true").lower() == "true"
 
-app = Playground(
-    agents=all_agents
-).get_app()
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="agno-playground")
+
+# The playground routes look agents up in these lists, which are filled as agents get built
+playground_agents: list = []
+playground_teams: list = []
+_playground_lock = threading.Lock()
+_playground_router_added = False
+_playground_initialized: Set[str] = set()
+
+
+def load_playground(agent_ids: List[str]) -> None:
+    """
+    Build the given agents/teams and serve them on the playground routes.
+    Blocking (imports the agent modules), so call it from a worker thread.
+    """
+    global _playground_router_added
+    from agno.agent import Agent
+    from agno.playground.async_router import get_async_playground_router
+
+    with _playground_lock:
+        if not _playground_router_added:
+            app.include_router(get_async_playground_router(playground_agents, None, playground_teams), prefix="/v1")
+            _playground_router_added = True
+        for agent_id in agent_ids:
+            if agent_id in _playground_initialized:
+                continue
+            agent = get_agent(agent_id)
+            if isinstance(agent, Agent):
+                agent.initialize_agent()
+            else:
+                agent.initialize_team()
+                for member in agent.members:
+                    if isinstance(member, Agent):
+                        member.initialize_agent()
+                    else:
+                        member.initialize_team()
+            _playground_initialized.add(agent_id)
+        built = [get_agent(agent_id) for agent_id in list_agents() if agent_id in _playground_initialized]
+        playground_agents[:] = [agent for agent in built if isinstance(agent, Agent)]
+        playground_teams[:] = [agent for agent in built if not isinstance(agent, Agent)]
+
+
+def _playground_agent_ids(path: str) -> Optional[List[str]]:
+    """The agents a playground request needs: one for /agents/{id}/..., all otherwise."""
+    parts = path.split("/")
+    # ["", "v1", "playground", "agents" | "teams", agent_id, ...]
+    if len(parts) > 4 and parts[3] in ("agents", "teams") and parts[4] in AGENT_REGISTRY:
+        return [parts[4]]
+    return list_agents()
+
+
+@app.middleware("http")
+async def playground_middleware(request: Request, call_next):
+    """
+    Build the agents a playground request needs before routing it, and turn
+    unhandled errors into JSON responses like the agno playground does.
+    """
+    try:
+        if request.url.path.startswith("/v1/playground"):
+            agent_ids = _playground_agent_ids(request.url.path)
+            if not _playground_router_added or not _playground_initialized.issuperset(agent_ids):
+                await asyncio.to_thread(load_playground, agent_ids)
+        return await call_next(request)
+    except Exception as e:
+        return JSONResponse(
+            status_code=e.status_code if hasattr(e, "status_code") else 500,
+            content={"detail": str(e)},
+        )
+
+
+@app.on_event("startup")
+async def warm_up_playground():
+    if PLAYGROUND_WARMUP:
+        future = asyncio.get_running_loop().run_in_executor(None, load_playground, list_agents())
+        future.add_done_callback(_log_warm_up_failure)
+
+
+def _log_warm_up_failure(future: asyncio.Future) -> None:
+    # Requests still build what they need if the warm-up fails, so only log it
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Playground warm-up failed: {future.exception()}")
+
+
+def _new_product_runner():
+    get_agent("new-product-development-team")
+    from .agents.new_product_agent import new_product_parallel_runner
+
+    return new_product_parallel_runner
+
+
+@app.on_event("startup")
+async def start_jobs():
+    # Every worker runs background jobs, and resumes the ones a stopped worker left behind
+    if JOBS_ENABLED:
+        manager = get_job_manager()
+        manager.register("new-product", _new_product_runner)
+        manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    if JOBS_ENABLED:
+        await get_job_manager().stop()
+
+
+@app.on_event("shutdown")
+async def flush_sessions():
+    """
+    Finish the queued session writes (write-behind), close the pooled clients and
+    flush the span log before exiting.
+    """
+    from .infra.llm import aclose_shared_clients
+
+    storages = {}
+    for agent_id in [*AGENT_REGISTRY, *INTERNAL_AGENTS]:
+        if not is_built(agent_id):
+            continue
+        agent = get_agent(agent_id)
+        for member in [agent, *getattr(agent, "members", [])]:
+            storage = getattr(member, "storage", None)
+            if hasattr(storage, "aflush"):
+                storages[id(storage)] = storage
+    await asyncio.gather(*(storage.aflush() for storage in storages.values()), return_exceptions=True)
+    await aclose_shared_clients()
+    # Last, so the spans of the writes above are in the log too; closing joins the writer thread
+    await asyncio.to_thread(close_span_log)
 
 # 构建允许的源列表
 allowed_origins = [
@@ -24,6 +159,9 @@ allowed_origins = [
 if ALLOW_LOCALHOST_CORS:
     allowed_origins.append("http://localhost:5173")
 
+# Per-agent concurrency caps and fair queues for runs (added before CORS so rejections get CORS headers)
+app.add_middleware(AdmissionMiddleware, agent_ids=list_agents())
+
 # 添加CORS中间件配置
 app.add_middleware(
     CORSMiddleware,
@@ -41,5 +179,63 @@ async def health_check():
     api_key = os.getenv("OPENAI_API_KEY", "")
     return {"openai_api_key_prefix": api_key[:10]}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics: run/model/tool/storage span latencies, token counts, cache hits,
+    errors and database pool usage.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.post("/v1/new-product/parallel-runs")
+async def new_product_parallel_run(message: str = Form(...)):
+    """
+    Run the New Product Development Team in parallel mode and return the merged report.
+    """
+    await asyncio.to_thread(get_agent, "new-product-development-team")
+    from .agents.new_product_agent import analyze_new_product_parallel
+
+    return await analyze_new_product_parallel(message)
+
+@app.post("/v1/jobs/new-product", status_code=202)
+async def submit_new_product_job(message: str = Form(...), user_id: Optional[str] = Form(None)):
+    """
+    Queue a New Product Development Team report (parallel mode) as a background job.
+    Poll GET /v1/jobs/{job_id} or follow GET /v1/jobs/{job_id}/events for progress.
+    """
+    if not JOBS_ENABLED:
+        return JSONResponse(status_code=503, content={"detail": "Background jobs are disabled"})
+    return await get_job_manager().submit("new-product", message, user_id=user_id)
+
+@app.get("/v1/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status of a background job, its progress (research context and finished members) and result.
+    """
+    job = await get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"detail": "Job not found"})
+    return job
+
+@app.get("/v1/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request, after: int = 0):
+    """
+    Server-sent events of a background job, from any worker. Reconnecting clients
+    resume after their Last-Event-ID (or ?after=); the stream ends with a completed
+    or failed event.
+    """
+    manager = get_job_manager()
+    if await manager.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"detail": "Job not found"})
+    last_event_id = request.headers.get("last-event-id")
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else after
+    return StreamingResponse(
+        manager.stream_events(job_id, after_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
+    from agno.playground import serve_playground_app
+
     serve_playground_app("src.main:app", reload=True)
\ No newline at end of file
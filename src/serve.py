@@ -0,0 +1,190 @@
+"""
+Production server: a pre-fork supervisor running several uvicorn workers on one socket.
+
+    python -m src.serve
+
+The app is imported once in the supervisor (agents are still built lazily in each
+worker) and the workers are forked from it. Every worker opens its own database
+pools and HTTP clients after the fork (see the os.register_at_fork hooks in
+src.infra), runs the lifespan startup (playground warm-up, background jobs) and
+drains its in-flight requests and streams on SIGTERM. Workers that die are
+replaced. Shared state lives in Postgres (sessions, caches, jobs); the upstream
+rate limits are split evenly between the workers.
+"""
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+SERVER_HOST = os.getenv("HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PORT", "8000"))
+# Number of workers; unset or "auto" derives it from the CPUs (and memory) available
+WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY", "auto")
+SERVER_MAX_WORKERS = int(os.getenv("SERVER_MAX_WORKERS", "8"))
+# Memory (MB) budgeted per worker when deriving the worker count from a memory limit
+SERVER_WORKER_MEMORY_MB = int(os.getenv("SERVER_WORKER_MEMORY_MB", "512"))
+# Seconds a stopping worker waits for in-flight requests and streams before cancelling them
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# Import the app before forking, so workers share its memory and start faster
+SERVER_PRELOAD = os.getenv("SERVER_PRELOAD", "true").lower() == "true"
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_LOG_LEVEL = os.getenv("SERVER_LOG_LEVEL", "info")
+
+# uvicorn configures this logger, so supervisor messages look like the workers'
+logger = logging.getLogger("uvicorn.error")
+
+
+def _read_cgroup(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_count() -> int:
+    """CPUs this process may use: the cgroup quota if there is one, else its CPU affinity."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    quota = _read_cgroup("/sys/fs/cgroup/cpu.max")
+    if quota and not quota.startswith("max"):
+        limit, period = quota.split()
+        cpus = min(cpus, max(1, int(int(limit) / int(period))))
+    return max(1, cpus)
+
+
+def memory_limit_mb() -> Optional[int]:
+    """The cgroup memory limit in MB, or None without one."""
+    limit = _read_cgroup("/sys/fs/cgroup/memory.max")
+    if not limit or limit == "max":
+        return None
+    return int(limit) // (1024 * 1024)
+
+
+def worker_count() -> int:
+    """
+    Number of workers to run: WEB_CONCURRENCY if set to a number, otherwise one
+    per CPU, capped by the memory limit / SERVER_WORKER_MEMORY_MB and SERVER_MAX_WORKERS.
+    """
+    if WEB_CONCURRENCY.isdigit():
+        return max(1, int(WEB_CONCURRENCY))
+    workers = cpu_count()
+    memory = memory_limit_mb()
+    if memory is not None:
+        workers = min(workers, max(1, memory // SERVER_WORKER_MEMORY_MB))
+    return max(1, min(workers, SERVER_MAX_WORKERS))
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """
+    Forks the workers, replaces the ones that exit, and on SIGTERM/SIGINT stops
+    them gracefully (SIGTERM, then SIGKILL after the graceful timeout).
+    """
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+            code = 0
+            try:
+                # uvicorn handles SIGTERM/SIGINT itself and drains within timeout_graceful_shutdown
+                uvicorn.Server(self.config).run(sockets=[self.sock])
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Stopping {len(self.children)} workers, draining for up to {SERVER_GRACEFUL_TIMEOUT}s")
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGTERM)
+        signal.alarm(SERVER_GRACEFUL_TIMEOUT + 5)
+
+    def kill(self, signum, frame) -> None:
+        for pid in list(self.children):
+            logger.warning(f"Worker {pid} didn't stop in time, killing it")
+            self._signal(pid, signal.SIGKILL)
+
+    def _signal(self, pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGALRM, self.kill)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, replacing it")
+            if time.monotonic() - started < 1:
+                # Crashing on startup, don't spin
+                time.sleep(1)
+            self.spawn()
+        signal.alarm(0)
+        self.sock.close()
+
+
+def main() -> None:
+    workers = worker_count()
+    # Read by the app to split rate limits and to stop caching sessions other workers may write
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    config = uvicorn.Config(
+        "src.main:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        backlog=SERVER_BACKLOG,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        access_log=False,
+        log_level=SERVER_LOG_LEVEL,
+    )
+    sock = bind_socket(SERVER_HOST, SERVER_PORT, SERVER_BACKLOG)
+    if SERVER_PRELOAD:
+        config.load()
+    logger.info(f"Serving on {SERVER_HOST}:{SERVER_PORT} with {workers} workers (pid {os.getpid()})")
+    Supervisor(config, sock, workers).run()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import io
+import random
+
+from agno.media import Image
+from PIL import Image as PILImage, ImageDraw
+
+from src.infra.images import prepare_image
+
+
+def encode(picture, image_format, **options) -> bytes:
+    output = io.BytesIO()
+    picture.save(output, format=image_format, **options)
+    return output.getvalue()
+
+
+def text_screenshot(width: int, height: int) -> bytes:
+    picture = PILImage.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(picture)
+    words = random.Random(1)
+    for y in range(0, height, 14):
+        line = " ".join("".join(words.choice("abcdefghij") for _ in range(words.randint(2, 9))) for _ in range(30))
+        draw.text((10, y), line, fill="black")
+    return encode(picture, "PNG")
+
+
+def test_downsized_screenshots_are_never_sent_larger():
+    data = text_screenshot(1400, 900)
+    prepared, stats = prepare_image(Image(content=data), max_side=1024)
+
+    assert stats["bytes_out"] <= stats["bytes_in"] == len(data)
+    assert len(prepared.content) == stats["bytes_out"]
+
+
+def test_large_photos_are_downsized_to_jpeg():
+    data = encode(PILImage.new("RGB", (4000, 3000), (10, 200, 30)), "JPEG", quality=95)
+    prepared, stats = prepare_image(Image(content=data), max_side=1024)
+
+    assert prepared.format == "jpeg"
+    assert stats["bytes_out"] < stats["bytes_in"]
+    assert stats["tokens_out"] <= stats["tokens_in"]
+    assert max(PILImage.open(io.BytesIO(prepared.content)).size) == 1024
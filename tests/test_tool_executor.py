@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+from agno.tools.function import Function, FunctionCall
+
+from src.infra.tool_executor import ToolExecutor
+
+
+def make_call(name, entrypoint, **arguments):
+    return FunctionCall(function=Function(name=name, entrypoint=entrypoint), arguments=arguments, call_id=name)
+
+
+def test_results_keep_the_order_of_the_calls():
+    executor = ToolExecutor(workers=4, timeout=5)
+
+    def slow(value: int, delay: float) -> str:
+        time.sleep(delay)
+        return f"result {value}"
+
+    calls = [make_call(f"slow_{i}", slow, value=i, delay=delay) for i, delay in enumerate([0.3, 0.1, 0.2])]
+    start = time.perf_counter()
+    started = executor.start(calls)
+    results = [executor.wait(fc, call) for fc, call in zip(calls, started)]
+
+    assert time.perf_counter() - start < 0.55
+    assert [success for success, _ in results] == [True, True, True]
+    assert [fc.result for fc in calls] == ["result 0", "result 1", "result 2"]
+
+
+def test_timed_out_calls_are_cancelled_and_keep_their_error():
+    executor = ToolExecutor(workers=1, timeout=0.2)
+    ran = []
+    lock = threading.Lock()
+
+    def side_effect(value: int) -> str:
+        with lock:
+            ran.append(value)
+        time.sleep(0.5)
+        return f"result {value}"
+
+    calls = [make_call(f"side_effect_{i}", side_effect, value=i) for i in range(3)]
+    started = executor.start(calls)
+    results = [executor.wait(fc, call) for fc, call in zip(calls, started)]
+    # Let the running call finish
+    time.sleep(0.6)
+
+    assert ran == [0]
+    assert [success for success, _ in results] == [False, False, False]
+    for fc, (_, timer) in zip(calls, results):
+        assert fc.result is None
+        assert fc.error == f"Tool {fc.function.name} timed out after 0.2s"
+        assert timer.elapsed >= 0.2
+
+
+def test_async_run_times_out_blocking_and_async_tools():
+    executor = ToolExecutor(workers=2, timeout=0.2)
+
+    def blocking() -> str:
+        time.sleep(0.5)
+        return "late"
+
+    async def coroutine() -> str:
+        await asyncio.sleep(0.5)
+        return "late"
+
+    async def run_all():
+        return await asyncio.gather(
+            executor.arun(make_call("blocking", blocking)),
+            executor.arun(make_call("coroutine", coroutine)),
+        )
+
+    results = asyncio.run(run_all())
+    time.sleep(0.4)
+
+    for success, timer, fc in results:
+        assert success is False
+        assert fc.result is None
+        assert fc.error == f"Tool {fc.function.name} timed out after 0.2s"
+        assert timer.elapsed >= 0.2
@@ -0,0 +1,107 @@
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import httpcore
+import pytest
+
+from src.agents.tools.WebResearch import WebResearchStore, check_public_url
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "file:///etc/passwd",
+        "gopher://example.com/",
+        "http://127.0.0.1:8000/admin",
+        "http://localhost/",
+        "http://169.254.169.254/latest/meta-data/",
+        "http://10.0.0.5/",
+        "http://192.168.1.1/",
+        "http://[::1]/",
+        "http://[::ffff:127.0.0.1]/",
+        "http://0.0.0.0/",
+    ],
+)
+def test_non_public_urls_are_rejected(url):
+    with pytest.raises(ValueError):
+        asyncio.run(check_public_url(url))
+
+
+def test_public_addresses_are_allowed():
+    asyncio.run(check_public_url("https://93.184.215.14/page"))
+
+
+def fake_resolver(loop, answers):
+    """Makes the loop resolve every host to the next address in answers."""
+
+    async def getaddrinfo(host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (next(answers), port))]
+
+    loop.getaddrinfo = getaddrinfo
+
+
+@pytest.fixture
+def internal_server():
+    """A local HTTP server standing in for an internal service; records the paths requested."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"<p>internal</p>")
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1], requests
+    server.shutdown()
+
+
+def test_a_host_rebinding_after_the_check_is_not_connected_to(internal_server):
+    port, requests = internal_server
+    url = f"http://rebind.example:{port}/secret"
+
+    async def scenario():
+        store = WebResearchStore(persistent=False, max_workers=1)
+        # Public for the check, the internal address by the time the request connects
+        fake_resolver(asyncio.get_running_loop(), iter(["93.184.215.14", "127.0.0.1"]))
+        await check_public_url(url)
+        with pytest.raises(ValueError, match="non-public"):
+            await store._download(url)
+        return store._state()
+
+    state = asyncio.run(scenario())
+
+    assert requests == []
+    assert state.hosts == {}
+
+
+def test_connections_go_to_the_vetted_address():
+    connected = []
+
+    async def scenario():
+        store = WebResearchStore(persistent=False, max_workers=1)
+        fake_resolver(asyncio.get_running_loop(), iter(["93.184.215.14", "127.0.0.1"]))
+        backend = store._state().client._transport._pool._network_backend
+
+        async def connect_tcp(host, port, *args):
+            connected.append((host, port))
+            raise httpcore.ConnectError("offline")
+
+        backend._backend.connect_tcp = connect_tcp
+        page = await store.afetch_page("https://public.example/article")
+        return page, store._state()
+
+    page, state = asyncio.run(scenario())
+
+    assert connected == [("93.184.215.14", 443)]
+    assert page["error"] == "offline"
+    assert state.hosts == {}